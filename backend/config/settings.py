@@ -121,6 +121,7 @@ SIMPLE_JWT = {
 
 CORS_ALLOWED_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ALLOWED_ORIGINS", "").split(",") if origin.strip()]
 CORS_ALLOW_ALL_ORIGINS = not CORS_ALLOWED_ORIGINS
+CORS_EXPOSE_HEADERS = ["X-Next-Cursor"]
 CSRF_TRUSTED_ORIGINS = [origin.strip() for origin in os.getenv("CSRF_TRUSTED_ORIGINS", "").split(",") if origin.strip()]
 
 USE_X_FORWARDED_HOST = os.getenv("DJANGO_USE_X_FORWARDED_HOST", "0") == "1"
@@ -153,8 +154,55 @@ CACHES = {
     }
 }
 
+TENANT_CACHE_TTL_SECONDS = int(os.getenv("TENANT_CACHE_TTL_SECONDS", "300"))
+RULE_CACHE_TTL_SECONDS = int(os.getenv("RULE_CACHE_TTL_SECONDS", "300"))
+OFFER_CACHE_TTL_SECONDS = int(os.getenv("OFFER_CACHE_TTL_SECONDS", "300"))
+SEGMENT_CACHE_TTL_SECONDS = int(os.getenv("SEGMENT_CACHE_TTL_SECONDS", "300"))
+CACHE_VERSION_CHECK_SECONDS = int(os.getenv("CACHE_VERSION_CHECK_SECONDS", "5"))
+
 MAX_EARN_PER_DAY_PER_CARD = int(os.getenv("MAX_EARN_PER_DAY_PER_CARD", "100000"))
 MAX_OPS_PER_HOUR_PER_STAFF = int(os.getenv("MAX_OPS_PER_HOUR_PER_STAFF", "120"))
+POS_BATCH_MAX_RECEIPTS = int(os.getenv("POS_BATCH_MAX_RECEIPTS", "1000"))
+POS_BATCH_CHUNK_SIZE = int(os.getenv("POS_BATCH_CHUNK_SIZE", "50"))
+OPERATIONS_PAGE_MAX = int(os.getenv("OPERATIONS_PAGE_MAX", "500"))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "604800"))
+IDEMPOTENCY_CACHE_SECONDS = int(os.getenv("IDEMPOTENCY_CACHE_SECONDS", "3600"))
+AUDIT_SPOOL_DIR = os.getenv("AUDIT_SPOOL_DIR", str(BASE_DIR / "var" / "audit"))
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "200"))
+AUDIT_FLUSH_SECONDS = int(os.getenv("AUDIT_FLUSH_SECONDS", "5"))
+LEDGER_PARTITION_MONTHS_AHEAD = int(os.getenv("LEDGER_PARTITION_MONTHS_AHEAD", "3"))
+LEDGER_TENANT_BUCKETS = int(os.getenv("LEDGER_TENANT_BUCKETS", "0"))
+LEDGER_PARTITION_ENSURE_SECONDS = int(os.getenv("LEDGER_PARTITION_ENSURE_SECONDS", "21600"))
+REFUND_LOOKBACK_DAYS = int(os.getenv("REFUND_LOOKBACK_DAYS", "365"))
+JOBS_EAGER = os.getenv("JOBS_EAGER", "0") == "1"
+JOBS_POLL_SECONDS = int(os.getenv("JOBS_POLL_SECONDS", "2"))
+JOBS_STALE_SECONDS = int(os.getenv("JOBS_STALE_SECONDS", "900"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_RECLAIM_SECONDS = int(os.getenv("JOBS_RECLAIM_SECONDS", "60"))
+RETIER_CHUNK_SIZE = int(os.getenv("RETIER_CHUNK_SIZE", "5000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+IMPORT_DIR = os.getenv("IMPORT_DIR", str(BASE_DIR / "var" / "imports"))
+COUPON_ISSUE_CHUNK_SIZE = int(os.getenv("COUPON_ISSUE_CHUNK_SIZE", "5000"))
+SEGMENT_REFRESH_CHUNK_SIZE = int(os.getenv("SEGMENT_REFRESH_CHUNK_SIZE", "10000"))
+SEGMENT_REFRESH_SECONDS = int(os.getenv("SEGMENT_REFRESH_SECONDS", "86400"))
+TENANT_STATS_REPAIR_SECONDS = int(os.getenv("TENANT_STATS_REPAIR_SECONDS", "3600"))
+POINTS_TTL_DAYS = int(os.getenv("POINTS_TTL_DAYS", "365"))
+POINTS_LOT_BATCH_SIZE = int(os.getenv("POINTS_LOT_BATCH_SIZE", "20"))
+POINTS_EXPIRY_CHUNK_SIZE = int(os.getenv("POINTS_EXPIRY_CHUNK_SIZE", "1000"))
+POINTS_EXPIRY_RETRIES = int(os.getenv("POINTS_EXPIRY_RETRIES", "5"))
+POINTS_EXPIRY_RETRY_MS = int(os.getenv("POINTS_EXPIRY_RETRY_MS", "1000"))
+QR_SECRET_KEY = os.getenv("QR_SECRET_KEY") or SECRET_KEY
+QR_ROLLING_PERIOD_SECONDS = int(os.getenv("QR_ROLLING_PERIOD_SECONDS", "30"))
+QR_ROLLING_DRIFT_STEPS = int(os.getenv("QR_ROLLING_DRIFT_STEPS", "1"))
+QR_RETENTION_DAYS = int(os.getenv("QR_RETENTION_DAYS", "1"))
+CODE_RETENTION_DAYS = int(os.getenv("CODE_RETENTION_DAYS", "1"))
+IDEMPOTENCY_RETENTION_DAYS = int(os.getenv("IDEMPOTENCY_RETENTION_DAYS", "0"))
+TOKEN_RETENTION_DAYS = int(os.getenv("TOKEN_RETENTION_DAYS", "0"))
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "365"))
+STAFF_OPS_RETENTION_DAYS = int(os.getenv("STAFF_OPS_RETENTION_DAYS", "2"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "5000"))
+PURGE_SLEEP_MS = int(os.getenv("PURGE_SLEEP_MS", "50"))
 OTP_RATE_LIMIT_PER_HOUR = int(os.getenv("OTP_RATE_LIMIT_PER_HOUR", "5"))
 EMAIL_CODE_RATE_LIMIT_PER_HOUR = int(os.getenv("EMAIL_CODE_RATE_LIMIT_PER_HOUR", "5"))
 
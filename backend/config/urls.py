@@ -3,8 +3,10 @@ from django.http import JsonResponse
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from loyalty.caching import cache_stats
+
 urlpatterns = [
-    path("healthz", lambda request: JsonResponse({"status": "ok"})),
+    path("healthz", lambda request: JsonResponse({"status": "ok", "caches": cache_stats()})),
     path("admin/", admin.site.urls),
     path("api/v1/auth/refresh", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/v1/", include("loyalty.urls")),
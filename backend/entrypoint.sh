@@ -41,6 +41,12 @@ done
 # --- Apply migrations ---
 python manage.py migrate
 
+# --- Replay audit entries spooled before restart ---
+python manage.py flush_audit_spool
+
+# --- Create upcoming ledger partitions (no-op until the ledger is partitioned) ---
+python manage.py partition_operations ensure
+
 # --- Collect static files ---
 if [ "${DJANGO_COLLECTSTATIC:-1}" = "1" ]; then
   python manage.py collectstatic --noinput
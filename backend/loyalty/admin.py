@@ -16,7 +16,12 @@ from .models import (
     EmailVerificationCode,
     OneTimeCode,
     AuditLog,
+    Job,
+    Segment,
 )
+from .jobs import enqueue
+from .offers import invalidate_offers
+from .rules import invalidate_rules
 
 admin.site.site_header = "Loyalty Admin"
 admin.site.site_title = "Loyalty Admin"
@@ -61,6 +66,8 @@ class TenantScopedAdmin(admin.ModelAdmin):
                 kwargs["queryset"] = Location.objects.filter(tenant=tenant)
             elif db_field.name == "staff":
                 kwargs["queryset"] = User.objects.filter(tenant=tenant)
+            elif db_field.name == "segment":
+                kwargs["queryset"] = Segment.objects.filter(tenant=tenant)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
@@ -187,12 +194,50 @@ class LoyaltyRuleAdmin(TenantScopedAdmin):
     list_display = ("id", "tenant", "location", "earn_percent", "rounding_mode", "min_amount")
     list_filter = ("tenant", "rounding_mode")
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_rules(obj.tenant_id)
+        enqueue(obj.tenant_id, Job.Kind.RETIER)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_rules(obj.tenant_id)
+        enqueue(obj.tenant_id, Job.Kind.RETIER)
+
+    def delete_queryset(self, request, queryset):
+        tenant_ids = set(queryset.values_list("tenant_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for tenant_id in tenant_ids:
+            invalidate_rules(tenant_id)
+            enqueue(tenant_id, Job.Kind.RETIER)
+
 
 class OfferAdmin(TenantScopedAdmin):
     list_display = ("id", "tenant", "title", "type", "is_active", "active_from", "active_to")
     list_filter = ("tenant", "type", "is_active")
     search_fields = ("title",)
 
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_offers(obj.tenant_id)
+
+    def delete_queryset(self, request, queryset):
+        tenant_ids = set(queryset.values_list("tenant_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for tenant_id in tenant_ids:
+            invalidate_offers(tenant_id)
+
+
+class SegmentAdmin(TenantScopedAdmin):
+    list_display = ("id", "tenant", "name", "tier", "points_min", "points_max", "active_days", "location", "size")
+    list_filter = ("tenant",)
+    search_fields = ("name",)
+    readonly_fields = ("size", "refreshed_at")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        enqueue(obj.tenant_id, Job.Kind.REFRESH_SEGMENTS, {"segment_id": obj.id})
+
 
 class CouponAdmin(TenantScopedAdmin):
     list_display = ("id", "tenant", "code", "title", "active_from", "active_to")
@@ -249,6 +294,12 @@ class AuditLogAdmin(TenantScopedAdmin):
     date_hierarchy = "created_at"
 
 
+class JobAdmin(TenantScopedAdmin):
+    list_display = ("id", "tenant", "kind", "status", "processed", "total", "created_at", "finished_at")
+    list_filter = ("tenant", "kind", "status")
+    readonly_fields = ("result", "error", "processed", "total", "started_at", "heartbeat_at", "attempts", "finished_at")
+
+
 admin.site.register(Tenant, TenantAdmin)
 admin.site.register(OrganizationSettings, OrganizationSettingsAdmin)
 admin.site.register(Location, LocationAdmin)
@@ -258,8 +309,10 @@ admin.site.register(LoyaltyCard, LoyaltyCardAdmin)
 admin.site.register(OneTimeQR, OneTimeQRAdmin)
 admin.site.register(LoyaltyRule, LoyaltyRuleAdmin)
 admin.site.register(Offer, OfferAdmin)
+admin.site.register(Segment, SegmentAdmin)
 admin.site.register(Coupon, CouponAdmin)
 admin.site.register(CouponAssignment, CouponAssignmentAdmin)
 admin.site.register(LoyaltyOperation, LoyaltyOperationAdmin)
 admin.site.register(EmailVerificationCode, EmailVerificationCodeAdmin)
 admin.site.register(AuditLog, AuditLogAdmin)
+admin.site.register(Job, JobAdmin)
@@ -5,3 +5,6 @@ class LoyaltyConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "loyalty"
     verbose_name = "Лояльность"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,187 @@
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AuditLog, Tenant, User
+
+logger = logging.getLogger(__name__)
+
+
+class AuditBuffer:
+    def __init__(self, spool_dir: str, max_entries: int, max_age_seconds: int):
+        self.spool_dir = Path(spool_dir)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._entries = []
+        self._oldest = None
+        self._spool = None
+        self._spool_path = None
+        self._sequence = count()
+        self._recovered = False
+        self._lock = threading.Lock()
+
+    def add(self, entry: dict) -> None:
+        with self._lock:
+            self._write_spool(entry)
+            self._entries.append(entry)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._entries) >= self.max_entries
+        if full:
+            self.flush()
+
+    def due(self) -> bool:
+        with self._lock:
+            return self._oldest is not None and time.monotonic() - self._oldest >= self.max_age_seconds
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def flush(self) -> int:
+        with self._lock:
+            entries, self._entries, self._oldest = self._entries, [], None
+            spool, claimed = self._rotate_spool()
+        written = 0
+        try:
+            if entries:
+                write_entries(entries)
+                written = len(entries)
+                if claimed is not None:
+                    claimed.unlink(missing_ok=True)
+        except Exception:
+            logger.exception("audit.flush failed entries=%s spool=%s", len(entries), claimed)
+        finally:
+            if spool is not None:
+                spool.close()
+        if not self._recovered:
+            self._recovered = True
+            try:
+                recover_spool(self.spool_dir)
+            except Exception:
+                logger.exception("audit.recover failed spool_dir=%s", self.spool_dir)
+        return written
+
+    def _write_spool(self, entry: dict) -> None:
+        try:
+            if self._spool is None:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+                self._spool_path = self.spool_dir / f"audit-{os.getpid()}-{uuid4().hex[:8]}.jsonl"
+                self._spool = open(self._spool_path, "a", encoding="utf-8")
+                fcntl.flock(self._spool, fcntl.LOCK_EX)
+            self._spool.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._spool.flush()
+        except OSError:
+            logger.exception("audit.spool write failed path=%s", self._spool_path)
+
+    def _rotate_spool(self):
+        spool, path = self._spool, self._spool_path
+        self._spool = None
+        self._spool_path = None
+        if spool is None:
+            return None, None
+        claimed = path.with_suffix(f".{next(self._sequence)}.flushing")
+        try:
+            os.replace(path, claimed)
+        except OSError:
+            logger.exception("audit.spool rotate failed path=%s", path)
+            return spool, None
+        return spool, claimed
+
+
+def serialize_entry(tenant: Tenant, user: User | None, action: str, metadata: dict | None) -> dict:
+    return {
+        "tenant_id": tenant.id,
+        "user_id": user.id if user else None,
+        "action": action,
+        "metadata": metadata or {},
+        "created_at": timezone.now().isoformat(),
+    }
+
+
+def write_entries(entries: list[dict]) -> None:
+    AuditLog.objects.bulk_create(
+        [
+            AuditLog(
+                tenant_id=entry["tenant_id"],
+                user_id=entry["user_id"],
+                action=entry["action"],
+                metadata=entry["metadata"],
+                created_at=datetime.fromisoformat(entry["created_at"]),
+            )
+            for entry in entries
+        ],
+        batch_size=500,
+    )
+
+
+def read_spool(handle) -> list[dict]:
+    entries = []
+    for line in handle:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            logger.warning("audit.spool skipped corrupt line path=%s", handle.name)
+    return entries
+
+
+def recover_spool(spool_dir=None) -> int:
+    directory = Path(spool_dir or settings.AUDIT_SPOOL_DIR)
+    if not directory.is_dir():
+        return 0
+    recovered = 0
+    for path in sorted(directory.glob("audit-*")):
+        try:
+            handle = open(path, encoding="utf-8")
+        except OSError:
+            continue
+        with handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue
+            try:
+                if os.stat(path).st_ino != os.fstat(handle.fileno()).st_ino:
+                    continue
+            except FileNotFoundError:
+                continue
+            entries = read_spool(handle)
+            if not entries:
+                continue
+            write_entries(entries)
+            path.unlink(missing_ok=True)
+            recovered += len(entries)
+    return recovered
+
+
+audit_buffer = AuditBuffer(settings.AUDIT_SPOOL_DIR, settings.AUDIT_BUFFER_SIZE, settings.AUDIT_FLUSH_SECONDS)
+
+
+def audit_log(tenant: Tenant, user: User | None, action: str, metadata: dict | None = None) -> None:
+    entry = serialize_entry(tenant, user, action, metadata)
+    transaction.on_commit(lambda: audit_buffer.add(entry))
+
+
+def flush_if_due(**kwargs) -> None:
+    if audit_buffer.due():
+        audit_buffer.flush()
+
+
+request_finished.connect(flush_if_due, dispatch_uid="loyalty.audit.flush_if_due")
+atexit.register(audit_buffer.flush)
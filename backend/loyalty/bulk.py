@@ -0,0 +1,27 @@
+import json
+
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+
+
+def id_set(ids) -> RawSQL:
+    ids = [int(value) for value in ids]
+    if connection.vendor == "postgresql":
+        return RawSQL("SELECT unnest(%s::bigint[])", [ids])
+    return RawSQL("SELECT value FROM json_each(%s)", [json.dumps(ids)])
+
+
+def insert_select(model: type[models.Model], source: str, rows: models.QuerySet, **values) -> int:
+    meta = model._meta
+    fields = [meta.get_field(name) for name in (source, *values)]
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    constants = [field.get_db_prep_save(values[field.name], connection) for field in fields[1:]]
+    select, params = rows.order_by().values("id").query.sql_with_params()
+    placeholders = "".join(", %s" for _ in constants)
+    sql = (
+        f"INSERT INTO {connection.ops.quote_name(meta.db_table)} ({columns}) "
+        f"SELECT scope.id{placeholders} FROM ({select}) scope WHERE true ON CONFLICT DO NOTHING"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*constants, *params])
+        return cursor.rowcount
@@ -0,0 +1,123 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import CacheVersion, Tenant
+
+
+def read_version(key: str) -> int:
+    return CacheVersion.objects.filter(key=key).values_list("version", flat=True).first() or 0
+
+
+def bump_version(key: str) -> None:
+    table = connection.ops.quote_name(CacheVersion._meta.db_table)
+    key_column, version_column = (connection.ops.quote_name(name) for name in ("key", "version"))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({key_column}, {version_column}) VALUES (%s, 1) "
+            f"ON CONFLICT ({key_column}) DO UPDATE SET {version_column} = {table}.{version_column} + 1",
+            [key],
+        )
+
+
+class VersionedLocalCache:
+    instances = []
+
+    def __init__(self, name: str, ttl_seconds: int):
+        VersionedLocalCache.instances.append(self)
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version_key(self, scope=None) -> str:
+        return f"lc:{self.name}:version:{'*' if scope is None else scope}"
+
+    def current_version(self, scope=None) -> int:
+        now = time.monotonic()
+        checked = self._versions.get(scope)
+        if checked is not None and now - checked[1] < settings.CACHE_VERSION_CHECK_SECONDS:
+            return checked[0]
+        version = read_version(self.version_key(scope))
+        self._versions[scope] = (version, now)
+        return version
+
+    def bump(self, scope=None) -> None:
+        bump_version(self.version_key(scope))
+        self._versions.pop(scope, None)
+
+    def get(self, key, loader, scope=None):
+        version = self.current_version(scope)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at, entry_version = entry
+            if entry_version == version and expires_at > now:
+                with self._lock:
+                    self.hits += 1
+                return value
+        value = loader()
+        with self._lock:
+            self.misses += 1
+            if value is not None:
+                self._entries[key] = (value, now + self.ttl_seconds, version)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def invalidate(self, scope=None, keys=None) -> None:
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+            self._versions.pop(scope, None)
+        transaction.on_commit(lambda: self.bump(scope))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+tenant_cache = VersionedLocalCache("tenant", settings.TENANT_CACHE_TTL_SECONDS)
+
+
+def _load_tenant(slug: str) -> Tenant | None:
+    return Tenant.objects.filter(slug=slug).first()
+
+
+def get_tenant_by_slug(slug: str) -> Tenant | None:
+    if not slug:
+        return None
+    tenant = tenant_cache.get(slug, lambda: _load_tenant(slug))
+    if tenant is None:
+        return None
+    return copy.copy(tenant)
+
+
+def invalidate_tenant_cache() -> None:
+    tenant_cache.invalidate()
+
+
+def clear_local_caches() -> None:
+    for local_cache in VersionedLocalCache.instances:
+        local_cache.clear()
+
+
+def cache_stats() -> list[dict]:
+    return [local_cache.stats() for local_cache in VersionedLocalCache.instances]
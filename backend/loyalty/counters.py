@@ -0,0 +1,69 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import CardDailyEarn, LoyaltyOperation, StaffMinuteOps
+
+
+def day_bucket(moment: datetime | None = None) -> date:
+    return timezone.localdate(moment)
+
+
+def day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def minute_bucket(moment: datetime | None = None) -> datetime:
+    moment = moment or timezone.now()
+    return moment.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+
+
+def _bump(model, lookup: dict, field: str, delta: int) -> None:
+    if model.objects.filter(**lookup).update(**{field: F(field) + delta}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{field: delta})
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**{field: F(field) + delta})
+
+
+def reserve_daily_earn(card_id: int, points: int, now: datetime | None = None) -> bool:
+    if not points:
+        return True
+    limit = settings.MAX_EARN_PER_DAY_PER_CARD
+    lookup = {"card_id": card_id, "day": day_bucket(now)}
+    counters = CardDailyEarn.objects.filter(**lookup)
+    if limit:
+        counters = counters.filter(points__lte=limit - points)
+    if counters.update(points=F("points") + points):
+        return True
+    if limit and points > limit:
+        return False
+    try:
+        with transaction.atomic():
+            CardDailyEarn.objects.create(**lookup, points=points)
+    except IntegrityError:
+        return counters.update(points=F("points") + points) == 1
+    return True
+
+
+def record_counters(op: LoyaltyOperation) -> None:
+    if op.staff_id:
+        _bump(StaffMinuteOps, {"staff_id": op.staff_id, "minute": minute_bucket(op.created_at)}, "count", 1)
+
+
+def earned_today(card_id: int, now: datetime | None = None) -> int:
+    return (
+        CardDailyEarn.objects.filter(card_id=card_id, day=day_bucket(now)).values_list("points", flat=True).first()
+        or 0
+    )
+
+
+def staff_ops_last_hour(staff_id: int, now: datetime | None = None) -> int:
+    since = minute_bucket(now) - timedelta(minutes=59)
+    counts = StaffMinuteOps.objects.filter(staff_id=staff_id, minute__gte=since)
+    return counts.aggregate(total=Sum("count"))["total"] or 0
@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import Callable
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from .bulk import insert_select
+from .jobs import report_progress
+from .models import Coupon, CouponAssignment, Job, LoyaltyCard, User
+from .search import filter_customers
+
+
+def coupon_cards(tenant_id: int, filters: dict) -> models.QuerySet:
+    cards = LoyaltyCard.objects.filter(
+        tenant_id=tenant_id, status=LoyaltyCard.Status.ACTIVE, user__role=User.Role.CLIENT
+    )
+    return filter_customers(cards, filters, user="user__", card="")
+
+
+def assign_chunk(coupon: Coupon, cards: models.QuerySet, now: datetime) -> int:
+    return insert_select(
+        CouponAssignment,
+        "card",
+        cards,
+        coupon=coupon.id,
+        tenant=coupon.tenant_id,
+        status=CouponAssignment.Status.UNUSED,
+        created_at=now,
+    )
+
+
+def issue_coupon(
+    coupon: Coupon,
+    cards: models.QuerySet,
+    chunk_size: int = 5000,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    now = timezone.now()
+    total = cards.count()
+    bounds = cards.order_by("id").values_list("id", flat=True)
+    issued = 0
+    processed = 0
+    last_id = 0
+    while True:
+        upper = bounds.filter(id__gt=last_id)[chunk_size - 1 : chunk_size].first()
+        chunk = cards.filter(id__gt=last_id) if upper is None else cards.filter(id__gt=last_id, id__lte=upper)
+        with transaction.atomic():
+            issued += assign_chunk(coupon, chunk, now)
+        processed = min(processed + chunk_size, total) if upper is not None else total
+        if progress is not None:
+            progress(processed, total)
+        if upper is None:
+            break
+        last_id = upper
+    return issued
+
+
+def issue_job(job: Job) -> dict:
+    coupon = Coupon.objects.get(tenant=job.tenant, id=job.payload["coupon_id"])
+    issued = issue_coupon(
+        coupon,
+        coupon_cards(job.tenant_id, job.payload.get("filters", {})),
+        chunk_size=settings.COUPON_ISSUE_CHUNK_SIZE,
+        progress=lambda processed, total: report_progress(job, processed, total),
+    )
+    return {"issued": issued}
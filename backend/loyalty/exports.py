@@ -0,0 +1,83 @@
+import csv
+import json
+from decimal import Decimal
+from io import StringIO
+from typing import Iterable, Iterator
+
+from django.db import models
+
+EXPORT_FIELDS = (
+    "id",
+    "created_at",
+    "type",
+    "source",
+    "status",
+    "amount",
+    "points",
+    "receipt_id",
+    "order_id",
+    "card_id",
+    "location_id",
+    "staff_id",
+    "original_operation_id",
+    "fail_reason",
+)
+LINES_PER_CHUNK = 500
+
+
+def export_rows(ops: models.QuerySet, chunk_size: int) -> Iterator[tuple]:
+    return ops.order_by("created_at", "id").values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def export_value(value):
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def chunked(lines: Iterable[str]) -> Iterator[str]:
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= LINES_PER_CHUNK:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def csv_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    output = StringIO()
+    writer = csv.writer(output)
+
+    def line(values) -> str:
+        writer.writerow(values)
+        text = output.getvalue()
+        output.seek(0)
+        output.truncate()
+        return text
+
+    yield line(EXPORT_FIELDS)
+    for row in rows:
+        yield line(["" if value is None else export_value(value) for value in row])
+
+
+def ndjson_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    for row in rows:
+        record = {field: export_value(value) for field, value in zip(EXPORT_FIELDS, row)}
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", csv_lines),
+    "ndjson": ("application/x-ndjson", ndjson_lines),
+}
+
+
+def stream_export(ops: models.QuerySet, export_format: str, chunk_size: int) -> tuple[str, Iterator[str]]:
+    content_type, render = FORMATS[export_format]
+    return content_type, chunked(render(export_rows(ops, chunk_size)))
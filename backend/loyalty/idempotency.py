@@ -0,0 +1,88 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import IdempotencyRecord, Tenant
+
+
+class DuplicateResponse(IntegrityError):
+    pass
+
+
+def operation_key(idempotency_key: str) -> str:
+    return f"op:{idempotency_key}"
+
+
+def pos_receipt_key(receipt_id: str) -> str:
+    return f"pos:{receipt_id}"
+
+
+def _cache_key(tenant_id: int, key: str) -> str:
+    return f"idem:{tenant_id}:{key}"
+
+
+def get_responses(tenant: Tenant, keys: list[str]) -> dict[str, tuple[dict, int]]:
+    if not keys:
+        return {}
+    cache_keys = {_cache_key(tenant.id, key): key for key in keys}
+    found = {cache_keys[cache_key]: value for cache_key, value in cache.get_many(list(cache_keys)).items()}
+    missing = [key for key in keys if key not in found]
+    if missing:
+        records = IdempotencyRecord.objects.filter(
+            tenant=tenant,
+            key__in=missing,
+            expires_at__gt=timezone.now(),
+        ).values_list("key", "body", "status_code")
+        loaded = {key: (json.loads(body), status_code) for key, body, status_code in records}
+        if loaded:
+            cache.set_many(
+                {_cache_key(tenant.id, key): value for key, value in loaded.items()},
+                timeout=settings.IDEMPOTENCY_CACHE_SECONDS,
+            )
+        found.update(loaded)
+    return {key: (json.loads(json.dumps(payload)), code) for key, (payload, code) in found.items()}
+
+
+def get_response(tenant: Tenant, key: str) -> tuple[dict, int] | None:
+    return get_responses(tenant, [key]).get(key)
+
+
+def store_response(tenant: Tenant, key: str, payload: dict, status_code: int) -> None:
+    store_responses(tenant, {key: (payload, status_code)})
+
+
+def store_responses(tenant: Tenant, responses: dict[str, tuple[dict, int]]) -> None:
+    if not responses:
+        return
+    bodies = {key: (json.dumps(payload), status_code) for key, (payload, status_code) in responses.items()}
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    table = connection.ops.quote_name(IdempotencyRecord._meta.db_table)
+    columns = [
+        connection.ops.quote_name(name)
+        for name in ("tenant_id", "key", "status_code", "body", "created_at", "expires_at")
+    ]
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns[2:])
+    stamps = [connection.ops.adapt_datetimefield_value(now), connection.ops.adapt_datetimefield_value(expires_at)]
+    rows = ", ".join("(%s, %s, %s, %s, %s, %s)" for _ in bodies)
+    params = [
+        value for key, (body, status_code) in bodies.items() for value in (tenant.id, key, status_code, body, *stamps)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {rows} "
+            f"ON CONFLICT ({columns[0]}, {columns[1]}) DO UPDATE SET {updates} WHERE {table}.{columns[5]} <= %s",
+            [*params, stamps[0]],
+        )
+        if cursor.rowcount < len(bodies):
+            raise DuplicateResponse(f"idempotency key already answered tenant_id={tenant.id} keys={list(bodies)}")
+    transaction.on_commit(
+        lambda: cache.set_many(
+            {_cache_key(tenant.id, key): (json.loads(body), code) for key, (body, code) in bodies.items()},
+            timeout=settings.IDEMPOTENCY_CACHE_SECONDS,
+        )
+    )
@@ -0,0 +1,231 @@
+import csv
+import os
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, Iterator, TextIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .jobs import report_progress
+from .models import Job, LoyaltyCard, Tenant, User, build_username
+from .stats import bump_stats
+from .telegram_auth import normalize_phone
+
+NAME_LENGTH = 150
+ERROR_SAMPLE = 20
+
+
+@dataclass
+class ImportRow:
+    line: int
+    email: str | None
+    phone: str
+    first_name: str
+    last_name: str
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: list[dict] = field(default_factory=list)
+
+    def reject(self, line: int, reason: str) -> None:
+        self.invalid += 1
+        if len(self.errors) < ERROR_SAMPLE:
+            self.errors.append({"line": line, "reason": reason})
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def read_rows(stream: TextIO) -> Iterator[tuple[int, dict]]:
+    reader = csv.DictReader(stream)
+    reader.fieldnames = [(name or "").strip().lower() for name in reader.fieldnames or []]
+    for row in reader:
+        yield reader.line_num, row
+
+
+def clean_row(line: int, row: dict) -> ImportRow | str:
+    email = (row.get("email") or "").strip().lower() or None
+    phone = normalize_phone(row.get("phone") or "")
+    if not email and not phone:
+        return "CONTACT_REQUIRED"
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            return "INVALID_EMAIL"
+    return ImportRow(
+        line=line,
+        email=email,
+        phone=phone,
+        first_name=(row.get("first_name") or "").strip()[:NAME_LENGTH],
+        last_name=(row.get("last_name") or "").strip()[:NAME_LENGTH],
+    )
+
+
+def build_user(tenant: Tenant, row: ImportRow, now) -> User:
+    return User(
+        tenant=tenant,
+        username=build_username(tenant, row.email) if row.email else f"{tenant.id}:phone:{row.phone}",
+        email=row.email,
+        phone=row.phone,
+        first_name=row.first_name,
+        last_name=row.last_name,
+        role=User.Role.CLIENT,
+        is_active=True,
+        password=make_password(None),
+        date_joined=now,
+    )
+
+
+def fresh_rows(tenant: Tenant, rows: list[ImportRow], report: ImportReport) -> list[ImportRow]:
+    emails = {row.email for row in rows if row.email}
+    phones = {row.phone for row in rows if row.phone}
+    taken_emails = set()
+    taken_phones = set()
+    for email, phone in User.objects.filter(tenant=tenant).filter(
+        Q(email__in=emails) | Q(phone__in=phones)
+    ).values_list("email", "phone"):
+        taken_emails.add(email)
+        taken_phones.add(phone)
+    fresh = []
+    for row in rows:
+        if (row.email and row.email in taken_emails) or (row.phone and row.phone in taken_phones):
+            report.duplicates += 1
+            continue
+        taken_emails.add(row.email)
+        taken_phones.add(row.phone)
+        fresh.append(row)
+    return fresh
+
+
+def copy_objects(model: type[models.Model], objects: list[models.Model], returning: list[str]) -> list[tuple]:
+    qn = connection.ops.quote_name
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    columns = ", ".join(qn(f.column) for f in fields)
+    table = qn(model._meta.db_table)
+    staging = qn(f"{model._meta.db_table}_import")
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE {staging} AS SELECT {columns} FROM {table} WITH NO DATA")
+        with cursor.copy(f"COPY {staging} ({columns}) FROM STDIN") as copy:
+            for obj in objects:
+                copy.write_row([f.get_db_prep_save(getattr(obj, f.attname), connection) for f in fields])
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+            f"ON CONFLICT DO NOTHING RETURNING {', '.join(qn(column) for column in returning)}"
+        )
+        rows = cursor.fetchall()
+        cursor.execute(f"DROP TABLE {staging}")
+    return rows
+
+
+def insert_customers(tenant: Tenant, users: list[User], use_copy: bool) -> list[User]:
+    if use_copy:
+        ids = dict(copy_objects(User, users, ["username", "id"]))
+    else:
+        User.objects.bulk_create(users, batch_size=settings.IMPORT_BATCH_SIZE, ignore_conflicts=True)
+        # ignore_conflicts leaves ids unset; each new row is told apart by its random unusable password.
+        passwords = {user.username: user.password for user in users}
+        ids = {
+            username: user_id
+            for username, password, user_id in User.objects.filter(username__in=passwords).values_list(
+                "username", "password", "id"
+            )
+            if passwords[username] == password
+        }
+    created = [user for user in users if user.username in ids]
+    if not created:
+        return created
+    for user in created:
+        user.id = ids[user.username]
+    cards = [LoyaltyCard(user_id=user.id, tenant=tenant) for user in created]
+    if use_copy:
+        copy_objects(LoyaltyCard, cards, ["id"])
+    else:
+        LoyaltyCard.objects.bulk_create(cards, batch_size=settings.IMPORT_BATCH_SIZE)
+    return created
+
+
+def import_batch(tenant: Tenant, rows: list[ImportRow], report: ImportReport, use_copy: bool) -> None:
+    fresh = fresh_rows(tenant, rows, report)
+    if not fresh:
+        return
+    now = timezone.now()
+    users = [build_user(tenant, row, now) for row in fresh]
+    with transaction.atomic():
+        created = insert_customers(tenant, users, use_copy)
+        if created:
+            bump_stats(tenant.id, clients=len(created))
+    report.created += len(created)
+    report.duplicates += len(users) - len(created)
+
+
+def import_customers(
+    tenant: Tenant,
+    records: Iterable[tuple[int, dict]],
+    batch_size: int,
+    use_copy: bool | None = None,
+    progress: Callable[[ImportReport], None] | None = None,
+) -> ImportReport:
+    if use_copy is None:
+        use_copy = connection.vendor == "postgresql"
+    report = ImportReport()
+    batch = []
+    for line, record in records:
+        report.rows += 1
+        row = clean_row(line, record)
+        if isinstance(row, str):
+            report.reject(line, row)
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            import_batch(tenant, batch, report, use_copy)
+            batch = []
+            if progress:
+                progress(report)
+    if batch:
+        import_batch(tenant, batch, report, use_copy)
+    if progress:
+        progress(report)
+    return report
+
+
+def import_path(name: str) -> str:
+    return os.path.join(settings.IMPORT_DIR, os.path.basename(name))
+
+
+def save_upload(chunks: Iterable[bytes]) -> str:
+    os.makedirs(settings.IMPORT_DIR, exist_ok=True)
+    name = f"{uuid.uuid4().hex}.csv"
+    with open(import_path(name), "wb") as target:
+        for chunk in chunks:
+            target.write(chunk)
+    return name
+
+
+def import_job(job: Job) -> dict:
+    path = import_path(job.payload["file"])
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as stream:
+            total = max(sum(1 for _ in stream) - 1, 0)
+            stream.seek(0)
+            report = import_customers(
+                job.tenant,
+                read_rows(stream),
+                batch_size=settings.IMPORT_BATCH_SIZE,
+                progress=lambda current: report_progress(job, current.rows, max(total, current.rows)),
+            )
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return report.as_dict()
@@ -0,0 +1,118 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {
+    Job.Kind.RETIER: "loyalty.tiers.retier_job",
+    Job.Kind.IMPORT_CUSTOMERS: "loyalty.imports.import_job",
+    Job.Kind.ISSUE_COUPON: "loyalty.coupons.issue_job",
+    Job.Kind.REFRESH_SEGMENTS: "loyalty.segments.refresh_job",
+}
+
+
+def enqueue(tenant_id: int, kind: str, payload: dict | None = None) -> Job:
+    payload = payload or {}
+    job = Job.objects.filter(tenant_id=tenant_id, kind=kind, status=Job.Status.PENDING, payload=payload).first()
+    if job is None:
+        job = Job.objects.create(tenant_id=tenant_id, kind=kind, payload=payload)
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_job(job.id))
+    return job
+
+
+def claim_next() -> Job | None:
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.PENDING)
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        Job.objects.filter(id=job.id).update(
+            status=Job.Status.RUNNING, started_at=now, heartbeat_at=now, attempts=F("attempts") + 1
+        )
+    job.refresh_from_db()
+    return job
+
+
+def reclaim_stale(now=None) -> int:
+    now = now or timezone.now()
+    stale = (
+        Job.objects.filter(status=Job.Status.RUNNING)
+        .alias(seen_at=Coalesce("heartbeat_at", "started_at"))
+        .filter(seen_at__lt=now - timedelta(seconds=settings.JOBS_STALE_SECONDS))
+    )
+    failed = stale.filter(attempts__gte=settings.JOBS_MAX_ATTEMPTS).update(
+        status=Job.Status.FAILED, error="STALE_WORKER", finished_at=now
+    )
+    requeued = stale.update(status=Job.Status.PENDING)
+    if failed or requeued:
+        logger.warning("jobs.reclaimed requeued=%s failed=%s", requeued, failed)
+    return requeued + failed
+
+
+def heartbeat(job_id: int, stop: threading.Event) -> None:
+    try:
+        while not stop.wait(max(settings.JOBS_STALE_SECONDS // 3, 1)):
+            Job.objects.filter(id=job_id, status=Job.Status.RUNNING).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def report_progress(job: Job, processed: int, total: int) -> None:
+    job.processed = processed
+    job.total = total
+    Job.objects.filter(id=job.id).update(processed=processed, total=total, heartbeat_at=timezone.now())
+
+
+def run_job(job_id: int) -> Job | None:
+    now = timezone.now()
+    claimed = Job.objects.filter(id=job_id, status=Job.Status.PENDING).update(
+        status=Job.Status.RUNNING, started_at=now, heartbeat_at=now, attempts=F("attempts") + 1
+    )
+    if not claimed:
+        return None
+    job = Job.objects.get(id=job_id)
+    execute(job)
+    return job
+
+
+def execute(job: Job) -> None:
+    stop = threading.Event()
+    if not settings.JOBS_EAGER:
+        threading.Thread(target=heartbeat, args=(job.id, stop), daemon=True).start()
+    try:
+        job.result = import_string(HANDLERS[job.kind])(job) or {}
+        job.status = Job.Status.DONE
+    except Exception:
+        logger.exception("jobs.failed job_id=%s kind=%s", job.id, job.kind)
+        job.status = Job.Status.FAILED
+        job.error = traceback.format_exc()
+    finally:
+        stop.set()
+    job.finished_at = timezone.now()
+    finished = Job.objects.filter(id=job.id, status=Job.Status.RUNNING, attempts=job.attempts).update(
+        status=job.status,
+        result=job.result,
+        error=job.error,
+        processed=job.processed,
+        total=job.total,
+        finished_at=job.finished_at,
+    )
+    if not finished:
+        logger.warning("jobs.superseded job_id=%s kind=%s attempt=%s", job.id, job.kind, job.attempts)
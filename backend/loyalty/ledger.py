@@ -0,0 +1,82 @@
+from collections import Counter
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Case, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+
+from .counters import record_counters
+from .models import LoyaltyCard, LoyaltyOperation, LoyaltyRule, OneTimeQR
+from .rollups import bump_rollup, operation_rollup, record_rollup
+from .segments import track_operation
+from .stats import bump_stats, operation_deltas
+
+
+def record_operation(**fields) -> LoyaltyOperation:
+    op = LoyaltyOperation.objects.create(**fields)
+    record_counters(op)
+    bump_stats(op.tenant_id, **operation_deltas(op))
+    record_rollup(op)
+    track_operation(op)
+    return op
+
+
+def record_operations(ops: list[LoyaltyOperation]) -> list[LoyaltyOperation]:
+    ops = LoyaltyOperation.objects.bulk_create(ops)
+    stats, rollups = {}, {}
+    for op in ops:
+        record_counters(op)
+        stats.setdefault(op.tenant_id, Counter()).update(operation_deltas(op))
+        key, deltas = operation_rollup(op)
+        rollups.setdefault(tuple(key.items()), (key, Counter()))[1].update(deltas)
+        track_operation(op)
+    for tenant_id, deltas in stats.items():
+        bump_stats(tenant_id, **deltas)
+    for key, deltas in rollups.values():
+        bump_rollup(key, dict(deltas))
+    return ops
+
+
+def consume_qr(qr_id: int, now: datetime) -> bool:
+    return OneTimeQR.objects.filter(id=qr_id, used_at__isnull=True, expires_at__gt=now).update(used_at=now) == 1
+
+
+def release_qr(qr_id: int) -> None:
+    OneTimeQR.objects.filter(id=qr_id).update(used_at=None)
+
+
+def can_return_from_update() -> bool:
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == "postgresql"
+
+
+def apply_balance_delta(card_id: int, delta: int, rule: LoyaltyRule, min_balance: int | None = None) -> int | None:
+    qn = connection.ops.quote_name
+    points = qn("current_points")
+    sql = (
+        f"UPDATE {qn(LoyaltyCard._meta.db_table)} SET {points} = {points} + %s, "
+        f"{qn('tier')} = CASE WHEN {points} + %s >= %s THEN 'Gold' WHEN {points} + %s >= %s THEN 'Silver' "
+        f"ELSE 'Bronze' END WHERE {qn('id')} = %s AND {qn('status')} = %s"
+    )
+    params = [delta, delta, rule.gold_threshold, delta, rule.silver_threshold, card_id, LoyaltyCard.Status.ACTIVE]
+    if min_balance is not None:
+        sql += f" AND {points} >= %s"
+        params.append(min_balance)
+    with connection.cursor() as cursor:
+        if can_return_from_update():
+            cursor.execute(f"{sql} RETURNING {points}", params)
+            row = cursor.fetchone()
+            return row[0] if row else None
+        cursor.execute(sql, params)
+        if not cursor.rowcount:
+            return None
+    return LoyaltyCard.objects.filter(id=card_id).values_list("current_points", flat=True).first()
+
+
+def tier_case(points, gold_threshold: int, silver_threshold: int) -> Case:
+    return Case(
+        When(GreaterThanOrEqual(points, gold_threshold), then=Value("Gold")),
+        When(GreaterThanOrEqual(points, silver_threshold), then=Value("Silver")),
+        default=Value("Bronze"),
+    )
@@ -0,0 +1,139 @@
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+
+from .models import LoyaltyCard, LoyaltyOperation, PointsLot, Tenant
+from .ledger import record_operations
+
+
+def lot_expiry(earned_at: datetime) -> datetime | None:
+    if not settings.POINTS_TTL_DAYS:
+        return None
+    return earned_at + timedelta(days=settings.POINTS_TTL_DAYS)
+
+
+def lot_for(op: LoyaltyOperation) -> PointsLot:
+    return PointsLot(
+        tenant_id=op.tenant_id,
+        card_id=op.card_id,
+        operation=op,
+        points=op.points,
+        remaining=op.points,
+        earned_at=op.created_at,
+        expires_at=lot_expiry(op.created_at),
+    )
+
+
+def add_lot(op: LoyaltyOperation) -> PointsLot | None:
+    if op.points <= 0:
+        return None
+    lot = lot_for(op)
+    lot.save()
+    return lot
+
+
+def add_lots(ops: list[LoyaltyOperation]) -> list[PointsLot]:
+    return PointsLot.objects.bulk_create([lot_for(op) for op in ops if op.points > 0])
+
+
+def consume_lots(card_id: int, points: int, operation_id: int | None = None) -> int:
+    open_lots = PointsLot.objects.filter(card_id=card_id, remaining__gt=0)
+    consumed = 0
+    if operation_id is not None:
+        lot = open_lots.filter(operation_id=operation_id).first()
+        if lot is not None:
+            consumed = min(lot.remaining, points)
+            PointsLot.objects.filter(id=lot.id).update(remaining=F("remaining") - consumed)
+    while consumed < points:
+        lots = list(
+            open_lots.order_by(F("expires_at").asc(nulls_last=True), "id").only("id", "remaining")[
+                : settings.POINTS_LOT_BATCH_SIZE
+            ]
+        )
+        if not lots:
+            break
+        changed = []
+        for lot in lots:
+            take = min(lot.remaining, points - consumed)
+            lot.remaining -= take
+            consumed += take
+            changed.append(lot)
+            if consumed == points:
+                break
+        PointsLot.objects.bulk_update(changed, ["remaining"])
+    return consumed
+
+
+def expire_cards(tenant: Tenant, card_ids: list[int], now: datetime) -> tuple[list[int], int, int]:
+    with transaction.atomic():
+        balances = dict(
+            LoyaltyCard.objects.select_for_update(skip_locked=True)
+            .filter(id__in=card_ids)
+            .values_list("id", "current_points")
+        )
+        skipped = [card_id for card_id in card_ids if card_id not in balances]
+        expired_lots = PointsLot.objects.filter(card_id__in=list(balances), remaining__gt=0, expires_at__lte=now)
+        rows = list(expired_lots.order_by().values("card_id").annotate(total=Sum("remaining"), lots=Count("id")))
+        if not rows:
+            return skipped, 0, 0
+        expired_lots.update(remaining=0)
+        # The card never goes negative, so the EXPIRE operation records what was actually taken.
+        deducted = {row["card_id"]: min(row["total"], max(balances[row["card_id"]], 0)) for row in rows}
+        operations = [
+            LoyaltyOperation(
+                tenant=tenant,
+                card_id=row["card_id"],
+                type=LoyaltyOperation.Type.EXPIRE,
+                source=LoyaltyOperation.Source.SYSTEM,
+                amount=0,
+                points=deducted[row["card_id"]],
+                status=LoyaltyOperation.Status.SUCCESS,
+                metadata={"lots": row["lots"], "lot_points": row["total"]},
+            )
+            for row in rows
+            if deducted[row["card_id"]]
+        ]
+        if not operations:
+            return skipped, 0, 0
+        LoyaltyCard.objects.filter(id__in=[op.card_id for op in operations]).update(
+            current_points=F("current_points")
+            - Case(*[When(id=op.card_id, then=Value(op.points)) for op in operations], default=Value(0))
+        )
+        record_operations(operations)
+        points = sum(op.points for op in operations)
+    return skipped, len(operations), points
+
+
+def expiring_cards(tenant: Tenant, now: datetime, chunk_size: int):
+    lots = PointsLot.objects.filter(tenant=tenant, remaining__gt=0, expires_at__lte=now)
+    last = 0
+    while True:
+        chunk = list(
+            lots.filter(card_id__gt=last).order_by("card_id").values_list("card_id", flat=True).distinct()[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def expire_tenant(tenant: Tenant, now: datetime, chunk_size: int = 1000) -> tuple[int, int]:
+    chunks = expiring_cards(tenant, now, chunk_size)
+    cards_expired = 0
+    points_expired = 0
+    for attempt in range(settings.POINTS_EXPIRY_RETRIES + 1):
+        if attempt:
+            time.sleep(settings.POINTS_EXPIRY_RETRY_MS / 1000)
+        skipped = []
+        for chunk in chunks:
+            missed, cards, points = expire_cards(tenant, chunk, now)
+            skipped.extend(missed)
+            cards_expired += cards
+            points_expired += points
+        if not skipped:
+            break
+        chunks = [skipped[start : start + chunk_size] for start in range(0, len(skipped), chunk_size)]
+    return cards_expired, points_expired
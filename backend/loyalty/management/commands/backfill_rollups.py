@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loyalty.counters import day_bucket
+from loyalty.models import LoyaltyOperation, Tenant
+from loyalty.rollups import last_closed_day, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild daily operation rollups from the ledger for a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="Tenant slug, all tenants by default")
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First day, oldest by default")
+        parser.add_argument(
+            "--to", dest="date_to", type=date.fromisoformat, help="Last day, yesterday (UTC) by default and at most"
+        )
+        parser.add_argument("--days-per-batch", type=int, default=31)
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by("id")
+        if options["tenant"]:
+            tenants = tenants.filter(slug=options["tenant"])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} not found")
+        date_to = min(options["date_to"] or last_closed_day(), last_closed_day())
+        step = timedelta(days=max(options["days_per_batch"], 1))
+        total = 0
+        for tenant in tenants:
+            date_from = options["date_from"]
+            if date_from is None:
+                first = (
+                    LoyaltyOperation.objects.filter(tenant=tenant)
+                    .order_by("created_at")
+                    .values_list("created_at", flat=True)
+                    .first()
+                )
+                if first is None:
+                    continue
+                date_from = day_bucket(first)
+            written = 0
+            start = date_from
+            while start <= date_to:
+                end = min(start + step - timedelta(days=1), date_to)
+                written += rebuild_rollups(tenant.id, start, end)
+                start = end + timedelta(days=1)
+            total += written
+            self.stdout.write(f"{tenant.slug}: {written} rollup rows {date_from} .. {date_to}")
+        self.stdout.write(self.style.SUCCESS(f"Rollups rebuilt, {total} rows"))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from loyalty.lots import expire_tenant
+from loyalty.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Expire points lots past their expiry date and write EXPIRE operations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="Tenant slug, all tenants by default")
+        parser.add_argument("--chunk-size", type=int, default=settings.POINTS_EXPIRY_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by("id")
+        if options["tenant"]:
+            tenants = tenants.filter(slug=options["tenant"])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} not found")
+        now = timezone.now()
+        for tenant in tenants:
+            cards, points = expire_tenant(tenant, now, chunk_size=options["chunk_size"])
+            if cards:
+                self.stdout.write(f"{tenant.slug}: expired {points} points on {cards} cards")
+        self.stdout.write(self.style.SUCCESS("Expiry finished"))
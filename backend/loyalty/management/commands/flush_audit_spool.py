@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from loyalty.audit import recover_spool
+
+
+class Command(BaseCommand):
+    help = "Write audit entries left in spool files by stopped workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spool-dir", default=settings.AUDIT_SPOOL_DIR)
+
+    def handle(self, *args, **options):
+        recovered = recover_spool(options["spool_dir"])
+        self.stdout.write(self.style.SUCCESS(f"Recovered {recovered} audit entries"))
@@ -0,0 +1,41 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from loyalty.imports import import_customers, read_rows
+from loyalty.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Import clients and loyalty cards from a CSV with email, phone, first_name, last_name columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file, - for stdin")
+        parser.add_argument("--tenant", required=True, help="Tenant slug")
+        parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+        parser.add_argument("--no-copy", action="store_true", help="Use bulk INSERT even on PostgreSQL")
+
+    def handle(self, *args, **options):
+        tenant = Tenant.objects.filter(slug=options["tenant"]).first()
+        if tenant is None:
+            raise CommandError(f"Tenant {options['tenant']} not found")
+        started = time.monotonic()
+        stream = sys.stdin if options["path"] == "-" else open(options["path"], encoding="utf-8-sig", newline="")
+        with stream:
+            report = import_customers(
+                tenant,
+                read_rows(stream),
+                batch_size=max(options["batch_size"], 1),
+                use_copy=False if options["no_copy"] else None,
+                progress=lambda current: self.stdout.write(f"{current.rows} rows, {current.created} created"),
+            )
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(f"line {error['line']}: {error['reason']}"))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.created} clients from {report.rows} rows "
+                f"({report.duplicates} duplicates, {report.invalid} invalid) in {time.monotonic() - started:.1f}s"
+            )
+        )
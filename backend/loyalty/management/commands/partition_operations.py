@@ -0,0 +1,71 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from loyalty import partitions
+
+
+class Command(BaseCommand):
+    help = "Manage monthly range partitions of the loyalty operations ledger (PostgreSQL only)"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="action", required=True)
+        convert = subparsers.add_parser(
+            "convert", help="Move the ledger into a partitioned table, locking it while rows are copied"
+        )
+        ensure = subparsers.add_parser("ensure", help="Create partitions for the current and upcoming months")
+        for subparser in (convert, ensure):
+            subparser.add_argument("--months-ahead", type=int, default=settings.LEDGER_PARTITION_MONTHS_AHEAD)
+            subparser.add_argument(
+                "--tenant-buckets",
+                type=int,
+                default=settings.LEDGER_TENANT_BUCKETS,
+                help="Hash sub-partitions per month by tenant, 0 disables",
+            )
+        detach = subparsers.add_parser("detach", help="Detach partitions older than the given month for archival")
+        detach.add_argument("--before", required=True, help="First month to keep, YYYY-MM")
+        subparsers.add_parser("status", help="List partitions with estimated row counts")
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"handle_{options['action']}")(options)
+        except partitions.PartitioningUnavailable as exc:
+            raise CommandError(str(exc))
+
+    def handle_convert(self, options):
+        created, dropped = partitions.convert(options["months_ahead"], options["tenant_buckets"])
+        for name in dropped:
+            self.stdout.write(f"Dropped foreign key {name}, it cannot reference the partitioned ledger by id")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ledger partitioned into {len(created)} monthly partitions, "
+                f"old rows kept in {partitions.LEGACY_TABLE}"
+            )
+        )
+
+    def handle_ensure(self, options):
+        if not partitions.is_partitioned():
+            self.stdout.write("Ledger is not partitioned, nothing to do")
+            return
+        created = partitions.ensure(options["months_ahead"], options["tenant_buckets"])
+        self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partitions"))
+
+    def handle_detach(self, options):
+        try:
+            year, month = (int(part) for part in options["before"].split("-"))
+            before = date(year, month, 1)
+        except ValueError:
+            raise CommandError("--before must be YYYY-MM")
+        detached = partitions.detach_before(before)
+        for name in detached:
+            self.stdout.write(name)
+        self.stdout.write(self.style.SUCCESS(f"Detached {len(detached)} partitions"))
+
+    def handle_status(self, options):
+        if not partitions.is_partitioned():
+            self.stdout.write("Ledger is not partitioned")
+            return
+        for partition in partitions.list_partitions():
+            suffix = f" ({partition.subpartitions} tenant buckets)" if partition.subpartitions else ""
+            self.stdout.write(f"{partition.name}  {partition.bounds}  ~{partition.rows} rows{suffix}")
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from loyalty.retention import POLICIES, purge
+
+
+class Command(BaseCommand):
+    help = "Delete expired codes, tokens, idempotency records and old audit entries in bounded batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", action="append", choices=[policy.name for policy in POLICIES])
+        parser.add_argument("--batch-size", type=int, default=settings.PURGE_BATCH_SIZE)
+        parser.add_argument("--sleep-ms", type=int, default=settings.PURGE_SLEEP_MS)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive")
+        now = timezone.now()
+        total = 0
+        for policy in POLICIES:
+            if options["only"] and policy.name not in options["only"]:
+                continue
+            removed = purge(policy, now, options["batch_size"], options["sleep_ms"], dry_run=options["dry_run"])
+            total += removed
+            verb = "would remove" if options["dry_run"] else "removed"
+            self.stdout.write(f"{policy.table}: {verb} {removed} rows")
+        self.stdout.write(self.style.SUCCESS(f"Purge finished, {total} rows"))
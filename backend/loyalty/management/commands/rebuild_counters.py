@@ -0,0 +1,99 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncMinute
+from django.utils import timezone
+
+from loyalty.counters import day_bucket, day_start, minute_bucket
+from loyalty.models import CardDailyEarn, LoyaltyOperation, StaffMinuteOps
+
+
+class Command(BaseCommand):
+    help = "Rebuild daily earn and per-minute staff counters from the operations ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=2, help="History window in days, 0 rebuilds everything")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        batch_size = options["batch_size"]
+        since = timezone.now() - timedelta(days=days) if days else None
+
+        earn_ops = LoyaltyOperation.objects.filter(
+            type=LoyaltyOperation.Type.EARN,
+            status=LoyaltyOperation.Status.SUCCESS,
+        )
+        staff_ops = LoyaltyOperation.objects.filter(staff__isnull=False)
+        earn_counters = CardDailyEarn.objects.all()
+        staff_counters = StaffMinuteOps.objects.all()
+        if since:
+            first_day = day_bucket(since)
+            minute_start = minute_bucket(since)
+            earn_ops = earn_ops.filter(created_at__gte=day_start(first_day))
+            staff_ops = staff_ops.filter(created_at__gte=minute_start)
+            earn_counters = earn_counters.filter(day__gte=first_day)
+            staff_counters = staff_counters.filter(minute__gte=minute_start)
+
+        daily = (
+            earn_ops.annotate(bucket=TruncDate("created_at", tzinfo=timezone.get_current_timezone()))
+            .values("card_id", "bucket")
+            .annotate(total=Sum("points"))
+            .order_by()
+            .iterator(chunk_size=batch_size)
+        )
+        per_minute = (
+            staff_ops.annotate(bucket=TruncMinute("created_at", tzinfo=dt_timezone.utc))
+            .values("staff_id", "bucket")
+            .annotate(total=Count("id"))
+            .order_by()
+            .iterator(chunk_size=batch_size)
+        )
+
+        with transaction.atomic():
+            earn_counters.delete()
+            written = self.write(
+                CardDailyEarn,
+                (CardDailyEarn(card_id=row["card_id"], day=row["bucket"], points=row["total"]) for row in daily),
+                ["card", "day"],
+                ["points"],
+                batch_size,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Daily earn counters: {written}"))
+
+        with transaction.atomic():
+            staff_counters.delete()
+            written = self.write(
+                StaffMinuteOps,
+                (
+                    StaffMinuteOps(staff_id=row["staff_id"], minute=row["bucket"], count=row["total"])
+                    for row in per_minute
+                ),
+                ["staff", "minute"],
+                ["count"],
+                batch_size,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Staff minute counters: {written}"))
+
+    def write(self, model, rows, unique_fields, update_fields, batch_size) -> int:
+        written = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                written += self.flush(model, batch, unique_fields, update_fields)
+                batch = []
+        if batch:
+            written += self.flush(model, batch, unique_fields, update_fields)
+        return written
+
+    def flush(self, model, batch, unique_fields, update_fields) -> int:
+        model.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
+        )
+        return len(batch)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from loyalty.models import Tenant
+from loyalty.reconcile import reconcile_tenant, repair
+
+
+class Command(BaseCommand):
+    help = "Compare card balances and tiers with the operations ledger, optionally repairing drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="Tenant slug, all tenants by default")
+        parser.add_argument("--chunk-size", type=int, default=50000)
+        parser.add_argument("--repair", action="store_true", help="Apply the missing deltas to drifted cards")
+        parser.add_argument("--show", type=int, default=20, help="Drifted cards to list per tenant")
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by("id")
+        if options["tenant"]:
+            tenants = tenants.filter(slug=options["tenant"])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} not found")
+        total = 0
+        for tenant in tenants:
+            report = reconcile_tenant(tenant, chunk_size=options["chunk_size"])
+            total += len(report.drifts)
+            self.stdout.write(
+                f"{tenant.slug}: {report.cards} cards, {report.operations} operations, "
+                f"{report.balance_drifts} balance drifts, {report.tier_drifts} tier drifts"
+            )
+            for drift in report.drifts[: options["show"]]:
+                self.stdout.write(
+                    f"  card {drift.card_id}: points {drift.stored_points} -> {drift.expected_points}, "
+                    f"tier {drift.stored_tier} -> {drift.expected_tier}"
+                )
+            if options["repair"] and report.drifts:
+                self.stdout.write(f"  repaired {repair(report)} cards")
+        style = self.style.SUCCESS if not total or options["repair"] else self.style.WARNING
+        self.stdout.write(style(f"{total} drifted cards"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from loyalty.models import Segment, Tenant
+from loyalty.segments import refresh_segments
+
+
+class Command(BaseCommand):
+    help = "Recompute segment membership bitmaps from cards and the ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="Tenant slug, all tenants by default")
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.filter(id__in=Segment.objects.values("tenant_id")).order_by("id")
+        if options["tenant"]:
+            tenants = Tenant.objects.filter(slug=options["tenant"])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} not found")
+        refreshed = 0
+        for tenant in tenants:
+            sizes = refresh_segments(tenant)
+            refreshed += len(sizes)
+            for segment_id, size in sizes.items():
+                self.stdout.write(f"{tenant.slug}: segment {segment_id} has {size} members")
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} segments"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from loyalty.models import Tenant
+from loyalty.stats import refresh_stats
+
+
+class Command(BaseCommand):
+    help = "Recount per-tenant dashboard statistics and fix drift from the incremental counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="Tenant slug, all tenants by default")
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by("id")
+        if options["tenant"]:
+            tenants = tenants.filter(slug=options["tenant"])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['tenant']} not found")
+        repaired = 0
+        for tenant in tenants:
+            _, drift = refresh_stats(tenant.id)
+            if drift:
+                repaired += 1
+                changes = ", ".join(f"{field} {old} -> {new}" for field, (old, new) in drift.items())
+                self.stdout.write(f"{tenant.slug}: {changes}")
+        self.stdout.write(self.style.SUCCESS(f"Tenant stats repaired for {repaired} tenants"))
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from loyalty.jobs import claim_next, execute
+from loyalty.schedule import Scheduler
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+        parser.add_argument("--sleep", type=int, default=settings.JOBS_POLL_SECONDS)
+        parser.add_argument("--no-schedule", action="store_true", help="Skip periodic maintenance tasks")
+
+    def handle(self, *args, **options):
+        scheduler = None if options["no_schedule"] else Scheduler()
+        while True:
+            close_old_connections()
+            if scheduler is not None:
+                for name in scheduler.run_due():
+                    self.stdout.write(f"Periodic task {name} done")
+            job = claim_next()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
+                continue
+            self.stdout.write(f"Job {job.id} {job.kind} tenant={job.tenant_id} started")
+            execute(job)
+            message = f"Job {job.id} {job.status.lower()} processed={job.processed}/{job.total} result={job.result}"
+            style = self.style.SUCCESS if job.status == job.Status.DONE else self.style.ERROR
+            self.stdout.write(style(message))
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils.crypto import get_random_string
 from django.utils import timezone
+from loyalty.lots import lot_expiry
 from loyalty.models import (
     Tenant,
     OrganizationSettings,
@@ -10,6 +11,7 @@ from loyalty.models import (
     StaffProfile,
     LoyaltyCard,
     Offer,
+    PointsLot,
     Coupon,
     CouponAssignment,
 )
@@ -86,6 +88,14 @@ class Command(BaseCommand):
                 phone_verified=True,
             )
             card = LoyaltyCard.objects.create(user=client, tenant=tenant, current_points=120)
+            PointsLot.objects.create(
+                tenant=tenant,
+                card=card,
+                points=120,
+                remaining=120,
+                earned_at=timezone.now(),
+                expires_at=lot_expiry(timezone.now()),
+            )
         else:
             card = getattr(client, "card", None)
 
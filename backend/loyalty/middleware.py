@@ -1,6 +1,6 @@
 ﻿from django.http import Http404
 from django.utils.deprecation import MiddlewareMixin
-from .models import Tenant
+from .caching import get_tenant_by_slug
 
 
 class TenantMiddleware(MiddlewareMixin):
@@ -12,8 +12,8 @@ class TenantMiddleware(MiddlewareMixin):
         slug = view_kwargs.get("tenant_slug") if view_kwargs else None
         if not slug:
             return None
-        try:
-            request.tenant = Tenant.objects.get(slug=slug)
-        except Tenant.DoesNotExist as exc:
-            raise Http404("Tenant not found") from exc
+        tenant = get_tenant_by_slug(slug)
+        if tenant is None:
+            raise Http404("Tenant not found")
+        request.tenant = tenant
         return None
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0012_user_email_nullable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardDailyEarn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('points', models.IntegerField(default=0, verbose_name='Баллы')),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_earn', to='loyalty.loyaltycard', verbose_name='Карта')),
+            ],
+            options={
+                'verbose_name': 'Начисления карты за день',
+                'verbose_name_plural': 'Начисления карт за день',
+            },
+        ),
+        migrations.CreateModel(
+            name='StaffHourlyOps',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('count', models.IntegerField(default=0, verbose_name='Операции')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_ops', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Операции сотрудника за час',
+                'verbose_name_plural': 'Операции сотрудников за час',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='carddailyearn',
+            constraint=models.UniqueConstraint(fields=('card', 'day'), name='uniq_card_daily_earn'),
+        ),
+        migrations.AddConstraint(
+            model_name='staffhourlyops',
+            constraint=models.UniqueConstraint(fields=('staff', 'hour'), name='uniq_staff_hourly_ops'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0013_operation_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=80, verbose_name='Ключ')),
+                ('status_code', models.PositiveSmallIntegerField(default=200, verbose_name='HTTP статус')),
+                ('body', models.TextField(verbose_name='Ответ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('expires_at', models.DateTimeField(verbose_name='Истекает')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_records', to='loyalty.tenant', verbose_name='Арендатор')),
+            ],
+            options={
+                'verbose_name': 'Ответ идемпотентного запроса',
+                'verbose_name_plural': 'Ответы идемпотентных запросов',
+                'indexes': [models.Index(fields=['expires_at'], name='loyalty_ide_expires_fb21d5_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencyrecord',
+            constraint=models.UniqueConstraint(fields=('tenant', 'key'), name='uniq_idempotency_key_per_tenant'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0015_auditlog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RETIER', 'Пересчёт уровней')], max_length=32, verbose_name='Тип')),
+                ('status', models.CharField(choices=[('PENDING', 'В очереди'), ('RUNNING', 'Выполняется'), ('DONE', 'Завершена'), ('FAILED', 'Ошибка')], default='PENDING', max_length=16, verbose_name='Статус')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('result', models.JSONField(blank=True, default=dict, verbose_name='Результат')),
+                ('processed', models.IntegerField(default=0, verbose_name='Обработано')),
+                ('total', models.IntegerField(default=0, verbose_name='Всего')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Запущена')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='loyalty.tenant', verbose_name='Арендатор')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'indexes': [models.Index(fields=['status', 'id'], name='loyalty_job_status_5de248_idx'), models.Index(fields=['tenant', 'kind', 'status'], name='loyalty_job_tenant__05dd3b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:33
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_lots(apps, schema_editor):
+    LoyaltyCard = apps.get_model("loyalty", "LoyaltyCard")
+    PointsLot = apps.get_model("loyalty", "PointsLot")
+    now = timezone.now()
+    expires_at = now + timedelta(days=settings.POINTS_TTL_DAYS) if settings.POINTS_TTL_DAYS else None
+    cards = LoyaltyCard.objects.filter(current_points__gt=0).order_by("id").values_list("id", "tenant_id", "current_points")
+    last_id = 0
+    while True:
+        batch = list(cards.filter(id__gt=last_id)[:5000])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        PointsLot.objects.bulk_create(
+            [
+                PointsLot(
+                    card_id=card_id,
+                    tenant_id=tenant_id,
+                    points=points,
+                    remaining=points,
+                    earned_at=now,
+                    expires_at=expires_at,
+                )
+                for card_id, tenant_id, points in batch
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0017_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loyaltyoperation',
+            name='source',
+            field=models.CharField(choices=[('POS', 'POS'), ('CASHIER_APP', 'Касса'), ('ADMIN_PORTAL', 'Админ-портал'), ('SYSTEM', 'Система')], max_length=16, verbose_name='Источник'),
+        ),
+        migrations.AlterField(
+            model_name='loyaltyoperation',
+            name='type',
+            field=models.CharField(choices=[('EARN', 'Начисление'), ('REDEEM', 'Списание'), ('REFUND', 'Возврат'), ('EXPIRE', 'Сгорание')], max_length=8, verbose_name='Тип'),
+        ),
+        migrations.CreateModel(
+            name='PointsLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField(verbose_name='Начислено')),
+                ('remaining', models.IntegerField(verbose_name='Остаток')),
+                ('earned_at', models.DateTimeField(verbose_name='Начислено в')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Сгорает')),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_lots', to='loyalty.loyaltycard', verbose_name='Карта')),
+                ('operation', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='loyalty.loyaltyoperation', verbose_name='Операция')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_lots', to='loyalty.tenant', verbose_name='Арендатор')),
+            ],
+            options={
+                'verbose_name': 'Партия баллов',
+                'verbose_name_plural': 'Партии баллов',
+                'indexes': [models.Index(condition=models.Q(('remaining__gt', 0)), fields=['card', 'expires_at', 'id'], name='lot_open_by_card'), models.Index(condition=models.Q(('remaining__gt', 0)), fields=['tenant', 'expires_at', 'card'], name='lot_open_by_expiry')],
+            },
+        ),
+        migrations.RunPython(backfill_lots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0018_points_lots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loyaltycard',
+            name='qr_counter',
+            field=models.BigIntegerField(default=0, verbose_name='Последний шаг QR'),
+        ),
+        migrations.AddField(
+            model_name='loyaltycard',
+            name='qr_key_version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Версия ключа QR'),
+        ),
+    ]
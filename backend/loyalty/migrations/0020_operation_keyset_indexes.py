@@ -0,0 +1,25 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0019_card_rolling_qr'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loyaltyoperation',
+            index=models.Index(fields=['card', 'created_at', 'id'], name='op_card_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='loyaltyoperation',
+            index=models.Index(fields=['tenant', 'created_at', 'id'], name='op_tenant_created_id'),
+        ),
+        migrations.RemoveIndex(
+            model_name='loyaltyoperation',
+            name='loyalty_loy_card_id_9737c6_idx',
+        ),
+    ]
@@ -0,0 +1,67 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+TABLE = "loyalty_loyaltyoperation"
+PREFIX_INDEX = "op_receipt_prefix"
+TRIGRAM_INDEX = "op_receipt_trgm"
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{PREFIX_INDEX}" ON "{TABLE}" '
+            "(tenant_id, receipt_id varchar_pattern_ops)"
+        )
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{TRIGRAM_INDEX}" ON "{TABLE}" '
+            "USING gin ((UPPER(receipt_id::text)) gin_trgm_ops)"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{TRIGRAM_INDEX}"')
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{PREFIX_INDEX}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('loyalty', '0020_operation_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='loyaltyoperation',
+                    index=models.Index(
+                        models.F('tenant'),
+                        django.contrib.postgres.indexes.OpClass(models.F('receipt_id'), name='varchar_pattern_ops'),
+                        name='op_receipt_prefix',
+                    ),
+                ),
+                migrations.AddIndex(
+                    model_name='loyaltyoperation',
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        django.contrib.postgres.indexes.OpClass(
+                            django.db.models.functions.text.Upper('receipt_id'), name='gin_trgm_ops'
+                        ),
+                        name='op_receipt_trgm',
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:43
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+TABLE = "loyalty_user"
+ROLE_INDEX = models.Index(fields=['tenant', 'role', 'id'], name='user_tenant_role_id')
+PREFIX_INDEXES = {
+    "user_email_prefix": "(tenant_id, (UPPER(email::text)) text_pattern_ops)",
+    "user_first_name_prefix": "(tenant_id, (UPPER(first_name::text)) text_pattern_ops)",
+    "user_last_name_prefix": "(tenant_id, (UPPER(last_name::text)) text_pattern_ops)",
+    "user_phone_prefix": "(tenant_id, phone varchar_pattern_ops)",
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.add_index(apps.get_model("loyalty", "User"), ROLE_INDEX)
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{ROLE_INDEX.name}" ON "{TABLE}" (tenant_id, role, id)'
+        )
+        for name, columns in PREFIX_INDEXES.items():
+            cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{TABLE}" {columns}')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.remove_index(apps.get_model("loyalty", "User"), ROLE_INDEX)
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name in [*PREFIX_INDEXES, ROLE_INDEX.name]:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def prefix_index(name, expression, opclass):
+    return migrations.AddIndex(
+        model_name='user',
+        index=models.Index(
+            models.F('tenant'), django.contrib.postgres.indexes.OpClass(expression, name=opclass), name=name
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('loyalty', '0021_receipt_search_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+            state_operations=[
+                migrations.AddIndex(model_name='user', index=ROLE_INDEX),
+                prefix_index('user_email_prefix', Upper('email'), 'text_pattern_ops'),
+                prefix_index('user_first_name_prefix', Upper('first_name'), 'text_pattern_ops'),
+                prefix_index('user_last_name_prefix', Upper('last_name'), 'text_pattern_ops'),
+                prefix_index('user_phone_prefix', models.F('phone'), 'varchar_pattern_ops'),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0022_customer_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantStats',
+            fields=[
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='loyalty.tenant', verbose_name='Арендатор')),
+                ('clients', models.IntegerField(default=0, verbose_name='Клиенты')),
+                ('staff', models.IntegerField(default=0, verbose_name='Сотрудники')),
+                ('locations', models.IntegerField(default=0, verbose_name='Точки')),
+                ('operations', models.BigIntegerField(default=0, verbose_name='Операции')),
+                ('points_issued', models.BigIntegerField(default=0, verbose_name='Начислено баллов')),
+                ('points_redeemed', models.BigIntegerField(default=0, verbose_name='Списано баллов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Статистика арендатора',
+                'verbose_name_plural': 'Статистика арендаторов',
+            },
+        ),
+    ]
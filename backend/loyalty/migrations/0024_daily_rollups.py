@@ -0,0 +1,37 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0023_tenant_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('location_id', models.BigIntegerField(default=0, verbose_name='Локация')),
+                ('type', models.CharField(choices=[('EARN', 'Начисление'), ('REDEEM', 'Списание'), ('REFUND', 'Возврат'), ('EXPIRE', 'Сгорание')], max_length=8, verbose_name='Тип')),
+                ('source', models.CharField(choices=[('POS', 'POS'), ('CASHIER_APP', 'Касса'), ('ADMIN_PORTAL', 'Админ-портал'), ('SYSTEM', 'Система')], max_length=16, verbose_name='Источник')),
+                ('operations', models.IntegerField(default=0, verbose_name='Операции')),
+                ('failed', models.IntegerField(default=0, verbose_name='Ошибки')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Сумма')),
+                ('points', models.BigIntegerField(default=0, verbose_name='Баллы')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='loyalty.tenant', verbose_name='Арендатор')),
+            ],
+            options={
+                'verbose_name': 'Дневная сводка операций',
+                'verbose_name_plural': 'Дневные сводки операций',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('tenant', 'day', 'location_id', 'type', 'source'), name='uniq_daily_rollup'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0024_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loyaltyoperation',
+            index=models.Index(fields=['location', 'created_at', 'id'], name='op_location_created_id'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0025_operation_location_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('RETIER', 'Пересчёт уровней'), ('IMPORT_CUSTOMERS', 'Импорт клиентов')], max_length=32, verbose_name='Тип'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-17 00:02
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def drop_duplicate_assignments(apps, schema_editor):
+    CouponAssignment = apps.get_model("loyalty", "CouponAssignment")
+    duplicates = (
+        CouponAssignment.objects.values("card_id", "coupon_id").annotate(copies=Count("id")).filter(copies__gt=1)
+    )
+    for row in list(duplicates):
+        copies = CouponAssignment.objects.filter(card_id=row["card_id"], coupon_id=row["coupon_id"])
+        keep = copies.order_by(F("used_at").desc(nulls_last=True), "id").values_list("id", flat=True).first()
+        copies.exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0026_job_import_customers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('RETIER', 'Пересчёт уровней'), ('IMPORT_CUSTOMERS', 'Импорт клиентов'), ('ISSUE_COUPON', 'Выдача купона')], max_length=32, verbose_name='Тип'),
+        ),
+        migrations.RunPython(drop_duplicate_assignments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='couponassignment',
+            constraint=models.UniqueConstraint(fields=('card', 'coupon'), name='uniq_coupon_per_card'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.7 on 2026-10-17 00:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0027_coupon_assignment_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('RETIER', 'Пересчёт уровней'), ('IMPORT_CUSTOMERS', 'Импорт клиентов'), ('ISSUE_COUPON', 'Выдача купона'), ('REFRESH_SEGMENTS', 'Пересчёт сегментов')], max_length=32, verbose_name='Тип'),
+        ),
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120, verbose_name='Название')),
+                ('tier', models.CharField(blank=True, max_length=16, verbose_name='Уровень')),
+                ('points_min', models.IntegerField(blank=True, null=True, verbose_name='Баллы от')),
+                ('points_max', models.IntegerField(blank=True, null=True, verbose_name='Баллы до')),
+                ('active_days', models.PositiveIntegerField(blank=True, null=True, verbose_name='Активность за дней')),
+                ('members', models.BinaryField(default=bytes, verbose_name='Участники')),
+                ('base_id', models.BigIntegerField(default=0, editable=False, verbose_name='Первый ID битовой карты')),
+                ('size', models.IntegerField(default=0, editable=False, verbose_name='Участников')),
+                ('refreshed_at', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Пересчитан')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='loyalty.location', verbose_name='Локация')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='loyalty.tenant', verbose_name='Арендатор')),
+            ],
+            options={
+                'verbose_name': 'Сегмент',
+                'verbose_name_plural': 'Сегменты',
+            },
+        ),
+        migrations.AddField(
+            model_name='loyaltyrule',
+            name='segment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rules', to='loyalty.segment', verbose_name='Сегмент'),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='segment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='offers', to='loyalty.segment', verbose_name='Сегмент'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-17 00:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0030_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='Пользователь')),
+                ('present', models.BooleanField(verbose_name='Входит')),
+                ('updated_at', models.DateTimeField(verbose_name='Изменено')),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deltas', to='loyalty.segment', verbose_name='Сегмент')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='loyalty.tenant', verbose_name='Арендатор')),
+            ],
+            options={
+                'verbose_name': 'Изменение сегмента',
+                'verbose_name_plural': 'Изменения сегментов',
+                'indexes': [models.Index(fields=['tenant', 'segment'], name='loyalty_seg_tenant__f855cc_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='segmentdelta',
+            constraint=models.UniqueConstraint(fields=('segment', 'user_id'), name='uniq_segment_delta'),
+        ),
+    ]
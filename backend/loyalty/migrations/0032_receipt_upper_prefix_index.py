@@ -0,0 +1,60 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+TABLE = "loyalty_loyaltyoperation"
+OLD_INDEX = "op_receipt_prefix"
+NEW_INDEX = "op_receipt_upper_prefix"
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{NEW_INDEX}" ON "{TABLE}" '
+            "(tenant_id, (UPPER(receipt_id::text)) text_pattern_ops)"
+        )
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{OLD_INDEX}"')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{OLD_INDEX}" ON "{TABLE}" '
+            "(tenant_id, receipt_id varchar_pattern_ops)"
+        )
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{NEW_INDEX}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('loyalty', '0031_segment_deltas'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_index, drop_index)],
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='loyaltyoperation',
+                    name='op_receipt_prefix',
+                ),
+                migrations.AddIndex(
+                    model_name='loyaltyoperation',
+                    index=models.Index(
+                        models.F('tenant'),
+                        django.contrib.postgres.indexes.OpClass(
+                            django.db.models.functions.text.Upper('receipt_id'), name='text_pattern_ops'
+                        ),
+                        name='op_receipt_upper_prefix',
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.7 on 2026-10-17 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0032_receipt_upper_prefix_index'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='staffhourlyops',
+            name='uniq_staff_hourly_ops',
+        ),
+        migrations.RenameModel(
+            old_name='StaffHourlyOps',
+            new_name='StaffMinuteOps',
+        ),
+        migrations.RenameField(
+            model_name='staffminuteops',
+            old_name='hour',
+            new_name='minute',
+        ),
+        migrations.AlterModelOptions(
+            name='staffminuteops',
+            options={'verbose_name': 'Операции сотрудника за минуту', 'verbose_name_plural': 'Операции сотрудников за минуту'},
+        ),
+        migrations.AlterField(
+            model_name='staffminuteops',
+            name='minute',
+            field=models.DateTimeField(verbose_name='Минута'),
+        ),
+        migrations.AlterField(
+            model_name='staffminuteops',
+            name='staff',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='minute_ops', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник'),
+        ),
+        migrations.AddConstraint(
+            model_name='staffminuteops',
+            constraint=models.UniqueConstraint(fields=('staff', 'minute'), name='uniq_staff_minute_ops'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+OLD_INDEXES = {
+    "user_email_prefix": "(tenant_id, (UPPER(email::text)) text_pattern_ops)",
+    "user_first_name_prefix": "(tenant_id, (UPPER(first_name::text)) text_pattern_ops)",
+    "user_last_name_prefix": "(tenant_id, (UPPER(last_name::text)) text_pattern_ops)",
+    "user_phone_prefix": "(tenant_id, phone varchar_pattern_ops)",
+}
+NEW_INDEXES = {
+    "user_email_order": "(tenant_id, (UPPER(email::text) COLLATE \"C\"), id)",
+    "user_first_name_order": "(tenant_id, (UPPER(first_name::text) COLLATE \"C\"), id)",
+    "user_last_name_order": "(tenant_id, (UPPER(last_name::text) COLLATE \"C\"), id)",
+    "user_phone_order": "(tenant_id, (phone COLLATE \"C\"), id)",
+}
+CARD_INDEX = models.Index(fields=['tenant', 'current_points', 'user'], name='card_tenant_points_user')
+
+
+def swap_indexes(schema_editor, create: dict, drop: dict) -> None:
+    with schema_editor.connection.cursor() as cursor:
+        for name, columns in create.items():
+            cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "loyalty_user" {columns}')
+        for name in drop:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.add_index(apps.get_model("loyalty", "LoyaltyCard"), CARD_INDEX)
+        return
+    swap_indexes(schema_editor, NEW_INDEXES, OLD_INDEXES)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{CARD_INDEX.name}" ON "loyalty_loyaltycard" '
+            "(tenant_id, current_points, user_id)"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.remove_index(apps.get_model("loyalty", "LoyaltyCard"), CARD_INDEX)
+        return
+    swap_indexes(schema_editor, OLD_INDEXES, NEW_INDEXES)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{CARD_INDEX.name}"')
+
+
+def order_index(name, expression):
+    return migrations.AddIndex(
+        model_name='user',
+        index=models.Index(
+            models.F('tenant'),
+            django.db.models.functions.comparison.Collate(expression, 'C'),
+            models.F('id'),
+            name=name,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('loyalty', '0033_staff_minute_ops'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+            state_operations=[
+                *(migrations.RemoveIndex(model_name='user', name=name) for name in OLD_INDEXES),
+                order_index('user_email_order', django.db.models.functions.text.Upper('email')),
+                order_index('user_first_name_order', django.db.models.functions.text.Upper('first_name')),
+                order_index('user_last_name_order', django.db.models.functions.text.Upper('last_name')),
+                order_index('user_phone_order', 'phone'),
+                migrations.AddIndex(model_name='loyaltycard', index=CARD_INDEX),
+            ],
+        ),
+    ]
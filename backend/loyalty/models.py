@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
 from django.db.models import Q
+from django.db.models.functions import Collate, Upper
 from django.utils import timezone
 
 
@@ -111,6 +113,13 @@ class User(AbstractUser):
                 condition=~Q(phone=""),
             ),
         ]
+        indexes = [
+            models.Index(fields=["tenant", "role", "id"], name="user_tenant_role_id"),
+            models.Index("tenant", Collate(Upper("email"), "C"), "id", name="user_email_order"),
+            models.Index("tenant", Collate(Upper("first_name"), "C"), "id", name="user_first_name_order"),
+            models.Index("tenant", Collate(Upper("last_name"), "C"), "id", name="user_last_name_order"),
+            models.Index("tenant", Collate("phone", "C"), "id", name="user_phone_order"),
+        ]
 
     def otp_is_valid(self, code_hash: str) -> bool:
         if not self.otp_hash or not self.otp_expires_at:
@@ -142,6 +151,48 @@ class StaffProfile(models.Model):
         verbose_name_plural = "Профили сотрудников"
 
 
+class Segment(models.Model):
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="segments", verbose_name="Арендатор")
+    name = models.CharField("Название", max_length=120)
+    tier = models.CharField("Уровень", max_length=16, blank=True)
+    points_min = models.IntegerField("Баллы от", null=True, blank=True)
+    points_max = models.IntegerField("Баллы до", null=True, blank=True)
+    active_days = models.PositiveIntegerField("Активность за дней", null=True, blank=True)
+    location = models.ForeignKey(
+        Location, on_delete=models.CASCADE, related_name="segments", null=True, blank=True, verbose_name="Локация"
+    )
+    members = models.BinaryField("Участники", default=bytes, editable=False)
+    base_id = models.BigIntegerField("Первый ID битовой карты", default=0, editable=False)
+    size = models.IntegerField("Участников", default=0, editable=False)
+    refreshed_at = models.DateTimeField("Пересчитан", null=True, blank=True, editable=False)
+    created_at = models.DateTimeField("Создан", auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.tenant.slug}:{self.name}"
+
+    class Meta:
+        verbose_name = "Сегмент"
+        verbose_name_plural = "Сегменты"
+
+
+class SegmentDelta(models.Model):
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="+", verbose_name="Арендатор")
+    segment = models.ForeignKey(Segment, on_delete=models.CASCADE, related_name="deltas", verbose_name="Сегмент")
+    user_id = models.BigIntegerField("Пользователь")
+    present = models.BooleanField("Входит")
+    updated_at = models.DateTimeField("Изменено")
+
+    class Meta:
+        verbose_name = "Изменение сегмента"
+        verbose_name_plural = "Изменения сегментов"
+        constraints = [
+            models.UniqueConstraint(fields=["segment", "user_id"], name="uniq_segment_delta"),
+        ]
+        indexes = [
+            models.Index(fields=["tenant", "segment"]),
+        ]
+
+
 class LoyaltyCard(models.Model):
     class Status(models.TextChoices):
         ACTIVE = "ACTIVE", "Активна"
@@ -152,6 +203,8 @@ class LoyaltyCard(models.Model):
     status = models.CharField("Статус", max_length=16, choices=Status.choices, default=Status.ACTIVE)
     current_points = models.IntegerField("Текущие баллы", default=0)
     tier = models.CharField("Уровень", max_length=16, default="Bronze")
+    qr_key_version = models.PositiveIntegerField("Версия ключа QR", default=1)
+    qr_counter = models.BigIntegerField("Последний шаг QR", default=0)
 
     def __str__(self):
         return f"{self.tenant.slug}:{self.user.email}"
@@ -159,6 +212,9 @@ class LoyaltyCard(models.Model):
     class Meta:
         verbose_name = "Карта лояльности"
         verbose_name_plural = "Карты лояльности"
+        indexes = [
+            models.Index(fields=["tenant", "current_points", "user"], name="card_tenant_points_user"),
+        ]
 
 
 class OneTimeQR(models.Model):
@@ -195,6 +251,9 @@ class LoyaltyRule(models.Model):
     silver_threshold = models.IntegerField("Порог Silver", default=500)
     gold_threshold = models.IntegerField("Порог Gold", default=1500)
     applies_to_all = models.BooleanField("Applies to all clients", default=True)
+    segment = models.ForeignKey(
+        Segment, on_delete=models.SET_NULL, related_name="rules", null=True, blank=True, verbose_name="Сегмент"
+    )
 
     class Meta:
         verbose_name = "Правило лояльности"
@@ -235,6 +294,9 @@ class Offer(models.Model):
     active_to = models.DateTimeField("Активно по", null=True, blank=True)
     is_active = models.BooleanField("Активно", default=True)
     applies_to_all = models.BooleanField("Applies to all clients", default=True)
+    segment = models.ForeignKey(
+        Segment, on_delete=models.SET_NULL, related_name="offers", null=True, blank=True, verbose_name="Сегмент"
+    )
 
     class Meta:
         verbose_name = "Предложение"
@@ -308,6 +370,9 @@ class CouponAssignment(models.Model):
     class Meta:
         verbose_name = "Выданный купон"
         verbose_name_plural = "Выданные купоны"
+        constraints = [
+            models.UniqueConstraint(fields=["card", "coupon"], name="uniq_coupon_per_card"),
+        ]
         indexes = [
             models.Index(fields=["tenant", "created_at"]),
             models.Index(fields=["tenant", "status"]),
@@ -319,11 +384,13 @@ class LoyaltyOperation(models.Model):
         EARN = "EARN", "Начисление"
         REDEEM = "REDEEM", "Списание"
         REFUND = "REFUND", "Возврат"
+        EXPIRE = "EXPIRE", "Сгорание"
 
     class Source(models.TextChoices):
         POS = "POS", "POS"
         CASHIER_APP = "CASHIER_APP", "Касса"
         ADMIN_PORTAL = "ADMIN_PORTAL", "Админ-портал"
+        SYSTEM = "SYSTEM", "Система"
 
     class Status(models.TextChoices):
         SUCCESS = "SUCCESS", "Успешно"
@@ -338,7 +405,9 @@ class LoyaltyOperation(models.Model):
     receipt_id = models.CharField("Чек", max_length=64, null=True, blank=True)
     order_id = models.CharField("Заказ", max_length=64, null=True, blank=True)
     idempotency_key = models.CharField("Ключ идемпотентности", max_length=64, unique=True, null=True, blank=True)
-    original_operation = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Операция-источник")
+    original_operation = models.ForeignKey(
+        "self", on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Операция-источник"
+    )
     staff = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, blank=True, related_name="staff_operations", verbose_name="Сотрудник"
     )
@@ -354,7 +423,173 @@ class LoyaltyOperation(models.Model):
         indexes = [
             models.Index(fields=["tenant", "receipt_id"]),
             models.Index(fields=["tenant", "idempotency_key"]),
-            models.Index(fields=["card", "created_at"]),
+            models.Index(fields=["card", "created_at", "id"], name="op_card_created_id"),
+            models.Index(fields=["tenant", "created_at", "id"], name="op_tenant_created_id"),
+            models.Index(fields=["location", "created_at", "id"], name="op_location_created_id"),
+            models.Index(
+                "tenant", OpClass(Upper("receipt_id"), name="text_pattern_ops"), name="op_receipt_upper_prefix"
+            ),
+            GinIndex(OpClass(Upper("receipt_id"), name="gin_trgm_ops"), name="op_receipt_trgm"),
+        ]
+
+
+class PointsLot(models.Model):
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="points_lots", verbose_name="Арендатор")
+    card = models.ForeignKey(LoyaltyCard, on_delete=models.CASCADE, related_name="points_lots", verbose_name="Карта")
+    operation = models.ForeignKey(
+        LoyaltyOperation,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name="+",
+        verbose_name="Операция",
+    )
+    points = models.IntegerField("Начислено")
+    remaining = models.IntegerField("Остаток")
+    earned_at = models.DateTimeField("Начислено в")
+    expires_at = models.DateTimeField("Сгорает", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Партия баллов"
+        verbose_name_plural = "Партии баллов"
+        indexes = [
+            models.Index(
+                fields=["card", "expires_at", "id"], name="lot_open_by_card", condition=Q(remaining__gt=0)
+            ),
+            models.Index(
+                fields=["tenant", "expires_at", "card"], name="lot_open_by_expiry", condition=Q(remaining__gt=0)
+            ),
+        ]
+
+
+class IdempotencyRecord(models.Model):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.CASCADE, related_name="idempotency_records", verbose_name="Арендатор"
+    )
+    key = models.CharField("Ключ", max_length=80)
+    status_code = models.PositiveSmallIntegerField("HTTP статус", default=200)
+    body = models.TextField("Ответ")
+    created_at = models.DateTimeField("Создан", auto_now_add=True)
+    expires_at = models.DateTimeField("Истекает")
+
+    class Meta:
+        verbose_name = "Ответ идемпотентного запроса"
+        verbose_name_plural = "Ответы идемпотентных запросов"
+        constraints = [
+            models.UniqueConstraint(fields=["tenant", "key"], name="uniq_idempotency_key_per_tenant"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"]),
+        ]
+
+
+class Job(models.Model):
+    class Kind(models.TextChoices):
+        RETIER = "RETIER", "Пересчёт уровней"
+        IMPORT_CUSTOMERS = "IMPORT_CUSTOMERS", "Импорт клиентов"
+        ISSUE_COUPON = "ISSUE_COUPON", "Выдача купона"
+        REFRESH_SEGMENTS = "REFRESH_SEGMENTS", "Пересчёт сегментов"
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "В очереди"
+        RUNNING = "RUNNING", "Выполняется"
+        DONE = "DONE", "Завершена"
+        FAILED = "FAILED", "Ошибка"
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="jobs", verbose_name="Арендатор")
+    kind = models.CharField("Тип", max_length=32, choices=Kind.choices)
+    status = models.CharField("Статус", max_length=16, choices=Status.choices, default=Status.PENDING)
+    payload = models.JSONField("Параметры", default=dict, blank=True)
+    result = models.JSONField("Результат", default=dict, blank=True)
+    processed = models.IntegerField("Обработано", default=0)
+    total = models.IntegerField("Всего", default=0)
+    error = models.TextField("Ошибка", blank=True)
+    created_at = models.DateTimeField("Создана", auto_now_add=True)
+    started_at = models.DateTimeField("Запущена", null=True, blank=True)
+    heartbeat_at = models.DateTimeField("Последний сигнал", null=True, blank=True)
+    attempts = models.IntegerField("Попытки", default=0)
+    finished_at = models.DateTimeField("Завершена", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            models.Index(fields=["status", "id"]),
+            models.Index(fields=["tenant", "kind", "status"]),
+        ]
+
+
+class CacheVersion(models.Model):
+    key = models.CharField("Ключ", max_length=128, unique=True)
+    version = models.BigIntegerField("Версия", default=0)
+
+    class Meta:
+        verbose_name = "Версия кэша"
+        verbose_name_plural = "Версии кэша"
+
+
+class TenantStats(models.Model):
+    tenant = models.OneToOneField(
+        Tenant, on_delete=models.CASCADE, primary_key=True, related_name="stats", verbose_name="Арендатор"
+    )
+    clients = models.IntegerField("Клиенты", default=0)
+    staff = models.IntegerField("Сотрудники", default=0)
+    locations = models.IntegerField("Точки", default=0)
+    operations = models.BigIntegerField("Операции", default=0)
+    points_issued = models.BigIntegerField("Начислено баллов", default=0)
+    points_redeemed = models.BigIntegerField("Списано баллов", default=0)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
+
+    class Meta:
+        verbose_name = "Статистика арендатора"
+        verbose_name_plural = "Статистика арендаторов"
+
+
+class DailyRollup(models.Model):
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="daily_rollups", verbose_name="Арендатор")
+    day = models.DateField("День")
+    location_id = models.BigIntegerField("Локация", default=0)
+    type = models.CharField("Тип", max_length=8, choices=LoyaltyOperation.Type.choices)
+    source = models.CharField("Источник", max_length=16, choices=LoyaltyOperation.Source.choices)
+    operations = models.IntegerField("Операции", default=0)
+    failed = models.IntegerField("Ошибки", default=0)
+    amount = models.DecimalField("Сумма", max_digits=16, decimal_places=2, default=0)
+    points = models.BigIntegerField("Баллы", default=0)
+
+    class Meta:
+        verbose_name = "Дневная сводка операций"
+        verbose_name_plural = "Дневные сводки операций"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "day", "location_id", "type", "source"], name="uniq_daily_rollup"
+            ),
+        ]
+
+
+class CardDailyEarn(models.Model):
+    card = models.ForeignKey(LoyaltyCard, on_delete=models.CASCADE, related_name="daily_earn", verbose_name="Карта")
+    day = models.DateField("День")
+    points = models.IntegerField("Баллы", default=0)
+
+    class Meta:
+        verbose_name = "Начисления карты за день"
+        verbose_name_plural = "Начисления карт за день"
+        constraints = [
+            models.UniqueConstraint(fields=["card", "day"], name="uniq_card_daily_earn"),
+        ]
+
+
+class StaffMinuteOps(models.Model):
+    staff = models.ForeignKey(User, on_delete=models.CASCADE, related_name="minute_ops", verbose_name="Сотрудник")
+    minute = models.DateTimeField("Минута")
+    count = models.IntegerField("Операции", default=0)
+
+    class Meta:
+        verbose_name = "Операции сотрудника за минуту"
+        verbose_name_plural = "Операции сотрудников за минуту"
+        constraints = [
+            models.UniqueConstraint(fields=["staff", "minute"], name="uniq_staff_minute_ops"),
         ]
 
 
@@ -405,7 +640,7 @@ class AuditLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Пользователь")
     action = models.CharField("Действие", max_length=64)
     metadata = models.JSONField("Метаданные", default=dict, blank=True)
-    created_at = models.DateTimeField("Создан", auto_now_add=True)
+    created_at = models.DateTimeField("Создан", default=timezone.now)
 
     class Meta:
         verbose_name = "Журнал аудита"
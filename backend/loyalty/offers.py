@@ -0,0 +1,117 @@
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+
+from .caching import VersionedLocalCache
+from .models import Offer, OfferTarget
+from .segments import get_segment_index
+
+
+@dataclass(frozen=True)
+class CompiledOffer:
+    id: int
+    type: str
+    multiplier: Decimal
+    bonus_points: int
+    active_from: datetime | None
+    active_to: datetime | None
+
+    def active_at(self, now: datetime) -> bool:
+        if self.active_from is not None and now < self.active_from:
+            return False
+        return self.active_to is None or now <= self.active_to
+
+    def overlaps(self, start: datetime | None, end: datetime | None) -> bool:
+        if start is not None and self.active_to is not None and self.active_to < start:
+            return False
+        return end is None or self.active_from is None or self.active_from <= end
+
+
+class OfferIndex:
+    def __init__(
+        self,
+        tenant_id: int,
+        general: list[CompiledOffer],
+        targeted: list[tuple[CompiledOffer, int]],
+        segmented: list[tuple[CompiledOffer, int]] = (),
+    ):
+        self.tenant_id = tenant_id
+        self.by_segment = list(segmented)
+        self.boundaries = sorted(
+            {moment for offer in general for moment in (offer.active_from, offer.active_to) if moment is not None}
+        )
+        edges = [None, *self.boundaries, None]
+        self.windows = [
+            tuple(offer for offer in general if offer.overlaps(edges[index], edges[index + 1]))
+            for index in range(len(edges) - 1)
+        ]
+        self.by_user = {}
+        for offer, user_id in targeted:
+            self.by_user.setdefault(user_id, []).append(offer)
+
+    def eligible(self, user_id: int | None, now: datetime) -> list[CompiledOffer]:
+        candidates = list(self.windows[bisect_left(self.boundaries, now)])
+        if user_id is not None:
+            candidates.extend(self.by_user.get(user_id, ()))
+            if self.by_segment:
+                segments = get_segment_index(self.tenant_id)
+                seen = {offer.id for offer in candidates}
+                candidates.extend(
+                    offer
+                    for offer, segment_id in self.by_segment
+                    if offer.id not in seen and segments.contains(segment_id, user_id)
+                )
+        return [offer for offer in candidates if offer.active_at(now)]
+
+
+offer_cache = VersionedLocalCache("offers", settings.OFFER_CACHE_TTL_SECONDS)
+
+
+def build_offer_index(tenant_id: int) -> OfferIndex:
+    offers = {}
+    general = []
+    restricted = []
+    segmented = []
+    for *fields, applies_to_all, segment_id in (
+        Offer.objects.filter(tenant_id=tenant_id, is_active=True, type__in=[Offer.Type.MULTIPLIER, Offer.Type.BONUS])
+        .order_by("id")
+        .values_list(
+            "id", "type", "multiplier", "bonus_points", "active_from", "active_to", "applies_to_all", "segment_id"
+        )
+    ):
+        offer = CompiledOffer(*fields)
+        offers[offer.id] = offer
+        if applies_to_all:
+            general.append(offer)
+        else:
+            restricted.append(offer.id)
+            if segment_id is not None:
+                segmented.append((offer, segment_id))
+    targets = OfferTarget.objects.filter(tenant_id=tenant_id, offer_id__in=restricted).order_by("offer_id", "user_id").values_list("offer_id", "user_id")
+    return OfferIndex(tenant_id, general, [(offers[offer_id], user_id) for offer_id, user_id in targets], segmented)
+
+
+def get_offer_index(tenant_id: int) -> OfferIndex:
+    return offer_cache.get(tenant_id, lambda: build_offer_index(tenant_id), scope=tenant_id)
+
+
+def invalidate_offers(tenant_id: int) -> None:
+    offer_cache.invalidate(scope=tenant_id, keys=[tenant_id])
+
+
+def apply_offers(offers: list[CompiledOffer], raw_points: Decimal) -> tuple[Decimal, int, list[dict]]:
+    fired = []
+    multipliers = [offer for offer in offers if offer.type == Offer.Type.MULTIPLIER]
+    multiplier = max(multipliers, key=lambda offer: offer.multiplier, default=None)
+    if multiplier is not None and multiplier.multiplier > 1:
+        raw_points = raw_points * multiplier.multiplier
+        fired.append({"id": multiplier.id, "type": multiplier.type, "multiplier": str(multiplier.multiplier)})
+    bonus = 0
+    for offer in offers:
+        if offer.type == Offer.Type.BONUS and offer.bonus_points > 0:
+            bonus += offer.bonus_points
+            fired.append({"id": offer.id, "type": offer.type, "bonus_points": offer.bonus_points})
+    return raw_points, bonus, fired
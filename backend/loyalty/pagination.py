@@ -0,0 +1,89 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db import models
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(created_at: datetime, pk: int) -> str:
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def encode_id_cursor(pk: int) -> str:
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip("=")
+
+
+def decode_id_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except ValueError as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def encode_key_cursor(value, pk: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode()).decode().rstrip("=")
+
+
+def decode_key_cursor(cursor: str) -> tuple:
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+        return value, int(pk)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def parse_limit(value: str | None, default: int, maximum: int) -> int:
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        return default
+    return max(1, min(limit, maximum))
+
+
+def keyset_page(queryset: models.QuerySet, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=pk))
+    rows = list(queryset[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def id_page(queryset: models.QuerySet, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    queryset = queryset.order_by("-id")
+    if cursor:
+        queryset = queryset.filter(id__lt=decode_id_cursor(cursor))
+    rows = list(queryset[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_id_cursor(rows[-1].id)
+
+
+def key_page(queryset: models.QuerySet, key, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    queryset = queryset.annotate(page_key=key).order_by("page_key", "id")
+    if cursor:
+        value, pk = decode_key_cursor(cursor)
+        queryset = queryset.filter(models.Q(page_key__gt=value) | models.Q(page_key=value, id__gt=pk))
+    rows = list(queryset[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_key_cursor(rows[-1].page_key, rows[-1].id)
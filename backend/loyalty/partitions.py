@@ -0,0 +1,242 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import LoyaltyOperation
+
+PARENT_TABLE = LoyaltyOperation._meta.db_table
+LEGACY_TABLE = f"{PARENT_TABLE}_legacy"
+ID_SEQUENCE = f"{PARENT_TABLE}_id_part_seq"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+STASH_TABLE = f"{PARENT_TABLE}_stash"
+
+
+class PartitioningUnavailable(Exception):
+    pass
+
+
+@dataclass
+class Partition:
+    name: str
+    bounds: str
+    rows: int
+    subpartitions: int
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+
+def month_bound(month: date) -> str:
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc).isoformat()
+
+
+def require_postgresql() -> None:
+    if connection.vendor != "postgresql":
+        raise PartitioningUnavailable(f"Ledger partitioning requires PostgreSQL, current backend is {connection.vendor}")
+
+
+def is_partitioned() -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [PARENT_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    return cursor.fetchone()[0]
+
+
+def create_default_partition(cursor) -> bool:
+    if table_exists(cursor, DEFAULT_PARTITION):
+        return False
+    cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{PARENT_TABLE}" DEFAULT')
+    return True
+
+
+def create_month_partition(cursor, month: date, tenant_buckets: int = 0) -> bool:
+    name = partition_name(month)
+    if table_exists(cursor, name):
+        return False
+    lower, upper = month_bound(month), month_bound(add_months(month, 1))
+    stranded = False
+    if table_exists(cursor, DEFAULT_PARTITION):
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s)',
+            [lower, upper],
+        )
+        stranded = cursor.fetchone()[0]
+    if stranded:
+        # Rows in the default partition would violate the new partition's bounds, so they move with it.
+        cursor.execute(f'CREATE TEMP TABLE "{STASH_TABLE}" (LIKE "{PARENT_TABLE}") ON COMMIT DROP')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s '
+            f'RETURNING *) INSERT INTO "{STASH_TABLE}" SELECT * FROM moved',
+            [lower, upper],
+        )
+    sql = (
+        f'CREATE TABLE "{name}" PARTITION OF "{PARENT_TABLE}" '
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    )
+    if tenant_buckets:
+        sql += " PARTITION BY HASH (tenant_id)"
+    cursor.execute(sql)
+    for remainder in range(tenant_buckets):
+        cursor.execute(
+            f'CREATE TABLE "{name}_h{remainder}" PARTITION OF "{name}" '
+            f"FOR VALUES WITH (MODULUS {tenant_buckets}, REMAINDER {remainder})"
+        )
+    if stranded:
+        cursor.execute(f'INSERT INTO "{PARENT_TABLE}" SELECT * FROM "{STASH_TABLE}"')
+        cursor.execute(f'DROP TABLE "{STASH_TABLE}"')
+    return True
+
+
+def unique_indexes(cursor, table: str) -> list[tuple[str, list[str], str | None]]:
+    cursor.execute(
+        "SELECT cls.relname, array_agg(att.attname ORDER BY cols.ord), pg_get_expr(ix.indpred, ix.indrelid) "
+        "FROM pg_index ix JOIN pg_class cls ON cls.oid = ix.indexrelid "
+        "CROSS JOIN unnest(ix.indkey) WITH ORDINALITY AS cols(attnum, ord) "
+        "JOIN pg_attribute att ON att.attrelid = ix.indrelid AND att.attnum = cols.attnum "
+        "WHERE ix.indrelid = to_regclass(%s) AND ix.indisunique AND NOT ix.indisprimary "
+        "GROUP BY cls.relname, ix.indpred, ix.indrelid",
+        [table],
+    )
+    return [(name, list(columns), predicate) for name, columns, predicate in cursor.fetchall()]
+
+
+def convert(months_ahead: int, tenant_buckets: int = 0) -> tuple[list[str], list[str]]:
+    require_postgresql()
+    if is_partitioned():
+        raise PartitioningUnavailable(f"{PARENT_TABLE} is already partitioned")
+    created = []
+    partition_key = ["created_at", "tenant_id"] if tenant_buckets else ["created_at"]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{PARENT_TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexdef NOT LIKE %s",
+            [PARENT_TABLE, "CREATE UNIQUE INDEX%"],
+        )
+        indexes = cursor.fetchall()
+        uniques = unique_indexes(cursor, PARENT_TABLE)
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f' AND confrelid <> conrelid",
+            [PARENT_TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE confrelid = to_regclass(%s) AND contype = 'f' AND conrelid <> confrelid",
+            [PARENT_TABLE],
+        )
+        inbound = cursor.fetchall()
+        cursor.execute(f'SELECT min(created_at), max(created_at), max(id) FROM "{PARENT_TABLE}"')
+        first_at, last_at, max_id = cursor.fetchone()
+
+        # Rows referencing the ledger by id alone cannot point at a table whose keys include created_at.
+        for table, name in inbound:
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+        cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" RENAME TO "{LEGACY_TABLE}"')
+        for name in [name for name, _ in indexes] + [name for name, _, _ in uniques]:
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:56]}_legacy"')
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{LEGACY_TABLE}" RENAME CONSTRAINT "{name}" TO "{name[:56]}_legacy"')
+
+        cursor.execute(
+            f'CREATE TABLE "{PARENT_TABLE}" (LIKE "{LEGACY_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS, '
+            f'CONSTRAINT "{PARENT_TABLE}_part_pkey" PRIMARY KEY (id, {", ".join(partition_key)})) '
+            "PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f'CREATE SEQUENCE "{ID_SEQUENCE}" OWNED BY "{PARENT_TABLE}".id')
+        cursor.execute("SELECT setval(%s, %s, false)", [ID_SEQUENCE, (max_id or 0) + 1])
+        cursor.execute(f"ALTER TABLE \"{PARENT_TABLE}\" ALTER COLUMN id SET DEFAULT nextval('{ID_SEQUENCE}')")
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, columns, predicate in uniques:
+            # Unique indexes on a partitioned table must cover the partition key.
+            columns += [column for column in partition_key if column not in columns]
+            quoted = ", ".join(f'"{column}"' for column in columns)
+            sql = f'CREATE UNIQUE INDEX "{name}" ON "{PARENT_TABLE}" ({quoted})'
+            cursor.execute(f"{sql} WHERE {predicate}" if predicate else sql)
+
+        today = month_start(datetime.now(dt_timezone.utc).date())
+        month = month_start(first_at.astimezone(dt_timezone.utc).date()) if first_at else today
+        last = max(month_start(last_at.astimezone(dt_timezone.utc).date()) if last_at else today, today)
+        last = add_months(last, months_ahead)
+        while month <= last:
+            if create_month_partition(cursor, month, tenant_buckets):
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+        create_default_partition(cursor)
+        cursor.execute(f'INSERT INTO "{PARENT_TABLE}" SELECT * FROM "{LEGACY_TABLE}"')
+    return created, [f"{table}.{name}" for table, name in inbound]
+
+
+def ensure(months_ahead: int, tenant_buckets: int = 0) -> list[str]:
+    require_postgresql()
+    if not is_partitioned():
+        return []
+    created = []
+    month = month_start(datetime.now(dt_timezone.utc).date())
+    with transaction.atomic(), connection.cursor() as cursor:
+        if create_default_partition(cursor):
+            created.append(DEFAULT_PARTITION)
+        for offset in range(months_ahead + 1):
+            target = add_months(month, offset)
+            if create_month_partition(cursor, target, tenant_buckets):
+                created.append(partition_name(target))
+    return created
+
+
+def ensure_scheduled() -> list[str]:
+    if connection.vendor != "postgresql":
+        return []
+    return ensure(settings.LEDGER_PARTITION_MONTHS_AHEAD, settings.LEDGER_TENANT_BUCKETS)
+
+
+def list_partitions() -> list[Partition]:
+    require_postgresql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), "
+            "COALESCE((SELECT sum(GREATEST(leaf.reltuples, 0)) FROM pg_partition_tree(child.oid) tree "
+            "JOIN pg_class leaf ON leaf.oid = tree.relid WHERE tree.isleaf), 0), "
+            "(SELECT count(*) FROM pg_inherits sub WHERE sub.inhparent = child.oid) "
+            "FROM pg_inherits inh JOIN pg_class child ON child.oid = inh.inhrelid "
+            "WHERE inh.inhparent = to_regclass(%s) ORDER BY child.relname",
+            [PARENT_TABLE],
+        )
+        return [
+            Partition(name, bounds, int(rows), subpartitions) for name, bounds, rows, subpartitions in cursor.fetchall()
+        ]
+
+
+def detach_before(before: date) -> list[str]:
+    require_postgresql()
+    if not is_partitioned():
+        return []
+    cutoff = partition_name(month_start(before))
+    detached = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for partition in list_partitions():
+            if partition.name != DEFAULT_PARTITION and partition.name < cutoff:
+                cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{partition.name}"')
+                detached.append(partition.name)
+    return detached
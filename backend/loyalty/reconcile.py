@@ -0,0 +1,163 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+
+from .bulk import id_set
+from .ledger import tier_case
+from .models import LoyaltyCard, LoyaltyOperation, Tenant
+from .rules import RuleTable, build_rule_table
+from .segments import SegmentIndex, load_segments
+from .tiers import home_locations
+
+TIERS = np.array(["Bronze", "Silver", "Gold"])
+
+
+@dataclass
+class Drift:
+    card_id: int
+    stored_points: int
+    expected_points: int
+    stored_tier: str
+    expected_tier: str
+    gold_threshold: int
+    silver_threshold: int
+
+    @property
+    def delta(self) -> int:
+        return self.expected_points - self.stored_points
+
+
+@dataclass
+class TenantReport:
+    tenant: Tenant
+    cards: int = 0
+    operations: int = 0
+    drifts: list[Drift] = field(default_factory=list)
+
+    @property
+    def balance_drifts(self) -> int:
+        return sum(1 for drift in self.drifts if drift.delta)
+
+    @property
+    def tier_drifts(self) -> int:
+        return sum(1 for drift in self.drifts if drift.stored_tier != drift.expected_tier)
+
+
+def signed_points(types: np.ndarray, points: np.ndarray, refunded: np.ndarray) -> np.ndarray:
+    signs = np.select(
+        [
+            types == LoyaltyOperation.Type.EARN,
+            types == LoyaltyOperation.Type.REDEEM,
+            types == LoyaltyOperation.Type.EXPIRE,
+            (types == LoyaltyOperation.Type.REFUND) & (refunded == LoyaltyOperation.Type.EARN),
+            (types == LoyaltyOperation.Type.REFUND) & (refunded == LoyaltyOperation.Type.REDEEM),
+        ],
+        [1, -1, -1, -1, 1],
+        default=0,
+    )
+    return signs * points
+
+
+def expected_balances(ops, card_ids: np.ndarray) -> tuple[np.ndarray, int]:
+    balances = np.zeros(len(card_ids), dtype=np.int64)
+    rows = list(
+        ops.filter(status=LoyaltyOperation.Status.SUCCESS)
+        .values_list("card_id", "type", "metadata__refunded_type")
+        .annotate(total=Sum("points"), count=Count("id"))
+        .order_by()
+    )
+    if not rows:
+        return balances, 0
+    cards, types, refunded, points, counts = zip(*rows)
+    cards = np.fromiter(cards, dtype=np.int64, count=len(rows))
+    positions = np.searchsorted(card_ids, cards)
+    known = positions < len(card_ids)
+    known[known] = card_ids[positions[known]] == cards[known]
+    deltas = signed_points(
+        np.array(types, dtype=object),
+        np.fromiter(points, dtype=np.int64, count=len(rows)),
+        np.array(refunded, dtype=object),
+    )
+    np.add.at(balances, positions[known], deltas[known])
+    return balances, sum(counts)
+
+
+def expected_thresholds(
+    table: RuleTable, segments: SegmentIndex | None, user_ids: tuple, homes: list
+) -> tuple[np.ndarray, np.ndarray]:
+    rules = [table.resolve(home, user_id, segments) for user_id, home in zip(user_ids, homes)]
+    gold = np.fromiter((rule.gold_threshold for rule in rules), dtype=np.int64, count=len(rules))
+    silver = np.fromiter((rule.silver_threshold for rule in rules), dtype=np.int64, count=len(rules))
+    return gold, silver
+
+
+def expected_tiers(balances: np.ndarray, gold: np.ndarray, silver: np.ndarray) -> np.ndarray:
+    return TIERS[(balances >= silver).astype(np.int64) + (balances >= gold).astype(np.int64)]
+
+
+def reconcile_cards(report: TenantReport, table: RuleTable, compiled: list, rows: list[tuple]) -> None:
+    ids, users, stored, tiers = zip(*rows)
+    card_ids = np.fromiter(ids, dtype=np.int64, count=len(rows))
+    stored = np.fromiter(stored, dtype=np.int64, count=len(rows))
+    tiers = np.array(tiers, dtype=object)
+    ops = LoyaltyOperation.objects.filter(tenant=report.tenant, card_id__gte=ids[0], card_id__lte=ids[-1])
+    balances, operations = expected_balances(ops, card_ids)
+    report.cards += len(rows)
+    report.operations += operations
+    homes = home_locations(ops)
+    segments = None
+    if table.by_segment:
+        segments = SegmentIndex(report.tenant.id, compiled)
+        segments.load_users(users)
+    gold, silver = expected_thresholds(table, segments, users, [homes.get(card_id) for card_id in ids])
+    targets = expected_tiers(balances, gold, silver)
+    for index in np.flatnonzero((balances != stored) | (targets != tiers)):
+        report.drifts.append(
+            Drift(
+                card_id=int(card_ids[index]),
+                stored_points=int(stored[index]),
+                expected_points=int(balances[index]),
+                stored_tier=tiers[index],
+                expected_tier=str(targets[index]),
+                gold_threshold=int(gold[index]),
+                silver_threshold=int(silver[index]),
+            )
+        )
+
+
+def reconcile_tenant(tenant: Tenant, chunk_size: int = 50000) -> TenantReport:
+    report = TenantReport(tenant)
+    table = build_rule_table(tenant.id)
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        compiled = load_segments(tenant.id) if table.by_segment else []
+        cards = LoyaltyCard.objects.filter(tenant=tenant).order_by("id")
+        last_id = 0
+        while True:
+            rows = list(
+                cards.filter(id__gt=last_id).values_list("id", "user_id", "current_points", "tier")[:chunk_size]
+            )
+            if not rows:
+                break
+            reconcile_cards(report, table, compiled, rows)
+            last_id = rows[-1][0]
+    return report
+
+
+def repair(report: TenantReport) -> int:
+    groups = {}
+    for drift in report.drifts:
+        groups.setdefault((drift.delta, drift.gold_threshold, drift.silver_threshold), []).append(drift.card_id)
+    repaired = 0
+    with transaction.atomic():
+        for (delta, gold_threshold, silver_threshold), card_ids in groups.items():
+            points = F("current_points") + delta
+            repaired += LoyaltyCard.objects.filter(id__in=id_set(card_ids)).update(
+                current_points=points,
+                tier=tier_case(points, gold_threshold, silver_threshold),
+            )
+    return repaired
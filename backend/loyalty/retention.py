@@ -0,0 +1,79 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import models
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import AuditLog, EmailVerificationCode, IdempotencyRecord, OneTimeCode, OneTimeQR, StaffMinuteOps
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    name: str
+    model: type[models.Model]
+    setting: str
+    expired: Callable[[datetime], models.Q]
+
+    @property
+    def table(self) -> str:
+        return self.model._meta.db_table
+
+    def retention(self) -> int:
+        return getattr(settings, self.setting)
+
+    def queryset(self, now: datetime) -> models.QuerySet:
+        cutoff = now - timedelta(days=self.retention())
+        return self.model.objects.filter(self.expired(cutoff))
+
+
+POLICIES = [
+    RetentionPolicy("qr", OneTimeQR, "QR_RETENTION_DAYS", lambda cutoff: models.Q(expires_at__lt=cutoff)),
+    RetentionPolicy(
+        "email_codes", EmailVerificationCode, "CODE_RETENTION_DAYS", lambda cutoff: models.Q(expires_at__lt=cutoff)
+    ),
+    RetentionPolicy("otp_codes", OneTimeCode, "CODE_RETENTION_DAYS", lambda cutoff: models.Q(expires_at__lt=cutoff)),
+    RetentionPolicy(
+        "idempotency", IdempotencyRecord, "IDEMPOTENCY_RETENTION_DAYS", lambda cutoff: models.Q(expires_at__lt=cutoff)
+    ),
+    RetentionPolicy(
+        "blacklisted_tokens",
+        BlacklistedToken,
+        "TOKEN_RETENTION_DAYS",
+        lambda cutoff: models.Q(token__expires_at__lt=cutoff),
+    ),
+    RetentionPolicy(
+        "outstanding_tokens", OutstandingToken, "TOKEN_RETENTION_DAYS", lambda cutoff: models.Q(expires_at__lt=cutoff)
+    ),
+    RetentionPolicy("audit", AuditLog, "AUDIT_RETENTION_DAYS", lambda cutoff: models.Q(created_at__lt=cutoff)),
+    RetentionPolicy(
+        "staff_ops", StaffMinuteOps, "STAFF_OPS_RETENTION_DAYS", lambda cutoff: models.Q(minute__lt=cutoff)
+    ),
+]
+
+
+def purge(policy: RetentionPolicy, now: datetime, batch_size: int, sleep_ms: int = 0, dry_run: bool = False) -> int:
+    if policy.retention() < 0:
+        return 0
+    expired = policy.queryset(now)
+    if dry_run:
+        return expired.count()
+    removed = 0
+    last_pk = None
+    while True:
+        window = expired.order_by("pk")
+        if last_pk is not None:
+            window = window.filter(pk__gt=last_pk)
+        pks = list(window.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            break
+        last_pk = pks[-1]
+        _, deleted = expired.filter(pk__gte=pks[0], pk__lte=last_pk).delete()
+        removed += deleted.get(policy.model._meta.label, 0)
+        if len(pks) < batch_size:
+            break
+        if sleep_ms:
+            time.sleep(sleep_ms / 1000)
+    return removed
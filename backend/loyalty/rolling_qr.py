@@ -0,0 +1,102 @@
+import hashlib
+import hmac
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import LoyaltyCard, Tenant
+
+PREFIX = "r1"
+MAC_LENGTH = 20
+
+
+@dataclass
+class RollingQR:
+    card: LoyaltyCard
+    counter: int
+    previous_counter: int
+    expires_at: datetime
+    used_at: datetime | None = None
+
+    @property
+    def card_id(self) -> int:
+        return self.card.id
+
+
+def is_rolling(token: str) -> bool:
+    return token.startswith(f"{PREFIX}.")
+
+
+def card_secret(tenant_id: int, card_id: int, version: int) -> bytes:
+    message = f"qr:{tenant_id}:{card_id}:{version}".encode()
+    return hmac.new(settings.QR_SECRET_KEY.encode(), message, hashlib.sha256).digest()
+
+
+def sign(secret: bytes, card_id: int, counter: int) -> str:
+    return hmac.new(secret, f"{card_id}.{counter}".encode(), hashlib.sha256).hexdigest()[:MAC_LENGTH]
+
+
+def step_at(now: datetime) -> int:
+    return int(now.timestamp()) // settings.QR_ROLLING_PERIOD_SECONDS
+
+
+def step_start(counter: int) -> datetime:
+    return datetime.fromtimestamp(counter * settings.QR_ROLLING_PERIOD_SECONDS, tz=dt_timezone.utc)
+
+
+def build_payload(card: LoyaltyCard, counter: int) -> str:
+    secret = card_secret(card.tenant_id, card.id, card.qr_key_version)
+    return f"{PREFIX}.{card.id}.{counter}.{sign(secret, card.id, counter)}"
+
+
+def parse(token: str) -> tuple[int, int, str] | None:
+    parts = token.split(".")
+    if len(parts) != 4 or parts[0] != PREFIX or len(parts[3]) != MAC_LENGTH:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), parts[3]
+    except ValueError:
+        return None
+
+
+def decode_many(tenant: Tenant, tokens: list[str], now: datetime | None = None) -> dict[str, RollingQR]:
+    now = now or timezone.now()
+    latest = step_at(now) + settings.QR_ROLLING_DRIFT_STEPS
+    parsed = {}
+    for token in tokens:
+        fields = parse(token)
+        if fields is not None and fields[1] <= latest:
+            parsed[token] = fields
+    if not parsed:
+        return {}
+    cards = LoyaltyCard.objects.select_related("user").in_bulk({card_id for card_id, _, _ in parsed.values()})
+    decoded = {}
+    for token, (card_id, counter, mac) in parsed.items():
+        card = cards.get(card_id)
+        if card is None or card.tenant_id != tenant.id:
+            continue
+        expected = sign(card_secret(tenant.id, card.id, card.qr_key_version), card.id, counter)
+        if not hmac.compare_digest(expected, mac):
+            continue
+        decoded[token] = RollingQR(
+            card=card,
+            counter=counter,
+            previous_counter=card.qr_counter,
+            expires_at=step_start(counter + settings.QR_ROLLING_DRIFT_STEPS + 1),
+            used_at=step_start(card.qr_counter) if counter <= card.qr_counter else None,
+        )
+    return decoded
+
+
+def decode(tenant: Tenant, token: str, now: datetime | None = None) -> RollingQR | None:
+    return decode_many(tenant, [token], now).get(token)
+
+
+def consume(qr: RollingQR) -> bool:
+    return LoyaltyCard.objects.filter(id=qr.card_id, qr_counter__lt=qr.counter).update(qr_counter=qr.counter) == 1
+
+
+def release(qr: RollingQR) -> None:
+    LoyaltyCard.objects.filter(id=qr.card_id, qr_counter=qr.counter).update(qr_counter=qr.previous_counter)
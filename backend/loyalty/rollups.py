@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .counters import day_bucket, day_start
+from .models import DailyRollup, LoyaltyOperation
+
+
+def operation_rollup(op: LoyaltyOperation) -> tuple[dict, dict]:
+    key = {
+        "tenant_id": op.tenant_id,
+        "day": day_bucket(op.created_at),
+        "location_id": op.location_id or 0,
+        "type": op.type,
+        "source": op.source,
+    }
+    if op.status == LoyaltyOperation.Status.SUCCESS:
+        return key, {"operations": 1, "amount": Decimal(op.amount), "points": op.points}
+    return key, {"failed": 1}
+
+
+def apply_rollup(key: dict, deltas: dict) -> None:
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if DailyRollup.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyRollup.objects.create(**key, **deltas)
+    except IntegrityError:
+        DailyRollup.objects.filter(**key).update(**changes)
+
+
+def bump_rollup(key: dict, deltas: dict) -> None:
+    transaction.on_commit(lambda: apply_rollup(key, deltas))
+
+
+def record_rollup(op: LoyaltyOperation) -> None:
+    bump_rollup(*operation_rollup(op))
+
+
+def day_range(start: date, end: date) -> tuple[datetime, datetime]:
+    return day_start(start), day_start(end + timedelta(days=1))
+
+
+def last_closed_day() -> date:
+    return day_bucket() - timedelta(days=1)
+
+
+def rebuild_rollups(tenant_id: int, start: date, end: date, batch_size: int = 5000) -> int:
+    end = min(end, last_closed_day())
+    if start > end:
+        return 0
+    since, until = day_range(start, end)
+    success = Q(status=LoyaltyOperation.Status.SUCCESS)
+    rows = (
+        LoyaltyOperation.objects.filter(tenant_id=tenant_id, created_at__gte=since, created_at__lt=until)
+        .annotate(bucket=TruncDate("created_at", tzinfo=timezone.get_current_timezone()), location_key=Coalesce("location_id", 0))
+        .values("bucket", "location_key", "type", "source")
+        .annotate(
+            total=Count("id", filter=success),
+            failures=Count("id", filter=~success),
+            amount_sum=Sum("amount", filter=success),
+            points_sum=Sum("points", filter=success),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        DailyRollup.objects.filter(tenant_id=tenant_id, day__gte=start, day__lte=end).delete()
+        rollups = [
+            DailyRollup(
+                tenant_id=tenant_id,
+                day=row["bucket"],
+                location_id=row["location_key"],
+                type=row["type"],
+                source=row["source"],
+                operations=row["total"],
+                failed=row["failures"],
+                amount=row["amount_sum"] or 0,
+                points=row["points_sum"] or 0,
+            )
+            for row in rows.iterator(chunk_size=batch_size)
+        ]
+        DailyRollup.objects.bulk_create(rollups, batch_size=batch_size)
+    return len(rollups)
+
+
+INTERVALS = {"day": None, "week": TruncWeek, "month": TruncMonth}
+SPLITS = ("type", "source", "location_id")
+
+
+def timeseries(
+    tenant_id: int, start: date, end: date, interval: str = "day", split: str | None = None, **filters
+) -> list[dict]:
+    trunc = INTERVALS[interval]
+    rows = DailyRollup.objects.filter(tenant_id=tenant_id, day__gte=start, day__lte=end, **filters)
+    keys = ["bucket", *([split] if split else [])]
+    rows = (
+        rows.annotate(bucket=trunc("day") if trunc else F("day"))
+        .values(*keys)
+        .annotate(
+            total_operations=Sum("operations"),
+            total_failed=Sum("failed"),
+            total_amount=Sum("amount"),
+            total_points=Sum("points"),
+        )
+        .order_by(*keys)
+    )
+    return [
+        {
+            "date": row["bucket"].isoformat(),
+            **({split: row[split]} if split else {}),
+            "operations": row["total_operations"],
+            "failed": row["total_failed"],
+            "amount": str(Decimal(row["total_amount"] or 0).quantize(Decimal("0.01"))),
+            "points": row["total_points"],
+        }
+        for row in rows
+    ]
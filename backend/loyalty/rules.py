@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.conf import settings
+
+from .caching import VersionedLocalCache
+from .models import Location, LoyaltyRule, RuleTarget, Tenant, User
+from .segments import SegmentIndex, get_segment_index
+
+
+class RuleTable:
+    def __init__(self, tenant_id: int, rules: list[LoyaltyRule], targets: list[tuple[int, int]]):
+        self.tenant_id = tenant_id
+        self.default = None
+        self.by_location = {}
+        self.by_user = {}
+        self.by_segment = []
+        rules_by_id = {rule.id: rule for rule in rules}
+        for rule in sorted(rules, key=lambda item: item.id, reverse=True):
+            if not rule.applies_to_all and rule.segment_id is not None:
+                self.by_segment.append((rule.segment_id, rule))
+        for rule in sorted(rules, key=lambda item: item.id):
+            if not rule.applies_to_all:
+                continue
+            if rule.location_id is None:
+                self.default = rule
+            else:
+                self.by_location[rule.location_id] = rule
+        for rule_id, user_id in sorted(targets):
+            if rule_id in rules_by_id:
+                self.by_user[user_id] = rules_by_id[rule_id]
+        self.fallback = LoyaltyRule(tenant_id=tenant_id, earn_percent=Decimal("3.0"), applies_to_all=True)
+
+    def segment_rule(self, user_id: int, segments: SegmentIndex) -> LoyaltyRule | None:
+        for segment_id, rule in self.by_segment:
+            if segments.contains(segment_id, user_id):
+                return rule
+        return None
+
+    def resolve(
+        self, location_id: int | None, user_id: int | None, segments: SegmentIndex | None = None
+    ) -> LoyaltyRule:
+        if user_id is not None:
+            rule = self.by_user.get(user_id)
+            if rule is not None:
+                return rule
+            if self.by_segment:
+                rule = self.segment_rule(user_id, segments or get_segment_index(self.tenant_id))
+                if rule is not None:
+                    return rule
+        if location_id is not None:
+            rule = self.by_location.get(location_id)
+            if rule is not None:
+                return rule
+        return self.default or self.fallback
+
+
+rule_cache = VersionedLocalCache("rules", settings.RULE_CACHE_TTL_SECONDS)
+
+
+def build_rule_table(tenant_id: int) -> RuleTable:
+    rules = list(LoyaltyRule.objects.filter(tenant_id=tenant_id))
+    targets = list(RuleTarget.objects.filter(tenant_id=tenant_id).values_list("rule_id", "user_id"))
+    return RuleTable(tenant_id, rules, targets)
+
+
+def get_rule_table(tenant_id: int) -> RuleTable:
+    return rule_cache.get(tenant_id, lambda: build_rule_table(tenant_id), scope=tenant_id)
+
+
+def get_rule(tenant: Tenant, location: Location | None, user: User | None) -> LoyaltyRule:
+    table = get_rule_table(tenant.id)
+    return table.resolve(location.id if location else None, user.id if user else None)
+
+
+def invalidate_rules(tenant_id: int) -> None:
+    rule_cache.invalidate(scope=tenant_id, keys=[tenant_id])
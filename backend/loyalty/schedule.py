@@ -0,0 +1,36 @@
+import logging
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+PERIODIC = {
+    "ensure_partitions": ("LEDGER_PARTITION_ENSURE_SECONDS", "loyalty.partitions.ensure_scheduled"),
+    "reclaim_jobs": ("JOBS_RECLAIM_SECONDS", "loyalty.jobs.reclaim_stale"),
+    "refresh_segments": ("SEGMENT_REFRESH_SECONDS", "loyalty.segments.schedule_refresh"),
+    "repair_stats": ("TENANT_STATS_REPAIR_SECONDS", "loyalty.stats.repair_all_stats"),
+}
+
+
+class Scheduler:
+    def __init__(self, tasks: dict | None = None):
+        self.tasks = PERIODIC if tasks is None else tasks
+        self.next_run = {}
+
+    def run_due(self, now: float | None = None) -> list[str]:
+        now = time.monotonic() if now is None else now
+        ran = []
+        for name, (interval_setting, path) in self.tasks.items():
+            interval = getattr(settings, interval_setting)
+            if interval <= 0 or self.next_run.get(name, now) > now:
+                continue
+            self.next_run[name] = now + interval
+            try:
+                import_string(path)()
+            except Exception:
+                logger.exception("schedule.failed task=%s", name)
+                continue
+            ran.append(name)
+        return ran
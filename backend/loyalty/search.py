@@ -0,0 +1,95 @@
+from django.db import connection, models
+from django.db.models.functions import Collate, Upper
+
+from .telegram_auth import normalize_phone
+
+RECEIPT_MATCHES = ("exact", "prefix", "contains")
+CUSTOMER_FILTERS = ("q", "tier", "points_min", "points_max", "email_verified", "phone_verified", "verified")
+TRIGRAM_MIN_LENGTH = 3
+
+
+def filter_receipts(ops: models.QuerySet, query: str, match: str = "prefix") -> models.QuerySet:
+    query = query.strip()
+    if match == "exact":
+        return ops.filter(receipt_id=query)
+    if match == "contains":
+        return ops.filter(receipt_id__icontains=query)
+    return ops.filter(receipt_id__istartswith=query)
+
+
+def phone_prefix(query: str) -> str:
+    digits = "".join(ch for ch in query if ch.isdigit())
+    if len(digits) >= 10:
+        return normalize_phone(query)
+    if digits.startswith("8"):
+        digits = f"7{digits[1:]}"
+    return f"+{digits}"
+
+
+def byte_order(expression) -> Collate:
+    return Collate(expression, "C" if connection.vendor == "postgresql" else "BINARY")
+
+
+def prefix_key(field: str, user: str = "") -> Collate:
+    if field == "phone":
+        return byte_order(f"{user}phone")
+    return byte_order(Upper(f"{user}{field}"))
+
+
+def search_field(query: str) -> str | None:
+    if "@" in query:
+        return "email"
+    if all(ch.isdigit() or ch in "+-() " for ch in query):
+        return "phone"
+    return None
+
+
+def search_customers(users: models.QuerySet, query: str, user: str = "") -> models.QuerySet:
+    query = query.strip()
+    if not query:
+        return users
+    field = search_field(query)
+    if field == "phone":
+        return users.alias(phone_key=prefix_key("phone", user)).filter(phone_key__startswith=phone_prefix(query))
+    keys = {f"{name}_key": prefix_key(name, user) for name in ("email", "first_name", "last_name")}
+    if field == "email":
+        return users.alias(email_key=keys["email_key"]).filter(email_key__startswith=query.upper())
+    condition = models.Q()
+    for key in keys:
+        condition |= models.Q(**{f"{key}__startswith": query.upper()})
+    return users.alias(**keys).filter(condition)
+
+
+def customer_order(params, user: str = "", card: str = "card__"):
+    query = params.get("q", "").strip()
+    if query:
+        field = search_field(query)
+        return prefix_key(field, user) if field else None
+    if params.get("points_min") or params.get("points_max"):
+        return models.F(f"{card}current_points")
+    return None
+
+
+def parse_flag(value: str | None) -> bool | None:
+    if value is None or value == "":
+        return None
+    return value.lower() in ("1", "true", "yes")
+
+
+def filter_customers(users: models.QuerySet, params, user: str = "", card: str = "card__") -> models.QuerySet:
+    users = search_customers(users, params.get("q", ""), user)
+    if params.get("tier"):
+        users = users.filter(**{f"{card}tier": params["tier"]})
+    if params.get("points_min"):
+        users = users.filter(**{f"{card}current_points__gte": int(params["points_min"])})
+    if params.get("points_max"):
+        users = users.filter(**{f"{card}current_points__lte": int(params["points_max"])})
+    for flag in ("email_verified", "phone_verified"):
+        value = parse_flag(params.get(flag))
+        if value is not None:
+            users = users.filter(**{f"{user}{flag}": value})
+    verified = parse_flag(params.get("verified"))
+    if verified is not None:
+        condition = models.Q(**{f"{user}email_verified": True}) | models.Q(**{f"{user}phone_verified": True})
+        users = users.filter(condition if verified else ~condition)
+    return users
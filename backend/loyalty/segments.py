@@ -0,0 +1,229 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
+
+from .caching import VersionedLocalCache
+from .jobs import enqueue, report_progress
+from .models import Job, LoyaltyCard, LoyaltyOperation, Segment, SegmentDelta, Tenant, User
+
+EMPTY = (0, b"")
+
+
+def pack_members(user_ids: np.ndarray) -> tuple[int, bytes]:
+    if not user_ids.size:
+        return EMPTY
+    base = int(user_ids.min()) // 8 * 8
+    bits = np.zeros(int(user_ids.max()) - base + 1, dtype=bool)
+    bits[user_ids - base] = True
+    return base, np.packbits(bits).tobytes()
+
+
+def has_member(base: int, members: bytes, user_id: int) -> bool:
+    offset = user_id - base
+    if offset < 0 or offset >= len(members) * 8:
+        return False
+    return bool(members[offset >> 3] & (0x80 >> (offset & 7)))
+
+
+@dataclass(frozen=True)
+class CompiledSegment:
+    id: int
+    tier: str
+    points_min: int | None
+    points_max: int | None
+    active_days: int | None
+    location_id: int | None
+    base: int
+    members: bytes
+    size: int
+
+    def __contains__(self, user_id: int) -> bool:
+        return has_member(self.base, self.members, user_id)
+
+    def matches(self, tier: str, points: int, location_id: int | None) -> bool:
+        if self.tier and tier != self.tier:
+            return False
+        if self.points_min is not None and points < self.points_min:
+            return False
+        if self.points_max is not None and points > self.points_max:
+            return False
+        return self.location_id is None or location_id == self.location_id
+
+
+class SegmentIndex:
+    def __init__(
+        self, tenant_id: int, segments: list[CompiledSegment], deltas: dict[int, dict[int, bool]] | None = None
+    ):
+        self.tenant_id = tenant_id
+        self.segments = {segment.id: segment for segment in segments}
+        self.deltas = deltas if deltas is not None else {}
+        self.complete = deltas is not None
+        self.loaded = set()
+
+    def load_users(self, user_ids) -> None:
+        missing = [user_id for user_id in user_ids if user_id not in self.loaded]
+        if self.complete or not missing or not self.segments:
+            return
+        self.loaded.update(missing)
+        rows = SegmentDelta.objects.filter(segment_id__in=list(self.segments), user_id__in=missing).values_list(
+            "segment_id", "user_id", "present"
+        )
+        for segment_id, user_id, present in rows:
+            self.deltas.setdefault(segment_id, {})[user_id] = present
+
+    def contains(self, segment_id: int, user_id: int) -> bool:
+        segment = self.segments.get(segment_id)
+        if segment is None:
+            return False
+        self.load_users([user_id])
+        present = self.deltas.get(segment_id, {}).get(user_id)
+        return user_id in segment if present is None else present
+
+    def size(self, segment_id: int) -> int:
+        if not self.complete:
+            self.deltas, self.complete = load_deltas(self.tenant_id), True
+        segment = self.segments[segment_id]
+        changes = self.deltas.get(segment_id, {}).items()
+        return segment.size + sum(int(present) - int(user_id in segment) for user_id, present in changes)
+
+
+segment_cache = VersionedLocalCache("segments", settings.SEGMENT_CACHE_TTL_SECONDS)
+
+
+def load_segments(tenant_id: int) -> list[CompiledSegment]:
+    rows = (
+        Segment.objects.filter(tenant_id=tenant_id)
+        .order_by("id")
+        .values_list(
+            "id", "tier", "points_min", "points_max", "active_days", "location_id", "base_id", "members", "size"
+        )
+    )
+    return [CompiledSegment(*fields[:-2], bytes(fields[-2]), fields[-1]) for fields in rows]
+
+
+def load_deltas(tenant_id: int) -> dict[int, dict[int, bool]]:
+    deltas = {}
+    for segment_id, user_id, present in SegmentDelta.objects.filter(tenant_id=tenant_id).values_list(
+        "segment_id", "user_id", "present"
+    ):
+        deltas.setdefault(segment_id, {})[user_id] = present
+    return deltas
+
+
+def get_segment_index(tenant_id: int) -> SegmentIndex:
+    segments = segment_cache.get(tenant_id, lambda: load_segments(tenant_id), scope=tenant_id)
+    return SegmentIndex(tenant_id, segments or [])
+
+
+def invalidate_segments(tenant_id: int) -> None:
+    segment_cache.invalidate(scope=tenant_id, keys=[tenant_id])
+
+
+def visits():
+    return LoyaltyOperation.objects.filter(card=OuterRef("pk")).exclude(source=LoyaltyOperation.Source.SYSTEM)
+
+
+def segment_cards(segment: Segment, now: datetime) -> models.QuerySet:
+    cards = LoyaltyCard.objects.filter(
+        tenant_id=segment.tenant_id, status=LoyaltyCard.Status.ACTIVE, user__role=User.Role.CLIENT
+    )
+    if segment.tier:
+        cards = cards.filter(tier=segment.tier)
+    if segment.points_min is not None:
+        cards = cards.filter(current_points__gte=segment.points_min)
+    if segment.points_max is not None:
+        cards = cards.filter(current_points__lte=segment.points_max)
+    if segment.active_days is not None:
+        cards = cards.filter(Exists(visits().filter(created_at__gte=now - timedelta(days=segment.active_days))))
+    if segment.location_id is not None:
+        home = Subquery(visits().order_by("-created_at", "-id").values("location_id")[:1])
+        cards = cards.alias(home=home).filter(home=segment.location_id)
+    return cards
+
+
+def refresh_segment(segment: Segment, now: datetime | None = None) -> int:
+    now = now or timezone.now()
+    rows = segment_cards(segment, now).values_list("user_id", flat=True)
+    user_ids = np.fromiter(rows.iterator(chunk_size=settings.SEGMENT_REFRESH_CHUNK_SIZE), dtype=np.int64)
+    base, members = pack_members(user_ids)
+    Segment.objects.filter(id=segment.id).update(members=members, base_id=base, size=user_ids.size, refreshed_at=now)
+    SegmentDelta.objects.filter(segment_id=segment.id, updated_at__lte=now).delete()
+    segment.members, segment.base_id, segment.size, segment.refreshed_at = members, base, user_ids.size, now
+    tenant_id = segment.tenant_id
+    invalidate_segments(tenant_id)
+    transaction.on_commit(lambda: invalidate_segments(tenant_id))
+    return user_ids.size
+
+
+def refresh_segments(tenant: Tenant, segment_ids: list[int] | None = None, progress=None) -> dict[int, int]:
+    segments = Segment.objects.filter(tenant=tenant).order_by("id")
+    if segment_ids is not None:
+        segments = segments.filter(id__in=segment_ids)
+    segments = list(segments)
+    sizes = {}
+    for index, segment in enumerate(segments, start=1):
+        sizes[segment.id] = refresh_segment(segment)
+        if progress is not None:
+            progress(index, len(segments))
+    return sizes
+
+
+def refresh_job(job: Job) -> dict:
+    segment_id = job.payload.get("segment_id")
+    sizes = refresh_segments(
+        job.tenant,
+        [segment_id] if segment_id else None,
+        progress=lambda processed, total: report_progress(job, processed, total),
+    )
+    return {"sizes": {str(segment_id): size for segment_id, size in sizes.items()}}
+
+
+def refresh_member(tenant_id: int, card_id: int, location_id: int | None) -> None:
+    index = get_segment_index(tenant_id)
+    if not index.segments:
+        return
+    card = (
+        LoyaltyCard.objects.filter(id=card_id, user__role=User.Role.CLIENT)
+        .values("user_id", "status", "tier", "current_points")
+        .first()
+    )
+    if card is None:
+        return
+    active = card["status"] == LoyaltyCard.Status.ACTIVE
+    now = timezone.now()
+    changes = []
+    for segment in index.segments.values():
+        present = active and segment.matches(card["tier"], card["current_points"], location_id)
+        if present != index.contains(segment.id, card["user_id"]):
+            changes.append(
+                SegmentDelta(
+                    tenant_id=tenant_id,
+                    segment_id=segment.id,
+                    user_id=card["user_id"],
+                    present=present,
+                    updated_at=now,
+                )
+            )
+    if changes:
+        SegmentDelta.objects.bulk_create(
+            changes, update_conflicts=True, unique_fields=["segment", "user_id"], update_fields=["present", "updated_at"]
+        )
+
+
+def schedule_refresh() -> int:
+    tenant_ids = list(Segment.objects.order_by().values_list("tenant_id", flat=True).distinct())
+    for tenant_id in tenant_ids:
+        enqueue(tenant_id, Job.Kind.REFRESH_SEGMENTS)
+    return len(tenant_ids)
+
+
+def track_operation(op: LoyaltyOperation) -> None:
+    if op.source == LoyaltyOperation.Source.SYSTEM:
+        return
+    tenant_id, card_id, location_id = op.tenant_id, op.card_id, op.location_id
+    transaction.on_commit(lambda: refresh_member(tenant_id, card_id, location_id))
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import (
     User,
@@ -10,6 +11,7 @@ from .models import (
     LoyaltyRule,
     RuleTarget,
     OrganizationSettings,
+    Segment,
 )
 
 
@@ -88,6 +90,17 @@ class POSPointsSerializer(serializers.Serializer):
     location_id = serializers.IntegerField(required=True)
 
 
+class POSReceiptSerializer(serializers.Serializer):
+    qr_payload = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    receipt_id = serializers.CharField(max_length=64)
+
+
+class POSBatchEarnSerializer(serializers.Serializer):
+    location_id = serializers.IntegerField()
+    receipts = POSReceiptSerializer(many=True, allow_empty=False, max_length=settings.POS_BATCH_MAX_RECEIPTS)
+
+
 class PasswordChangeSerializer(serializers.Serializer):
     current_password = serializers.CharField()
     new_password = serializers.CharField(min_length=8)
@@ -151,18 +164,23 @@ class OfferSerializer(serializers.ModelSerializer):
             "active_to",
             "is_active",
             "applies_to_all",
+            "segment",
             "target_ids",
             "client_ids",
             "is_used",
         )
 
     def get_target_ids(self, obj):
+        if "target_ids" in self.context:
+            return self.context["target_ids"].get(obj.id, [])
         return list(OfferTarget.objects.filter(offer=obj).values_list("user_id", flat=True))
 
     def get_is_used(self, obj):
         user = self.context.get("user")
         if not user or not getattr(user, "id", None):
             return False
+        if "used_offer_ids" in self.context:
+            return obj.id in self.context["used_offer_ids"]
         return OfferRedemption.objects.filter(offer=obj, user=user).exists()
 
 
@@ -202,14 +220,36 @@ class LoyaltyRuleSerializer(serializers.ModelSerializer):
             "silver_threshold",
             "gold_threshold",
             "applies_to_all",
+            "segment",
             "target_ids",
             "client_ids",
         )
 
     def get_target_ids(self, obj):
+        if "target_ids" in self.context:
+            return self.context["target_ids"].get(obj.id, [])
         return list(RuleTarget.objects.filter(rule=obj).values_list("user_id", flat=True))
 
 
+class SegmentSerializer(serializers.ModelSerializer):
+    tier = serializers.ChoiceField(choices=["", "Bronze", "Silver", "Gold"], required=False)
+
+    class Meta:
+        model = Segment
+        fields = (
+            "id",
+            "name",
+            "tier",
+            "points_min",
+            "points_max",
+            "active_days",
+            "location",
+            "size",
+            "refreshed_at",
+            "created_at",
+        )
+
+
 class OrganizationSettingsSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrganizationSettings
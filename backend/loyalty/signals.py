@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_tenant_cache
+from .models import Location, LoyaltyRule, Offer, Tenant, TenantStats, User
+from .offers import invalidate_offers
+from .rules import invalidate_rules
+from .stats import bump_stats, user_deltas
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def tenant_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_tenant_cache)
+
+
+@receiver(post_save, sender=Tenant)
+def tenant_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        TenantStats.objects.get_or_create(tenant=instance)
+
+
+def stats_scope(user: User) -> tuple[int | None, str | None]:
+    return user.__dict__.get("tenant_id"), user.__dict__.get("role")
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._stats_scope = stats_scope(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    previous, current = instance._stats_scope, stats_scope(instance)
+    instance._stats_scope = current
+    if raw:
+        return
+    if not created:
+        if None in (previous[1], current[1]) or previous == current:
+            return
+        if previous[0]:
+            bump_stats(previous[0], **user_deltas(previous[1], -1))
+    if current[0]:
+        bump_stats(current[0], **user_deltas(current[1], 1))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if instance.tenant_id:
+        bump_stats(instance.tenant_id, **user_deltas(instance.role, -1))
+
+
+@receiver(post_save, sender=Location)
+def location_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_stats(instance.tenant_id, locations=1)
+
+
+@receiver(post_delete, sender=Location)
+def location_deleted(sender, instance, **kwargs):
+    bump_stats(instance.tenant_id, locations=-1)
+
+
+@receiver(post_save, sender=LoyaltyRule)
+@receiver(post_delete, sender=LoyaltyRule)
+def rule_saved(sender, instance, **kwargs):
+    tenant_id = instance.tenant_id
+    invalidate_rules(tenant_id)
+    transaction.on_commit(lambda: invalidate_rules(tenant_id))
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def offer_saved(sender, instance, **kwargs):
+    tenant_id = instance.tenant_id
+    invalidate_offers(tenant_id)
+    transaction.on_commit(lambda: invalidate_offers(tenant_id))
@@ -0,0 +1,85 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Location, LoyaltyOperation, Tenant, TenantStats, User
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ("clients", "staff", "locations", "operations", "points_issued", "points_redeemed")
+STAFF_ROLES = (User.Role.ADMIN, User.Role.CASHIER)
+
+
+def apply_stats(tenant_id: int, deltas: dict[str, int]) -> None:
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        TenantStats.objects.filter(tenant_id=tenant_id).update(**changes, updated_at=timezone.now())
+
+
+def bump_stats(tenant_id: int, **deltas: int) -> None:
+    transaction.on_commit(lambda: apply_stats(tenant_id, deltas))
+
+
+def operation_deltas(op: LoyaltyOperation) -> dict[str, int]:
+    deltas = {"operations": 1}
+    if op.status == LoyaltyOperation.Status.SUCCESS:
+        if op.type == LoyaltyOperation.Type.EARN:
+            deltas["points_issued"] = op.points
+        elif op.type == LoyaltyOperation.Type.REDEEM:
+            deltas["points_redeemed"] = op.points
+    return deltas
+
+
+def user_deltas(role: str, sign: int) -> dict[str, int]:
+    if role == User.Role.CLIENT:
+        return {"clients": sign}
+    if role in STAFF_ROLES:
+        return {"staff": sign}
+    return {}
+
+
+def compute_stats(tenant_id: int) -> dict[str, int]:
+    users = User.objects.filter(tenant_id=tenant_id).aggregate(
+        clients=Count("id", filter=Q(role=User.Role.CLIENT)),
+        staff=Count("id", filter=Q(role__in=STAFF_ROLES)),
+    )
+    success = Q(status=LoyaltyOperation.Status.SUCCESS)
+    ops = LoyaltyOperation.objects.filter(tenant_id=tenant_id).aggregate(
+        operations=Count("id"),
+        points_issued=Sum("points", filter=success & Q(type=LoyaltyOperation.Type.EARN)),
+        points_redeemed=Sum("points", filter=success & Q(type=LoyaltyOperation.Type.REDEEM)),
+    )
+    stats = {**users, **ops, "locations": Location.objects.filter(tenant_id=tenant_id).count()}
+    return {field: stats[field] or 0 for field in STAT_FIELDS}
+
+
+def refresh_stats(tenant_id: int) -> tuple[TenantStats, dict[str, tuple[int, int]]]:
+    with transaction.atomic():
+        stats, _ = TenantStats.objects.select_for_update().get_or_create(tenant_id=tenant_id)
+        actual = compute_stats(tenant_id)
+        drift = {
+            field: (getattr(stats, field), value) for field, value in actual.items() if getattr(stats, field) != value
+        }
+        for field, value in actual.items():
+            setattr(stats, field, value)
+        stats.save()
+    return stats, drift
+
+
+def repair_all_stats() -> int:
+    repaired = 0
+    for tenant_id in Tenant.objects.order_by("id").values_list("id", flat=True):
+        _, drift = refresh_stats(tenant_id)
+        if drift:
+            repaired += 1
+            logger.warning("stats.drift tenant_id=%s drift=%s", tenant_id, drift)
+    return repaired
+
+
+def get_stats(tenant_id: int) -> TenantStats:
+    stats = TenantStats.objects.filter(tenant_id=tenant_id).first()
+    if stats is None:
+        stats, _ = refresh_stats(tenant_id)
+    return stats
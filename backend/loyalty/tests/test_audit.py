@@ -0,0 +1,69 @@
+import json
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.test import TestCase
+from django.utils import timezone
+
+from loyalty.audit import AuditBuffer, audit_buffer, recover_spool, serialize_entry
+from loyalty.caching import clear_local_caches
+from loyalty.models import AuditLog, Tenant, User
+from loyalty.tests.test_points import PointsTestCase
+
+
+class AuditBufferTests(TestCase):
+    def setUp(self):
+        clear_local_caches()
+        self.tenant = Tenant.objects.create(slug="org1", name="Org 1")
+        self.user = User.objects.create_user(email="admin@org1.local", password="x", tenant=self.tenant)
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool_dir = Path(spool.name)
+
+    def test_flushes_when_full(self):
+        buffer = AuditBuffer(self.spool_dir, max_entries=2, max_age_seconds=60)
+        buffer.add(serialize_entry(self.tenant, self.user, "login", {}))
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(len(list(self.spool_dir.iterdir())), 1)
+        buffer.add(serialize_entry(self.tenant, None, "refund", {"receipt_id": "r-1"}))
+        self.assertEqual(AuditLog.objects.count(), 2)
+        self.assertEqual(list(self.spool_dir.iterdir()), [])
+
+    def test_keeps_original_timestamp(self):
+        buffer = AuditBuffer(self.spool_dir, max_entries=10, max_age_seconds=60)
+        entry = serialize_entry(self.tenant, self.user, "login", {})
+        entry["created_at"] = (timezone.now() - timedelta(minutes=5)).isoformat()
+        buffer.add(entry)
+        buffer.flush()
+        self.assertLess(AuditLog.objects.get().created_at, timezone.now() - timedelta(minutes=4))
+
+    def test_recovers_orphaned_spool(self):
+        orphan = self.spool_dir / "audit-1-dead.jsonl"
+        entries = [serialize_entry(self.tenant, self.user, "earn", {}) for _ in range(3)]
+        orphan.write_text("".join(json.dumps(entry) + "\n" for entry in entries) + "{broken", encoding="utf-8")
+        live = AuditBuffer(self.spool_dir, max_entries=10, max_age_seconds=60)
+        live.add(serialize_entry(self.tenant, self.user, "login", {}))
+
+        self.assertEqual(recover_spool(self.spool_dir), 3)
+        self.assertFalse(orphan.exists())
+        self.assertEqual(AuditLog.objects.filter(action="earn").count(), 3)
+        self.assertEqual(len(list(self.spool_dir.iterdir())), 1)
+        live.flush()
+        self.assertEqual(AuditLog.objects.count(), 4)
+
+
+class AuditLogTests(PointsTestCase):
+    def test_earn_is_audited_after_commit(self):
+        audit_buffer.flush()
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.addCleanup(setattr, audit_buffer, "spool_dir", audit_buffer.spool_dir)
+        audit_buffer.spool_dir = Path(spool.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.points("earn", "1000")
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(audit_buffer.pending(), 1)
+        audit_buffer.flush()
+        self.assertEqual(AuditLog.objects.get().action, "earn")
@@ -0,0 +1,156 @@
+import io
+import os
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from loyalty.caching import clear_local_caches
+from loyalty.imports import import_customers, read_rows
+from loyalty.models import Job, LoyaltyCard, Tenant, TenantStats, User
+
+
+class CustomerDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.tenant = Tenant.objects.create(slug="org1", name="Org 1")
+        self.admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+        clients = [
+            ("anna@mail.test", "+79990000001", "Anna", 50, True),
+            ("boris@mail.test", "+79990000002", "Boris", 700, False),
+            ("anton@shop.test", "+78880000003", "Anton", 1500, True),
+        ]
+        for index, (email, phone, name, points, verified) in enumerate(clients):
+            user = User.objects.create_user(
+                email=email,
+                phone=phone,
+                first_name=name,
+                password="x",
+                tenant=self.tenant,
+                email_verified=verified,
+            )
+            LoyaltyCard.objects.create(user=user, tenant=self.tenant, current_points=points)
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def customers(self, **params):
+        return self.api.get(f"/api/v1/t/{self.tenant.slug}/admin/customers", params)
+
+    def emails(self, **params):
+        return [item["email"] for item in self.customers(**params).json()]
+
+    def test_search_and_filters(self):
+        self.assertEqual(self.emails(q="an"), ["anton@shop.test", "anna@mail.test"])
+        self.assertEqual(self.emails(q="boris@"), ["boris@mail.test"])
+        self.assertEqual(self.emails(q="8 999"), ["anna@mail.test", "boris@mail.test"])
+        self.assertEqual(self.emails(points_min=100, points_max=1000), ["boris@mail.test"])
+        self.assertEqual(self.emails(verified="false"), ["boris@mail.test"])
+        self.assertEqual(self.customers(points_min="many").json()["detail"], "INVALID_FILTER")
+
+    def test_pages_without_per_row_queries(self):
+        self.customers(limit=1)
+        with self.assertNumQueries(1):
+            res = self.customers(limit=2)
+        self.assertEqual(len(res.json()), 2)
+        rest = self.customers(limit=2, cursor=res.headers["X-Next-Cursor"])
+        self.assertEqual([item["email"] for item in rest.json()], ["anna@mail.test"])
+        self.assertNotIn("X-Next-Cursor", rest.headers)
+
+    def test_filtered_pages_follow_the_search_key(self):
+        for params, expected in (
+            ({"q": "+7"}, ["anton@shop.test", "anna@mail.test", "boris@mail.test"]),
+            ({"points_min": 0}, ["anna@mail.test", "boris@mail.test", "anton@shop.test"]),
+        ):
+            emails, cursor = [], None
+            while True:
+                res = self.customers(limit=1, **params, **({"cursor": cursor} if cursor else {}))
+                emails += [item["email"] for item in res.json()]
+                cursor = res.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            self.assertEqual(emails, expected)
+        self.assertEqual(self.customers(q="+7", cursor="MTI").json()["detail"], "INVALID_CURSOR")
+
+
+class CustomerImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.tenant = Tenant.objects.create(slug="org1", name="Org 1")
+        self.admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+        existing = User.objects.create_user(
+            email="anna@mail.test", phone="+79990000001", password="x", tenant=self.tenant
+        )
+        LoyaltyCard.objects.create(user=existing, tenant=self.tenant)
+        self.csv = (
+            "Email,Phone,First_Name,Last_Name\n"
+            "ANNA@mail.test,,Anna,Old\n"
+            ",8 (999) 000-00-01,Dup,Phone\n"
+            "boris@mail.test,8 (999) 111-22-33,Boris,Petrov\n"
+            ",+7 999 222 33 44,Vera,\n"
+            "boris@mail.test,,Boris,Again\n"
+            "not-an-email,,Bad,Row\n"
+            ",,Nobody,\n"
+            "gleb@mail.test,,Gleb,Orlov\n"
+        )
+
+    def test_imports_new_clients_with_cards(self):
+        self.check_import(use_copy=False)
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_copy_imports_new_clients_with_cards(self):
+        self.check_import(use_copy=True)
+
+    def test_rows_taken_concurrently_count_as_duplicates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            import_customers(self.tenant, read_rows(io.StringIO(self.csv)), batch_size=100, use_copy=False)
+        with self.captureOnCommitCallbacks(execute=True), mock.patch(
+            "loyalty.imports.fresh_rows", lambda tenant, rows, report: rows
+        ):
+            again = import_customers(self.tenant, read_rows(io.StringIO(self.csv)), batch_size=100, use_copy=False)
+        self.assertEqual((again.created, again.duplicates), (0, 6))
+        self.assertEqual(LoyaltyCard.objects.filter(tenant=self.tenant).count(), 4)
+        self.assertEqual(TenantStats.objects.get(tenant=self.tenant).clients, 3)
+
+    def check_import(self, use_copy):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = import_customers(self.tenant, read_rows(io.StringIO(self.csv)), batch_size=2, use_copy=use_copy)
+        self.assertEqual((report.rows, report.created, report.duplicates, report.invalid), (8, 3, 3, 2))
+        self.assertEqual(
+            report.errors, [{"line": 7, "reason": "INVALID_EMAIL"}, {"line": 8, "reason": "CONTACT_REQUIRED"}]
+        )
+        boris = User.objects.get(tenant=self.tenant, email="boris@mail.test")
+        self.assertEqual((boris.phone, boris.last_name), ("+79991112233", "Petrov"))
+        self.assertEqual(boris.username, f"{self.tenant.id}:boris@mail.test")
+        self.assertFalse(boris.has_usable_password())
+        vera = User.objects.get(tenant=self.tenant, phone="+79992223344")
+        self.assertIsNone(vera.email)
+        self.assertEqual(vera.username, f"{self.tenant.id}:phone:+79992223344")
+        self.assertEqual(LoyaltyCard.objects.filter(tenant=self.tenant).count(), 4)
+        self.assertEqual(TenantStats.objects.get(tenant=self.tenant).clients, 3)
+
+        again = import_customers(self.tenant, read_rows(io.StringIO(self.csv)), batch_size=100, use_copy=use_copy)
+        self.assertEqual((again.created, again.duplicates), (0, 6))
+
+    def test_admin_upload_runs_import_job(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        with override_settings(IMPORT_DIR=directory.name, JOBS_EAGER=True), mock.patch(
+            "loyalty.audit.audit_buffer.add"
+        ), self.captureOnCommitCallbacks(execute=True):
+            res = api.post(f"/api/v1/t/{self.tenant.slug}/admin/customers/import", self.csv, content_type="text/csv")
+        self.assertEqual(res.status_code, 202)
+        job = api.get(f"/api/v1/t/{self.tenant.slug}/admin/customers/import/{res.json()['id']}").json()
+        self.assertEqual(job["status"], Job.Status.DONE)
+        self.assertEqual((job["processed"], job["total"], job["result"]["created"]), (8, 8, 3))
+        self.assertEqual(os.listdir(directory.name), [])
@@ -0,0 +1,175 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from loyalty.caching import VersionedLocalCache
+from loyalty.coupons import coupon_cards, issue_coupon
+from loyalty.models import (
+    Coupon,
+    CouponAssignment,
+    Job,
+    LoyaltyCard,
+    LoyaltyOperation,
+    Offer,
+    OfferRedemption,
+    OfferTarget,
+    User,
+)
+from loyalty.offers import build_offer_index, get_offer_index
+from loyalty.tests.test_points import PointsTestCase
+
+
+class OfferEngineTests(PointsTestCase):
+    def offer(self, **fields) -> Offer:
+        return Offer.objects.create(tenant=self.tenant, title="Offer", **fields)
+
+    def test_multiplier_and_bonus_apply_at_earn(self):
+        double = self.offer(type=Offer.Type.MULTIPLIER, multiplier=Decimal("2"))
+        self.offer(type=Offer.Type.MULTIPLIER, multiplier=Decimal("1.5"))
+        bonus = self.offer(type=Offer.Type.BONUS, bonus_points=50)
+        res = self.points("earn", "1000")
+        self.assertEqual(res.json()["points"], 250)
+        op = LoyaltyOperation.objects.get()
+        self.assertEqual([item["id"] for item in op.metadata["offers"]], [double.id, bonus.id])
+
+    def test_inactive_and_foreign_offers_are_skipped(self):
+        now = timezone.now()
+        self.offer(type=Offer.Type.BONUS, bonus_points=10, active_to=now - timedelta(days=1))
+        self.offer(type=Offer.Type.BONUS, bonus_points=20, active_from=now + timedelta(days=1))
+        self.offer(type=Offer.Type.BONUS, bonus_points=30, is_active=False)
+        other = User.objects.create_user(email="other@org1.local", password="x", tenant=self.tenant)
+        targeted = self.offer(type=Offer.Type.BONUS, bonus_points=40, applies_to_all=False)
+        OfferTarget.objects.create(offer=targeted, user=other, tenant=self.tenant)
+        mine = self.offer(type=Offer.Type.BONUS, bonus_points=5, applies_to_all=False)
+        OfferTarget.objects.create(offer=mine, user=self.client_user, tenant=self.tenant)
+
+        self.assertEqual(self.points("earn", "1000").json()["points"], 105)
+
+    def test_index_is_cached_until_offers_change(self):
+        get_offer_index(self.tenant.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_offer_index(self.tenant.id).eligible(self.client_user.id, timezone.now()), [])
+        admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+        api = APIClient()
+        api.force_authenticate(admin)
+        res = api.post(
+            f"/api/v1/t/{self.tenant.slug}/admin/offers",
+            {"title": "Bonus", "type": "BONUS", "bonus_points": 7},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 201)
+        eligible = get_offer_index(self.tenant.id).eligible(self.client_user.id, timezone.now())
+        self.assertEqual([offer.id for offer in eligible], [res.json()["id"]])
+
+    @override_settings(CACHE_VERSION_CHECK_SECONDS=0)
+    def test_deactivation_and_deletion_reach_other_workers(self):
+        worker = VersionedLocalCache("offers", 300)
+        self.addCleanup(VersionedLocalCache.instances.remove, worker)
+
+        def eligible():
+            index = worker.get(self.tenant.id, lambda: build_offer_index(self.tenant.id), scope=self.tenant.id)
+            return [offer.id for offer in index.eligible(self.client_user.id, timezone.now())]
+
+        bonus = self.offer(type=Offer.Type.BONUS, bonus_points=10)
+        late = self.offer(type=Offer.Type.BONUS, bonus_points=20)
+        self.assertEqual(eligible(), [bonus.id, late.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            bonus.is_active = False
+            bonus.save()
+        self.assertEqual(eligible(), [late.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            late.delete()
+        self.assertEqual(eligible(), [])
+
+
+class OfferListQueryTests(PointsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+
+    def add_offers(self, count: int) -> None:
+        for _ in range(count):
+            offer = Offer.objects.create(tenant=self.tenant, title="Offer", applies_to_all=False)
+            OfferTarget.objects.create(offer=offer, user=self.client_user, tenant=self.tenant)
+            OfferRedemption.objects.create(offer=offer, user=self.client_user, tenant=self.tenant)
+
+    def get(self, user, path: str, queries: int) -> list:
+        api = APIClient()
+        api.force_authenticate(user)
+        url = f"/api/v1/t/{self.tenant.slug}/{path}"
+        api.get(url)
+        with self.assertNumQueries(queries):
+            return api.get(url).json()
+
+    def test_client_offers_query_count_is_constant(self):
+        self.add_offers(1)
+        self.get(self.client_user, "client/offers", 3)
+        self.add_offers(4)
+        offers = self.get(self.client_user, "client/offers", 3)
+        self.assertEqual(len(offers), 5)
+        self.assertTrue(all(offer["is_used"] and offer["target_ids"] == [self.client_user.id] for offer in offers))
+
+    def test_admin_offers_query_count_is_constant(self):
+        self.add_offers(1)
+        self.get(self.admin, "admin/offers", 2)
+        self.add_offers(4)
+        self.assertEqual(len(self.get(self.admin, "admin/offers", 2)), 5)
+
+
+class CouponIssueTests(PointsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.coupon = Coupon.objects.create(tenant=self.tenant, code="GOLD5", title="5% off")
+        self.card.tier = "Gold"
+        self.card.save(update_fields=["tier"])
+        self.gold = [self.card]
+        for index in range(4):
+            user = User.objects.create_user(email=f"c{index}@org1.local", password="x", tenant=self.tenant)
+            tier = "Gold" if index % 2 else "Silver"
+            card = LoyaltyCard.objects.create(user=user, tenant=self.tenant, tier=tier)
+            if tier == "Gold":
+                self.gold.append(card)
+        self.gold[-1].status = LoyaltyCard.Status.BLOCKED
+        self.gold[-1].save(update_fields=["status"])
+
+    def test_issues_once_per_card_in_chunks(self):
+        CouponAssignment.objects.create(card=self.card, coupon=self.coupon, tenant=self.tenant)
+        progress = []
+        with self.assertNumQueries(13):
+            issued = issue_coupon(
+                self.coupon,
+                coupon_cards(self.tenant.id, {"tier": "Gold"}),
+                chunk_size=1,
+                progress=lambda processed, total: progress.append((processed, total)),
+            )
+        self.assertEqual(issued, 1)
+        self.assertEqual((progress[0], progress[-1]), ((1, 2), (2, 2)))
+        self.assertEqual(
+            set(CouponAssignment.objects.values_list("card_id", flat=True)), {card.id for card in self.gold[:2]}
+        )
+        self.assertEqual(issue_coupon(self.coupon, coupon_cards(self.tenant.id, {})), 2)
+        self.assertEqual(CouponAssignment.objects.filter(coupon=self.coupon).count(), 4)
+
+    def test_admin_issue_endpoint_queues_job(self):
+        admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+        api = APIClient()
+        api.force_authenticate(admin)
+        url = f"/api/v1/t/{self.tenant.slug}/admin/coupons/{self.coupon.id}/issue"
+        self.assertEqual(api.post(url, {"points_min": "many"}, format="json").json()["detail"], "INVALID_FILTER")
+        self.silence_audit()
+        with override_settings(JOBS_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+            res = api.post(url, {"tier": "Gold"}, format="json")
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(res.json()["cards"], 2)
+        job = api.get(f"{url}/{res.json()['id']}").json()
+        self.assertEqual((job["status"], job["result"], job["total"]), (Job.Status.DONE, {"issued": 2}, 2))
+        self.assertEqual(CouponAssignment.objects.filter(coupon=self.coupon).count(), 2)
@@ -0,0 +1,40 @@
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from unittest import mock
+
+from django.test import TestCase
+
+from loyalty.partitions import add_months, month_bound, partition_name
+from loyalty.schedule import PERIODIC, Scheduler
+
+
+class PartitionHelperTests(TestCase):
+    def test_month_arithmetic(self):
+        self.assertEqual(add_months(date(2026, 11, 1), 2), date(2027, 1, 1))
+        self.assertEqual(add_months(date(2026, 1, 1), -1), date(2025, 12, 1))
+        self.assertEqual(partition_name(date(2026, 3, 1)), "loyalty_loyaltyoperation_p202603")
+        self.assertEqual(month_bound(date(2026, 3, 1)), "2026-03-01T00:00:00+00:00")
+
+    def test_sqlite_is_left_unpartitioned(self):
+        out = StringIO()
+        call_command("partition_operations", "ensure", stdout=out)
+        self.assertIn("not partitioned", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("partition_operations", "convert", stdout=StringIO())
+
+    def test_worker_schedule_runs_ensure_periodically(self):
+        tasks = {"ensure_partitions": PERIODIC["ensure_partitions"]}
+        scheduler = Scheduler(tasks)
+        with self.settings(LEDGER_PARTITION_ENSURE_SECONDS=60), mock.patch(
+            "loyalty.partitions.ensure", return_value=[]
+        ) as ensure, mock.patch("loyalty.partitions.connection") as connection:
+            connection.vendor = "postgresql"
+            self.assertEqual(scheduler.run_due(1000), ["ensure_partitions"])
+            self.assertEqual(scheduler.run_due(1030), [])
+            self.assertEqual(scheduler.run_due(1061), ["ensure_partitions"])
+        self.assertEqual(ensure.call_count, 2)
+        with self.settings(LEDGER_PARTITION_ENSURE_SECONDS=0):
+            self.assertEqual(Scheduler(tasks).run_due(1000), [])
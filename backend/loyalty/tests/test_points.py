@@ -0,0 +1,759 @@
+import csv
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from decimal import Decimal
+from unittest import mock
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from loyalty.caching import clear_local_caches
+from loyalty.counters import day_bucket, earned_today, minute_bucket, staff_ops_last_hour
+from loyalty.idempotency import DuplicateResponse, get_response, operation_key, store_response
+from loyalty.lots import expire_cards, expire_tenant
+from loyalty.models import (
+    CardDailyEarn,
+    DailyRollup,
+    IdempotencyRecord,
+    Location,
+    LoyaltyCard,
+    LoyaltyOperation,
+    LoyaltyRule,
+    OneTimeQR,
+    PointsLot,
+    Segment,
+    StaffMinuteOps,
+    Tenant,
+    TenantStats,
+    User,
+)
+from loyalty.offers import invalidate_offers
+from loyalty.reconcile import reconcile_tenant, repair
+from loyalty.rollups import rebuild_rollups
+from loyalty.rolling_qr import build_payload, step_at
+from loyalty.rules import invalidate_rules
+from loyalty.schedule import PERIODIC, Scheduler
+from loyalty.segments import refresh_segment
+from loyalty.stats import compute_stats, refresh_stats
+from loyalty.tiers import retier_tenant
+
+
+class PointsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.tenant = Tenant.objects.create(slug="org1", name="Org 1", pos_api_key="pos-key")
+        self.location = Location.objects.create(tenant=self.tenant, name="Main")
+        LoyaltyRule.objects.create(tenant=self.tenant, earn_percent=Decimal("10"))
+        invalidate_rules(self.tenant.id)
+        invalidate_offers(self.tenant.id)
+        self.cashier = User.objects.create_user(
+            email="cashier@org1.local", password="x", tenant=self.tenant, role=User.Role.CASHIER
+        )
+        self.client_user = User.objects.create_user(
+            email="client@org1.local", password="x", tenant=self.tenant, email_verified=True
+        )
+        self.card = LoyaltyCard.objects.create(user=self.client_user, tenant=self.tenant)
+        self.api = APIClient()
+        self.api.force_authenticate(self.cashier)
+
+    def silence_audit(self) -> None:
+        patcher = mock.patch("loyalty.audit.audit_buffer.add")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def issue_qr(self) -> str:
+        token = uuid4().hex
+        OneTimeQR.objects.create(
+            card=self.card,
+            tenant=self.tenant,
+            token=token,
+            expires_at=timezone.now() + timedelta(seconds=30),
+        )
+        return token
+
+    def points(self, action: str, amount: str, key: str | None = None, **extra):
+        payload = {"qr_payload": self.issue_qr(), "amount": amount, "idempotency_key": key or uuid4().hex}
+        payload.update(extra)
+        return self.api.post(f"/api/v1/t/{self.tenant.slug}/loyalty/points/{action}", payload, format="json")
+
+
+class CounterTests(PointsTestCase):
+    def test_earn_updates_counters(self):
+        res = self.points("earn", "1000")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["points"], 100)
+        self.assertEqual(earned_today(self.card.id), 100)
+        self.assertEqual(staff_ops_last_hour(self.cashier.id), 1)
+
+    def test_daily_limit_uses_counter(self):
+        with self.settings(MAX_EARN_PER_DAY_PER_CARD=150):
+            self.assertEqual(self.points("earn", "1000").status_code, 200)
+            res = self.points("earn", "1000")
+            self.assertEqual(self.points("earn", "500").status_code, 200)
+            self.assertEqual(self.points("earn", "10").json()["detail"], "MAX_EARN_PER_DAY_REACHED")
+        self.assertEqual(res.json()["detail"], "MAX_EARN_PER_DAY_REACHED")
+        self.assertEqual(earned_today(self.card.id), 150)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.current_points, 150)
+        self.assertEqual(
+            LoyaltyOperation.objects.filter(fail_reason="MAX_EARN_PER_DAY_REACHED", points=0).count(), 2
+        )
+
+    def test_staff_limit_counts_failed_operations(self):
+        with self.settings(MAX_OPS_PER_HOUR_PER_STAFF=2):
+            self.points("redeem", "50")
+            self.points("earn", "10")
+            res = self.points("earn", "10")
+        self.assertEqual(res.json()["detail"], "MAX_OPS_PER_HOUR_REACHED")
+
+    def test_staff_window_counts_every_minute_of_the_last_hour(self):
+        now = timezone.now()
+        StaffMinuteOps.objects.create(staff=self.cashier, minute=minute_bucket(now - timedelta(minutes=59)), count=120)
+        StaffMinuteOps.objects.create(staff=self.cashier, minute=minute_bucket(now - timedelta(minutes=61)), count=50)
+        StaffMinuteOps.objects.create(staff=self.cashier, minute=minute_bucket(now), count=1)
+        self.assertEqual(staff_ops_last_hour(self.cashier.id, now), 121)
+
+    def test_rebuild_counters_matches_ledger(self):
+        self.points("earn", "1000")
+        self.points("earn", "500")
+        CardDailyEarn.objects.all().delete()
+        StaffMinuteOps.objects.all().delete()
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertEqual(earned_today(self.card.id), 150)
+        self.assertEqual(staff_ops_last_hour(self.cashier.id), LoyaltyOperation.objects.count())
+
+    def test_counters_bucket_by_local_day(self):
+        late = datetime(2026, 3, 1, 22, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(day_bucket(late), date(2026, 3, 2))
+        self.points("earn", "1000")
+        LoyaltyOperation.objects.update(created_at=late)
+        call_command("rebuild_counters", "--days=0", stdout=StringIO())
+        self.assertEqual(list(CardDailyEarn.objects.values_list("day", "points")), [(date(2026, 3, 2), 100)])
+        rebuild_rollups(self.tenant.id, date(2026, 3, 1), date(2026, 3, 2))
+        self.assertEqual(list(DailyRollup.objects.values_list("day", "points")), [(date(2026, 3, 2), 100)])
+
+
+class BalanceUpdateTests(PointsTestCase):
+    def test_earn_updates_balance_and_tier(self):
+        res = self.points("earn", "20000")
+        self.assertEqual(res.json()["current_points"], 2000)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.current_points, 2000)
+        self.assertEqual(self.card.tier, "Gold")
+
+    def test_redeem_without_balance_keeps_qr(self):
+        token = self.issue_qr()
+        payload = {"qr_payload": token, "amount": "50", "idempotency_key": uuid4().hex}
+        res = self.api.post(f"/api/v1/t/{self.tenant.slug}/loyalty/points/redeem", payload, format="json")
+        self.assertEqual(res.json()["detail"], "INSUFFICIENT_POINTS")
+        self.assertIsNone(OneTimeQR.objects.get(token=token).used_at)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.current_points, 0)
+
+    def test_redeem_decrements_balance(self):
+        self.points("earn", "1000")
+        res = self.points("redeem", "40")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["current_points"], 60)
+
+    def test_redeem_on_card_blocked_mid_flight(self):
+        self.points("earn", "1000")
+
+        def block_card(staff):
+            LoyaltyCard.objects.filter(id=self.card.id).update(status=LoyaltyCard.Status.BLOCKED)
+            return False, None
+
+        with mock.patch("loyalty.views.ops_limit_reached", block_card):
+            res = self.points("redeem", "40")
+        self.assertEqual(res.json()["detail"], "CARD_BLOCKED")
+        self.assertEqual(LoyaltyCard.objects.get(id=self.card.id).current_points, 100)
+
+    def test_qr_cannot_be_reused(self):
+        token = self.issue_qr()
+        url = f"/api/v1/t/{self.tenant.slug}/loyalty/points/earn"
+        first = self.api.post(url, {"qr_payload": token, "amount": "100", "idempotency_key": "a"}, format="json")
+        second = self.api.post(url, {"qr_payload": token, "amount": "100", "idempotency_key": "b"}, format="json")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json()["detail"], "QR_USED")
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.current_points, 10)
+
+
+class IdempotencyTests(PointsTestCase):
+    def test_replay_returns_original_response(self):
+        first = self.points("earn", "1000", key="k-1")
+        self.points("earn", "500")
+        again = self.points("earn", "1000", key="k-1")
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(LoyaltyOperation.objects.filter(idempotency_key="k-1").count(), 1)
+
+    def test_replay_is_served_from_cache(self):
+        self.points("earn", "1000", key="k-1")
+        cache.clear()
+        self.points("earn", "1000", key="k-1")
+        with self.assertNumQueries(0):
+            payload, code = get_response(self.tenant, operation_key("k-1"))
+        self.assertEqual((payload["points"], code), (100, 200))
+
+    def test_failed_response_is_replayed(self):
+        first = self.points("redeem", "50", key="k-1")
+        self.points("earn", "1000")
+        again = self.points("redeem", "50", key="k-1")
+        self.assertEqual(again.status_code, 400)
+        self.assertEqual(again.content, first.content)
+
+    def test_expired_record_falls_back_to_ledger(self):
+        self.points("earn", "1000", key="k-1")
+        IdempotencyRecord.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+        self.points("earn", "500")
+        again = self.points("earn", "1000", key="k-1")
+        self.assertEqual(again.json(), {"detail": "OK", "points": 100, "current_points": 150})
+
+    def test_expired_record_is_overwritten(self):
+        store_response(self.tenant, "op:k-1", {"detail": "OLD"}, 400)
+        with self.assertRaises(DuplicateResponse):
+            store_response(self.tenant, "op:k-1", {"detail": "NEW"}, 200)
+        IdempotencyRecord.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+        store_response(self.tenant, "op:k-1", {"detail": "NEW"}, 200)
+        self.assertEqual(get_response(self.tenant, "op:k-1"), ({"detail": "NEW"}, 200))
+        self.assertEqual(IdempotencyRecord.objects.count(), 1)
+
+    def test_pos_receipt_replay(self):
+        url = f"/api/v1/t/{self.tenant.slug}/pos/loyalty/earn"
+        payload = {"qr_payload": self.issue_qr(), "amount": "1000", "receipt_id": "r-1", "location_id": self.location.id}
+        first = self.client.post(url, payload, content_type="application/json", HTTP_X_POS_API_KEY="pos-key")
+        self.points("earn", "500")
+        again = self.client.post(url, payload, content_type="application/json", HTTP_X_POS_API_KEY="pos-key")
+        self.assertEqual(again.content, first.content)
+        self.assertTrue(IdempotencyRecord.objects.filter(tenant=self.tenant, key="pos:r-1").exists())
+
+
+class RefundTests(PointsTestCase):
+    def refund(self, receipt_id: str, key: str | None = None):
+        return self.api.post(
+            f"/api/v1/t/{self.tenant.slug}/loyalty/points/refund",
+            {"receipt_id": receipt_id, "idempotency_key": key or uuid4().hex},
+            format="json",
+        )
+
+    def test_refund_reverses_earn_once(self):
+        self.points("earn", "1000", receipt_id="r-1")
+        self.assertEqual(self.refund("r-1").json()["current_points"], 0)
+        self.assertEqual(self.refund("r-1").json()["detail"], "ALREADY_REFUNDED")
+
+    def test_refund_outside_lookback_is_rejected(self):
+        self.points("earn", "1000", receipt_id="r-1")
+        LoyaltyOperation.objects.update(created_at=timezone.now() - timedelta(days=400))
+        with self.settings(REFUND_LOOKBACK_DAYS=365):
+            res = self.refund("r-1")
+        self.assertEqual(res.json()["detail"], "RECEIPT_NOT_FOUND")
+
+    def test_concurrent_duplicate_replays_stored_response(self):
+        self.points("earn", "1000", receipt_id="r-1")
+        stored = {"detail": "OK", "points": 100, "current_points": 0}
+        store_response(self.tenant, operation_key("rk-1"), stored, 200)
+        with mock.patch("loyalty.views.get_response", side_effect=[None, (stored, 200)]):
+            res = self.refund("r-1", key="rk-1")
+        self.assertEqual((res.status_code, res.json()), (200, stored))
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.current_points, 100)
+        self.assertFalse(LoyaltyOperation.objects.filter(type=LoyaltyOperation.Type.REFUND).exists())
+
+
+class ReconcileTests(PointsTestCase):
+    def test_consistent_ledger_has_no_drift(self):
+        self.points("earn", "20000", receipt_id="r-1")
+        self.points("redeem", "300")
+        self.points("earn", "1000", receipt_id="r-2")
+        self.api.post(
+            f"/api/v1/t/{self.tenant.slug}/loyalty/points/refund",
+            {"receipt_id": "r-2", "idempotency_key": uuid4().hex},
+            format="json",
+        )
+        report = reconcile_tenant(self.tenant, chunk_size=2)
+        self.assertEqual(report.operations, 4)
+        self.assertEqual(report.drifts, [])
+
+    def test_repair_applies_missing_delta(self):
+        self.points("earn", "20000")
+        LoyaltyCard.objects.filter(id=self.card.id).update(current_points=10, tier="Bronze")
+        out = StringIO()
+        call_command("reconcile_balances", "--repair", stdout=out)
+        self.assertIn("1 balance drifts, 1 tier drifts", out.getvalue())
+        self.card.refresh_from_db()
+        self.assertEqual((self.card.current_points, self.card.tier), (2000, "Gold"))
+        self.assertEqual(reconcile_tenant(self.tenant).drifts, [])
+
+    def test_tiers_follow_location_and_segment_rules(self):
+        LoyaltyRule.objects.create(
+            tenant=self.tenant,
+            location=self.location,
+            earn_percent=Decimal("10"),
+            silver_threshold=50,
+            gold_threshold=5000,
+        )
+        self.points("earn", "1000", location_id=self.location.id)
+        newcomer = User.objects.create_user(email="new@org1.local", password="x", tenant=self.tenant)
+        LoyaltyCard.objects.create(user=newcomer, tenant=self.tenant)
+        segment = Segment.objects.create(tenant=self.tenant, name="Newcomers", points_max=10)
+        LoyaltyRule.objects.create(
+            tenant=self.tenant, applies_to_all=False, segment=segment, silver_threshold=0, gold_threshold=0
+        )
+        refresh_segment(segment)
+        retier_tenant(self.tenant)
+        self.assertEqual(
+            list(LoyaltyCard.objects.order_by("id").values_list("tier", flat=True)), ["Silver", "Gold"]
+        )
+        self.assertEqual(reconcile_tenant(self.tenant).drifts, [])
+
+        LoyaltyCard.objects.update(tier="Bronze")
+        report = reconcile_tenant(self.tenant)
+        self.assertEqual([drift.expected_tier for drift in report.drifts], ["Silver", "Gold"])
+        chunked = reconcile_tenant(self.tenant, chunk_size=1)
+        self.assertEqual((chunked.cards, chunked.operations, chunked.drifts), (2, 1, report.drifts))
+        self.assertEqual(repair(report), 2)
+        self.assertEqual(
+            list(LoyaltyCard.objects.order_by("id").values_list("tier", flat=True)), ["Silver", "Gold"]
+        )
+
+
+class PointsLotTests(PointsTestCase):
+    def test_redeem_consumes_oldest_lots_first(self):
+        self.points("earn", "1000")
+        self.points("earn", "500")
+        self.points("redeem", "120")
+        self.assertEqual(list(PointsLot.objects.order_by("id").values_list("remaining", flat=True)), [0, 30])
+
+    def test_refund_of_earn_consumes_its_own_lot(self):
+        self.points("earn", "1000")
+        self.points("earn", "500", receipt_id="r-2")
+        self.api.post(
+            f"/api/v1/t/{self.tenant.slug}/loyalty/points/refund",
+            {"receipt_id": "r-2", "idempotency_key": uuid4().hex},
+            format="json",
+        )
+        self.assertEqual(list(PointsLot.objects.order_by("id").values_list("remaining", flat=True)), [100, 0])
+
+    def test_expired_lots_write_expire_operations(self):
+        self.points("earn", "1000")
+        self.points("earn", "500")
+        PointsLot.objects.filter(points=100).update(expires_at=timezone.now() - timedelta(days=1))
+        out = StringIO()
+        call_command("expire_points", stdout=out)
+        self.assertIn("expired 100 points on 1 cards", out.getvalue())
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.current_points, 50)
+        expire = LoyaltyOperation.objects.get(type=LoyaltyOperation.Type.EXPIRE)
+        self.assertEqual((expire.points, expire.source), (100, LoyaltyOperation.Source.SYSTEM))
+        self.assertEqual(reconcile_tenant(self.tenant).drifts, [])
+        call_command("expire_points", stdout=StringIO())
+        self.assertEqual(LoyaltyOperation.objects.filter(type=LoyaltyOperation.Type.EXPIRE).count(), 1)
+
+    def test_expiry_is_clamped_to_balance_and_retries_locked_cards(self):
+        self.points("earn", "1000")
+        PointsLot.objects.update(expires_at=timezone.now() - timedelta(days=1))
+        LoyaltyCard.objects.filter(id=self.card.id).update(current_points=40)
+        calls = []
+
+        def locked_once(tenant, card_ids, now):
+            calls.append(card_ids)
+            return (card_ids, 0, 0) if len(calls) == 1 else expire_cards(tenant, card_ids, now)
+
+        with self.settings(POINTS_EXPIRY_RETRY_MS=0), mock.patch("loyalty.lots.expire_cards", locked_once):
+            self.assertEqual(expire_tenant(self.tenant, timezone.now()), (1, 40))
+        self.assertEqual(calls, [[self.card.id], [self.card.id]])
+        self.assertEqual(LoyaltyCard.objects.get(id=self.card.id).current_points, 0)
+        expire = LoyaltyOperation.objects.get(type=LoyaltyOperation.Type.EXPIRE)
+        self.assertEqual((expire.points, expire.metadata), (40, {"lots": 1, "lot_points": 100}))
+
+    def test_expiry_walks_cards_in_keyset_chunks(self):
+        self.points("earn", "1000")
+        other = User.objects.create_user(email="other@org1.local", password="x", tenant=self.tenant)
+        card = LoyaltyCard.objects.create(user=other, tenant=self.tenant, current_points=30)
+        PointsLot.objects.create(
+            tenant=self.tenant, card=card, points=30, remaining=30, earned_at=timezone.now(), expires_at=None
+        )
+        PointsLot.objects.update(expires_at=timezone.now() - timedelta(days=1))
+        calls = []
+
+        def tracked(tenant, card_ids, now):
+            calls.append(card_ids)
+            return expire_cards(tenant, card_ids, now)
+
+        with mock.patch("loyalty.lots.expire_cards", tracked), mock.patch("loyalty.ledger.track_operation") as track:
+            self.assertEqual(expire_tenant(self.tenant, timezone.now(), chunk_size=1), (2, 130))
+        self.assertEqual(calls, [[self.card.id], [card.id]])
+        self.assertEqual(track.call_count, 2)
+        self.assertEqual(list(LoyaltyCard.objects.order_by("id").values_list("current_points", flat=True)), [0, 0])
+
+
+class TenantStatsTests(PointsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.silence_audit()
+
+    def test_write_paths_keep_stats_in_sync(self):
+        refresh_stats(self.tenant.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.points("earn", "1000")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.points("redeem", "30")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.points("redeem", "500")
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(email="second@org1.local", password="x", tenant=self.tenant)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.location.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            admin = User.objects.create_user(
+                email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+            )
+        api = APIClient()
+        api.force_authenticate(admin)
+        with self.assertNumQueries(1):
+            res = api.get(f"/api/v1/t/{self.tenant.slug}/admin/dashboard")
+        expected = compute_stats(self.tenant.id)
+        self.assertEqual(res.json(), expected)
+        self.assertEqual((expected["clients"], expected["locations"], expected["operations"]), (2, 0, 3))
+        self.assertEqual((expected["points_issued"], expected["points_redeemed"]), (100, 30))
+
+    def test_role_changes_move_between_counters(self):
+        refresh_stats(self.tenant.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_user.role = User.Role.CASHIER
+            self.client_user.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            cashier = User.objects.get(id=self.cashier.id)
+            cashier.role = User.Role.CLIENT
+            cashier.save()
+            cashier.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.only("id").get(id=self.client_user.id).save()
+        stats = TenantStats.objects.get(tenant=self.tenant)
+        self.assertEqual((stats.clients, stats.staff), (1, 1))
+        self.assertEqual(refresh_stats(self.tenant.id)[1], {})
+
+    def test_scheduler_repairs_drift(self):
+        TenantStats.objects.filter(tenant=self.tenant).update(clients=7)
+        scheduler = Scheduler({"repair_stats": PERIODIC["repair_stats"]})
+        with self.assertLogs("loyalty.stats", "WARNING"):
+            self.assertEqual(scheduler.run_due(now=0), ["repair_stats"])
+        self.assertEqual(TenantStats.objects.get(tenant=self.tenant).clients, 1)
+
+    def test_repair_command_fixes_drift(self):
+        self.points("earn", "1000")
+        TenantStats.objects.filter(tenant=self.tenant).update(operations=42, points_issued=0)
+        out = StringIO()
+        call_command("repair_tenant_stats", stdout=out)
+        self.assertIn("operations 42 -> 1", out.getvalue())
+        stats = TenantStats.objects.get(tenant=self.tenant)
+        self.assertEqual((stats.operations, stats.points_issued, stats.clients), (1, 100, 1))
+
+
+class RollupTests(PointsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.silence_audit()
+        self.admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+
+    def timeseries(self, **params):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        return api.get(f"/api/v1/t/{self.tenant.slug}/admin/analytics/timeseries", params)
+
+    def test_write_paths_feed_timeseries(self):
+        calls = [("earn", "1000", {"location_id": self.location.id}), ("earn", "500", {}), ("redeem", "500", {})]
+        for action, amount, extra in calls:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.points(action, amount, **extra)
+        today = timezone.localdate().isoformat()
+        series = self.timeseries(split="type").json()["series"]
+        self.assertEqual(
+            series,
+            [
+                {"date": today, "type": "EARN", "operations": 2, "failed": 0, "amount": "1500.00", "points": 150},
+                {"date": today, "type": "REDEEM", "operations": 0, "failed": 1, "amount": "0.00", "points": 0},
+            ],
+        )
+        by_location = self.timeseries(location_id=self.location.id, interval="month").json()["series"]
+        self.assertEqual([(row["operations"], row["points"]) for row in by_location], [(1, 100)])
+        self.assertEqual(self.timeseries(interval="year").json()["detail"], "INVALID_INTERVAL")
+
+    def test_backfill_matches_incremental_rollups(self):
+        for amount in ("1000", "200"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.points("earn", amount)
+        LoyaltyOperation.objects.update(created_at=F("created_at") - timedelta(days=1))
+        DailyRollup.objects.update(day=F("day") - timedelta(days=1))
+        fields = ("day", "location_id", "type", "source", "operations", "failed", "amount", "points")
+        incremental = list(DailyRollup.objects.order_by("type", "source").values_list(*fields))
+        DailyRollup.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.points("earn", "300")
+        today = list(DailyRollup.objects.values_list(*fields))
+        out = StringIO()
+        call_command("backfill_rollups", stdout=out)
+        self.assertIn("org1: 1 rollup rows", out.getvalue())
+        rows = list(DailyRollup.objects.order_by("day", "type", "source").values_list(*fields))
+        self.assertEqual(rows, incremental + today)
+
+
+class OperationExportTests(PointsTestCase):
+    def export(self, **params):
+        admin = User.objects.create_user(
+            email=f"admin-{uuid4().hex[:6]}@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+        api = APIClient()
+        api.force_authenticate(admin)
+        return api.get(f"/api/v1/t/{self.tenant.slug}/admin/operations/export", params)
+
+    def test_streams_csv_and_ndjson(self):
+        self.points("earn", "1000", receipt_id="r-1", location_id=self.location.id)
+        self.points("earn", "500", receipt_id="r-2")
+        self.points("redeem", "30")
+        res = self.export()
+        self.assertTrue(res.streaming)
+        self.assertIn("attachment;", res["Content-Disposition"])
+        rows = list(csv.DictReader(StringIO(b"".join(res.streaming_content).decode())))
+        self.assertEqual([row["receipt_id"] for row in rows], ["r-1", "r-2", ""])
+        self.assertEqual((rows[0]["amount"], rows[0]["points"]), ("1000.00", "100"))
+
+        res = self.export(output="ndjson", type="EARN", location_id=self.location.id)
+        records = [json.loads(line) for line in b"".join(res.streaming_content).decode().splitlines()]
+        self.assertEqual([(record["receipt_id"], record["points"]) for record in records], [("r-1", 100)])
+
+    def test_date_filters_use_local_days(self):
+        self.points("earn", "1000", receipt_id="r-1")
+        LoyaltyOperation.objects.update(created_at=datetime(2026, 3, 1, 22, 30, tzinfo=dt_timezone.utc))
+        for day, receipts in (("2026-03-01", []), ("2026-03-02", ["r-1"])):
+            res = self.export(**{"from": day, "to": day})
+            rows = list(csv.DictReader(StringIO(b"".join(res.streaming_content).decode())))
+            self.assertEqual([row["receipt_id"] for row in rows], receipts)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.export(output="xlsx").json()["detail"], "INVALID_FORMAT")
+        self.assertEqual(self.export(**{"from": "yesterday"}).json()["detail"], "INVALID_DATE")
+        self.assertEqual(self.export(location_id="x").json()["detail"], "LOCATION_NOT_FOUND")
+
+
+class RollingQRTests(PointsTestCase):
+    def rolling_qr(self, offset: int = 0) -> str:
+        return build_payload(self.card, step_at(timezone.now()) + offset)
+
+    def earn(self, token: str, amount: str = "1000"):
+        payload = {"qr_payload": token, "amount": amount, "idempotency_key": uuid4().hex}
+        return self.api.post(f"/api/v1/t/{self.tenant.slug}/loyalty/points/earn", payload, format="json")
+
+    def test_secret_matches_server_payload(self):
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        data = client.get(f"/api/v1/t/{self.tenant.slug}/client/qr/secret").json()
+        self.assertEqual((data["card_id"], data["prefix"]), (self.card.id, "r1"))
+        res = self.api.post(
+            f"/api/v1/t/{self.tenant.slug}/loyalty/qr/validate", {"qr_payload": self.rolling_qr()}, format="json"
+        )
+        self.assertEqual(res.json()["card_id"], self.card.id)
+        self.assertEqual(OneTimeQR.objects.count(), 0)
+
+    def test_rolling_qr_earns_once(self):
+        token = self.rolling_qr()
+        self.assertEqual(self.earn(token).json()["current_points"], 100)
+        self.assertEqual(self.earn(token).json()["detail"], "QR_USED")
+        self.assertEqual(self.earn(self.rolling_qr(-1)).json()["detail"], "QR_USED")
+        self.assertEqual(self.earn(self.rolling_qr(1)).status_code, 200)
+
+    def test_rejects_stale_forged_and_revoked_codes(self):
+        self.assertEqual(self.earn(self.rolling_qr(-2)).json()["detail"], "QR_EXPIRED")
+        self.assertEqual(self.earn(self.rolling_qr(5)).json()["detail"], "QR_NOT_FOUND")
+        forged = self.rolling_qr()
+        forged = forged[:-1] + ("1" if forged.endswith("0") else "0")
+        self.assertEqual(self.earn(forged).json()["detail"], "QR_NOT_FOUND")
+        token = self.rolling_qr()
+        LoyaltyCard.objects.filter(id=self.card.id).update(qr_key_version=2)
+        self.assertEqual(self.earn(token).json()["detail"], "QR_NOT_FOUND")
+
+    def test_insufficient_points_releases_step(self):
+        token = self.rolling_qr()
+        payload = {"qr_payload": token, "amount": "50", "idempotency_key": uuid4().hex}
+        res = self.api.post(f"/api/v1/t/{self.tenant.slug}/loyalty/points/redeem", payload, format="json")
+        self.assertEqual(res.json()["detail"], "INSUFFICIENT_POINTS")
+        self.assertEqual(self.earn(token).status_code, 200)
+
+
+class OperationPaginationTests(PointsTestCase):
+    def test_cursor_walks_all_operations_once(self):
+        for amount in ("100", "200", "300", "400", "500"):
+            self.points("earn", amount)
+        LoyaltyOperation.objects.filter(amount__in=[Decimal("200"), Decimal("300")]).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+        url = f"/api/v1/t/{self.tenant.slug}/loyalty/ops"
+        seen = []
+        cursor = None
+        for _ in range(5):
+            res = self.api.get(url, {"limit": 2, **({"cursor": cursor} if cursor else {})})
+            seen.extend(item["id"] for item in res.json())
+            cursor = res.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        expected = list(LoyaltyOperation.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        res = self.api.get(f"/api/v1/t/{self.tenant.slug}/loyalty/ops", {"cursor": "???"})
+        self.assertEqual(res.json()["detail"], "INVALID_CURSOR")
+
+
+class ReceiptSearchTests(PointsTestCase):
+    def setUp(self):
+        super().setUp()
+        for receipt_id in ("A-1001", "A-1002", "B-1001"):
+            self.points("earn", "100", receipt_id=receipt_id)
+
+    def search(self, query, match=None):
+        params = {"receipt_id": query, **({"receipt_match": match} if match else {})}
+        res = self.api.get(f"/api/v1/t/{self.tenant.slug}/loyalty/ops", params)
+        return res.status_code, sorted(item["receipt_id"] for item in res.json()) if res.status_code == 200 else res.json()
+
+    def test_match_modes(self):
+        self.assertEqual(self.search("a-100"), (200, ["A-1001", "A-1002"]))
+        self.assertEqual(self.search("A-1001", "exact"), (200, ["A-1001"]))
+        self.assertEqual(self.search("1001", "contains"), (200, ["A-1001", "B-1001"]))
+        self.assertEqual(self.search("b-1", "contains"), (200, ["B-1001"]))
+
+    def test_short_contains_query_is_rejected(self):
+        self.assertEqual(self.search("B", "contains"), (400, {"detail": "RECEIPT_QUERY_TOO_SHORT"}))
+        self.assertEqual(self.search("b"), (200, ["B-1001"]))
+
+    def test_rejects_unknown_mode(self):
+        self.assertEqual(self.search("A", "regex"), (400, {"detail": "INVALID_RECEIPT_MATCH"}))
+
+
+class POSBatchTests(PointsTestCase):
+    def batch(self, receipts, key="pos-key"):
+        return self.client.post(
+            f"/api/v1/t/{self.tenant.slug}/pos/loyalty/earn/batch",
+            {"location_id": self.location.id, "receipts": receipts},
+            content_type="application/json",
+            HTTP_X_POS_API_KEY=key,
+        )
+
+    def test_batch_returns_per_receipt_results(self):
+        receipts = [
+            {"qr_payload": self.issue_qr(), "amount": "1000", "receipt_id": "r-1"},
+            {"qr_payload": "missing", "amount": "1000", "receipt_id": "r-2"},
+            {"qr_payload": self.issue_qr(), "amount": "500", "receipt_id": "r-3"},
+        ]
+        res = self.batch(receipts)
+        self.assertEqual(res.status_code, 200)
+        results = res.json()["results"]
+        self.assertEqual([item["status"] for item in results], [200, 400, 200])
+        self.assertEqual(results[1]["detail"], "QR_NOT_FOUND")
+        self.assertEqual(results[2]["current_points"], 150)
+        self.assertEqual(LoyaltyOperation.objects.filter(source=LoyaltyOperation.Source.POS).count(), 2)
+
+    def test_batch_accepts_rolling_qr(self):
+        token = build_payload(self.card, step_at(timezone.now()))
+        res = self.batch(
+            [
+                {"qr_payload": token, "amount": "1000", "receipt_id": "r-1"},
+                {"qr_payload": self.issue_qr(), "amount": "500", "receipt_id": "r-2"},
+                {"qr_payload": token, "amount": "1000", "receipt_id": "r-3"},
+            ]
+        )
+        results = res.json()["results"]
+        self.assertEqual([item["status"] for item in results], [200, 200, 400])
+        self.assertEqual(results[2]["detail"], "QR_USED")
+
+    def test_batch_is_idempotent_per_receipt(self):
+        token = self.issue_qr()
+        first = self.batch([{"qr_payload": token, "amount": "1000", "receipt_id": "r-1"}])
+        again = self.batch(
+            [
+                {"qr_payload": token, "amount": "1000", "receipt_id": "r-1"},
+                {"qr_payload": token, "amount": "1000", "receipt_id": "r-1"},
+            ]
+        )
+        self.assertEqual(first.json()["results"][0]["points"], 100)
+        self.assertEqual([item["status"] for item in again.json()["results"]], [200, 200])
+        self.assertEqual(LoyaltyOperation.objects.filter(receipt_id="r-1").count(), 1)
+
+    def test_batch_query_count_is_bounded_per_receipt_and_chunk(self):
+        self.batch([{"qr_payload": self.issue_qr(), "amount": "1000", "receipt_id": "warm"}])
+        per_request, per_chunk, per_receipt = 3, 6, 5
+        sent = 0
+        for size in (1, 2, 5):
+            receipts = [
+                {"qr_payload": self.issue_qr(), "amount": "1000", "receipt_id": f"r-{sent + index}"}
+                for index in range(size)
+            ]
+            sent += size
+            chunks = -(-size // 2)
+            with self.settings(POS_BATCH_CHUNK_SIZE=2):
+                with self.assertNumQueries(per_request + per_chunk * chunks + per_receipt * size):
+                    res = self.batch(receipts)
+            self.assertEqual([item["status"] for item in res.json()["results"]], [200] * size)
+
+    def test_batch_needs_fewer_queries_than_single_requests(self):
+        self.batch([{"qr_payload": self.issue_qr(), "amount": "1000", "receipt_id": "warm"}])
+        size = 20
+        singles = [(self.issue_qr(), f"s-{index}") for index in range(size)]
+        receipts = [
+            {"qr_payload": self.issue_qr(), "amount": "10", "receipt_id": f"b-{index}"} for index in range(size)
+        ]
+        with CaptureQueriesContext(connection) as single:
+            for token, receipt_id in singles:
+                res = self.client.post(
+                    f"/api/v1/t/{self.tenant.slug}/pos/loyalty/earn",
+                    {"qr_payload": token, "amount": "10", "receipt_id": receipt_id, "location_id": self.location.id},
+                    content_type="application/json",
+                    HTTP_X_POS_API_KEY="pos-key",
+                )
+                self.assertEqual(res.status_code, 200)
+        with CaptureQueriesContext(connection) as batched:
+            res = self.batch(receipts)
+        self.assertEqual([item["status"] for item in res.json()["results"]], [200] * size)
+        self.assertLess(len(batched) * 2, len(single))
+
+    def test_batch_falls_back_to_single_receipts_when_bulk_insert_fails(self):
+        receipts = [
+            {"qr_payload": self.issue_qr(), "amount": "1000", "receipt_id": "r-1"},
+            {"qr_payload": self.issue_qr(), "amount": "500", "receipt_id": "r-2"},
+        ]
+        with mock.patch("loyalty.views.store_responses", side_effect=DuplicateResponse("taken")):
+            with self.assertLogs("loyalty.views", "WARNING"):
+                res = self.batch(receipts)
+        self.assertEqual([item["status"] for item in res.json()["results"]], [200, 200])
+        self.assertEqual(res.json()["results"][1]["current_points"], 150)
+        self.assertEqual(PointsLot.objects.count(), 2)
+        self.assertEqual(IdempotencyRecord.objects.filter(key__startswith="pos:").count(), 2)
+
+    def test_batch_isolates_receipt_database_errors(self):
+        receipts = [
+            {"qr_payload": self.issue_qr(), "amount": "1000", "receipt_id": "r-1"},
+            {"qr_payload": self.issue_qr(), "amount": "500", "receipt_id": "r-2"},
+        ]
+        with mock.patch("loyalty.views.apply_balance_delta", side_effect=[DatabaseError("boom"), 50]):
+            with self.assertLogs("loyalty.views", "ERROR"):
+                res = self.batch(receipts)
+        self.assertEqual([item["status"] for item in res.json()["results"]], [500, 200])
+        self.assertEqual(list(LoyaltyOperation.objects.values_list("receipt_id", flat=True)), ["r-2"])
+        self.assertFalse(OneTimeQR.objects.filter(token=receipts[0]["qr_payload"], used_at__isnull=False).exists())
+
+    def test_batch_rejects_invalid_key(self):
+        res = self.batch([{"qr_payload": self.issue_qr(), "amount": "10", "receipt_id": "r-1"}], key="wrong")
+        self.assertEqual(res.status_code, 401)
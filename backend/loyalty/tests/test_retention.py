@@ -0,0 +1,46 @@
+from datetime import timedelta
+from io import StringIO
+from uuid import uuid4
+
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from loyalty.models import AuditLog, OneTimeQR
+from loyalty.retention import POLICIES, purge
+from loyalty.tests.test_points import PointsTestCase
+
+
+class PurgeExpiredTests(PointsTestCase):
+    def add_qr(self, expires_at):
+        return OneTimeQR.objects.create(card=self.card, tenant=self.tenant, token=uuid4().hex, expires_at=expires_at)
+
+    def test_purges_in_batches_and_keeps_live_rows(self):
+        now = timezone.now()
+        for _ in range(5):
+            self.add_qr(now - timedelta(days=3))
+        live = self.add_qr(now + timedelta(seconds=10))
+        qr_policy = next(policy for policy in POLICIES if policy.name == "qr")
+        self.assertEqual(purge(qr_policy, now, batch_size=2, dry_run=True), 5)
+        self.assertEqual(purge(qr_policy, now, batch_size=2), 5)
+        self.assertEqual(list(OneTimeQR.objects.values_list("id", flat=True)), [live.id])
+
+    def test_command_reports_rows_per_table(self):
+        now = timezone.now()
+        self.add_qr(now - timedelta(days=3))
+        AuditLog.objects.create(tenant=self.tenant, action="login", created_at=now - timedelta(days=400))
+        AuditLog.objects.create(tenant=self.tenant, action="login")
+        token = OutstandingToken.objects.create(
+            user=self.client_user, jti=uuid4().hex, token="t", expires_at=now - timedelta(days=1)
+        )
+        BlacklistedToken.objects.create(token=token)
+        out = StringIO()
+        with self.settings(AUDIT_RETENTION_DAYS=365, QR_RETENTION_DAYS=-1):
+            call_command("purge_expired", stdout=out)
+        output = out.getvalue()
+        self.assertIn("loyalty_onetimeqr: removed 0 rows", output)
+        self.assertIn("loyalty_auditlog: removed 1 rows", output)
+        self.assertIn("token_blacklist_blacklistedtoken: removed 1 rows", output)
+        self.assertIn("token_blacklist_outstandingtoken: removed 1 rows", output)
+        self.assertEqual(OneTimeQR.objects.count(), 1)
+        self.assertEqual(AuditLog.objects.count(), 1)
@@ -0,0 +1,219 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from loyalty.caching import VersionedLocalCache, clear_local_caches
+from loyalty.jobs import claim_next, enqueue, execute, reclaim_stale
+from loyalty.models import Job, Location, LoyaltyCard, LoyaltyOperation, LoyaltyRule, RuleTarget, Tenant, User
+from loyalty.rules import build_rule_table, get_rule, get_rule_table, invalidate_rules
+from loyalty.tiers import retier_tenant
+
+
+class RuleTableTests(TestCase):
+    def setUp(self):
+        clear_local_caches()
+        self.tenant = Tenant.objects.create(slug="org1", name="Org 1")
+        self.location = Location.objects.create(tenant=self.tenant, name="Main")
+        self.client_user = User.objects.create_user(email="client@org1.local", password="x", tenant=self.tenant)
+        self.admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+        invalidate_rules(self.tenant.id)
+
+    def test_resolution_order(self):
+        default = LoyaltyRule.objects.create(tenant=self.tenant, earn_percent=Decimal("3"))
+        by_location = LoyaltyRule.objects.create(tenant=self.tenant, location=self.location, earn_percent=Decimal("5"))
+        targeted = LoyaltyRule.objects.create(tenant=self.tenant, earn_percent=Decimal("7"), applies_to_all=False)
+        RuleTarget.objects.create(rule=targeted, user=self.client_user, tenant=self.tenant)
+        other = User.objects.create_user(email="other@org1.local", password="x", tenant=self.tenant)
+
+        self.assertEqual(get_rule(self.tenant, self.location, self.client_user).id, targeted.id)
+        self.assertEqual(get_rule(self.tenant, self.location, other).id, by_location.id)
+        self.assertEqual(get_rule(self.tenant, None, other).id, default.id)
+
+    def test_cached_lookup_is_query_free(self):
+        LoyaltyRule.objects.create(tenant=self.tenant)
+        get_rule_table(self.tenant.id)
+        with self.assertNumQueries(0):
+            get_rule(self.tenant, self.location, self.client_user)
+
+    def test_admin_rules_list_query_count_is_constant(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        url = f"/api/v1/t/{self.tenant.slug}/admin/rules"
+        for percent in ("3", "4", "5"):
+            rule = LoyaltyRule.objects.create(tenant=self.tenant, earn_percent=Decimal(percent), applies_to_all=False)
+            RuleTarget.objects.create(rule=rule, user=self.client_user, tenant=self.tenant)
+            api.get(url)
+            with self.assertNumQueries(2):
+                rules = api.get(url).json()
+        self.assertEqual([rule["target_ids"] for rule in rules], [[self.client_user.id]] * 3)
+
+    def test_missing_default_is_not_persisted(self):
+        rule = get_rule(self.tenant, None, None)
+        self.assertIsNone(rule.id)
+        self.assertEqual(rule.earn_percent, Decimal("3.0"))
+        self.assertFalse(LoyaltyRule.objects.exists())
+
+    def test_admin_changes_rebuild_table(self):
+        LoyaltyRule.objects.create(tenant=self.tenant, earn_percent=Decimal("3"))
+        get_rule_table(self.tenant.id)
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        res = api.post(
+            f"/api/v1/t/{self.tenant.slug}/admin/rules",
+            {"earn_percent": "4.00", "client_ids": [self.client_user.id]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 200)
+        rule = get_rule(self.tenant, None, self.client_user)
+        self.assertEqual(rule.id, res.json()["id"])
+
+        res = api.delete(f"/api/v1/t/{self.tenant.slug}/admin/rules/{rule.id}")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(get_rule(self.tenant, None, self.client_user).earn_percent, Decimal("3"))
+
+    @override_settings(CACHE_VERSION_CHECK_SECONDS=0)
+    def test_rule_changes_reach_other_workers(self):
+        default = LoyaltyRule.objects.create(tenant=self.tenant, earn_percent=Decimal("3"))
+        worker = VersionedLocalCache("rules", 300)
+        self.addCleanup(VersionedLocalCache.instances.remove, worker)
+
+        def earn_percent():
+            table = worker.get(self.tenant.id, lambda: build_rule_table(self.tenant.id), scope=self.tenant.id)
+            return table.resolve(None, self.client_user.id).earn_percent
+
+        self.assertEqual(earn_percent(), Decimal("3"))
+        patcher = mock.patch("loyalty.audit.audit_buffer.add")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            api.post(f"/api/v1/t/{self.tenant.slug}/admin/rules", {"earn_percent": "6.00"}, format="json")
+        self.assertEqual(earn_percent(), Decimal("6.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            api.delete(f"/api/v1/t/{self.tenant.slug}/admin/rules/{default.id}")
+        self.assertEqual(earn_percent(), Decimal("3.0"))
+
+    def test_retarget_clients_with_set_statements(self):
+        other = User.objects.create_user(email="other@org1.local", password="x", tenant=self.tenant)
+        emptied = LoyaltyRule.objects.create(tenant=self.tenant, earn_percent=Decimal("5"), applies_to_all=False)
+        RuleTarget.objects.create(rule=emptied, user=self.client_user, tenant=self.tenant)
+        kept = LoyaltyRule.objects.create(tenant=self.tenant, earn_percent=Decimal("6"), applies_to_all=False)
+        RuleTarget.objects.create(rule=kept, user=other, tenant=self.tenant)
+        RuleTarget.objects.create(rule=kept, user=self.admin, tenant=self.tenant)
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        url = f"/api/v1/t/{self.tenant.slug}/admin/rules"
+        res = api.post(url, {"earn_percent": "8.00", "client_ids": [self.client_user.id, other.id]}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(LoyaltyRule.objects.filter(id=emptied.id).exists())
+        self.assertEqual(list(RuleTarget.objects.filter(rule=kept).values_list("user_id", flat=True)), [self.admin.id])
+        self.assertEqual(sorted(res.json()["target_ids"]), sorted([self.client_user.id, other.id]))
+
+        many = [
+            User.objects.create_user(email=f"c{index}@org1.local", password="x", tenant=self.tenant).id
+            for index in range(53)
+        ]
+        with self.settings(CACHE_VERSION_CHECK_SECONDS=0):
+            with self.assertNumQueries(9):
+                api.post(url, {"earn_percent": "9.00", "client_ids": many[:1]}, format="json")
+            with self.assertNumQueries(9):
+                api.post(url, {"earn_percent": "10.00", "client_ids": many[1:]}, format="json")
+            with self.assertNumQueries(10):
+                api.post(url, {"earn_percent": "9.00", "client_ids": many[1:2]}, format="json")
+            with self.assertNumQueries(10):
+                api.post(url, {"earn_percent": "9.00", "client_ids": many[2:52]}, format="json")
+        self.assertEqual(RuleTarget.objects.filter(user_id__in=many).count(), 53)
+        self.assertEqual(LoyaltyRule.objects.filter(earn_percent=Decimal("9.00")).count(), 3)
+        remaining = LoyaltyRule.objects.get(earn_percent=Decimal("10.00"))
+        self.assertEqual(list(remaining.targets.values_list("user_id", flat=True)), [many[52]])
+
+
+class RetierTests(TestCase):
+    def setUp(self):
+        clear_local_caches()
+        self.tenant = Tenant.objects.create(slug="org1", name="Org 1")
+        self.location = Location.objects.create(tenant=self.tenant, name="Main")
+        self.admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+        self.default = LoyaltyRule.objects.create(tenant=self.tenant, silver_threshold=500, gold_threshold=1500)
+        invalidate_rules(self.tenant.id)
+
+    def card(self, email: str, points: int, tier: str = "Bronze") -> LoyaltyCard:
+        user = User.objects.create_user(email=email, password="x", tenant=self.tenant)
+        return LoyaltyCard.objects.create(user=user, tenant=self.tenant, current_points=points, tier=tier)
+
+    def test_scopes_use_their_own_thresholds(self):
+        plain = self.card("plain@org1.local", 600)
+        local = self.card("local@org1.local", 600)
+        targeted = self.card("vip@org1.local", 600)
+        LoyaltyOperation.objects.create(
+            tenant=self.tenant, card=local, type="EARN", source="POS", amount=100, points=10, location=self.location
+        )
+        LoyaltyRule.objects.create(tenant=self.tenant, location=self.location, silver_threshold=700, gold_threshold=900)
+        vip_rule = LoyaltyRule.objects.create(
+            tenant=self.tenant, applies_to_all=False, silver_threshold=100, gold_threshold=200
+        )
+        RuleTarget.objects.create(rule=vip_rule, user=targeted.user, tenant=self.tenant)
+        progress = []
+
+        changed = retier_tenant(self.tenant, chunk_size=2, progress=lambda done, total: progress.append((done, total)))
+
+        tiers = dict(LoyaltyCard.objects.values_list("id", "tier"))
+        self.assertEqual((tiers[plain.id], tiers[local.id], tiers[targeted.id]), ("Silver", "Bronze", "Gold"))
+        self.assertEqual(changed, 2)
+        self.assertEqual(progress, [(2, 3), (3, 3)])
+
+    def test_threshold_change_queues_job(self):
+        card = self.card("client@org1.local", 400)
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        res = api.post(
+            f"/api/v1/t/{self.tenant.slug}/admin/rules",
+            {"earn_percent": "3.00", "silver_threshold": 300, "gold_threshold": 1000},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 200)
+        job = Job.objects.get(tenant=self.tenant, kind=Job.Kind.RETIER)
+        self.assertEqual(job.status, Job.Status.PENDING)
+
+        call_command("run_jobs", "--once", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.total, job.result), (Job.Status.DONE, 1, 1, {"changed": 1}))
+        card.refresh_from_db()
+        self.assertEqual(card.tier, "Silver")
+
+    def test_stale_running_job_is_requeued_then_failed(self):
+        job = enqueue(self.tenant.id, Job.Kind.RETIER)
+        stale_at = timezone.now() - timedelta(hours=1)
+        with self.settings(JOBS_MAX_ATTEMPTS=2, JOBS_STALE_SECONDS=600):
+            self.assertEqual(claim_next().id, job.id)
+            self.assertEqual(reclaim_stale(), 0)
+            Job.objects.filter(id=job.id).update(heartbeat_at=stale_at)
+            self.assertEqual(reclaim_stale(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.Status.PENDING, 1))
+
+            claim_next()
+            Job.objects.filter(id=job.id).update(heartbeat_at=stale_at)
+            self.assertEqual(reclaim_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.Status.FAILED, 2, "STALE_WORKER"))
+
+    def test_reclaimed_job_is_not_finished_by_its_old_worker(self):
+        enqueue(self.tenant.id, Job.Kind.RETIER)
+        job = claim_next()
+        Job.objects.filter(id=job.id).update(attempts=2)
+        with self.settings(JOBS_EAGER=True), self.assertLogs("loyalty.jobs", "WARNING"):
+            execute(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.finished_at), (Job.Status.RUNNING, 2, None))
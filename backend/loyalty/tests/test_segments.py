@@ -0,0 +1,128 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from loyalty.models import Job, LoyaltyCard, LoyaltyRule, Offer, Segment, SegmentDelta, User
+from loyalty.rules import get_rule_table
+from loyalty.segments import (
+    get_segment_index,
+    has_member,
+    pack_members,
+    refresh_segment,
+    schedule_refresh,
+    segment_cache,
+)
+from loyalty.tests.test_points import PointsTestCase
+from loyalty.tiers import retier_tenant
+
+
+class BitmapTests(SimpleTestCase):
+    def test_pack_members(self):
+        base, members = pack_members(np.array([21, 9, 40], dtype=np.int64))
+        self.assertEqual((base, len(members)), (8, 5))
+        self.assertEqual([user_id for user_id in range(50) if has_member(base, members, user_id)], [9, 21, 40])
+        self.assertEqual(pack_members(np.array([], dtype=np.int64)), (0, b""))
+
+
+class SegmentTests(PointsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.silent = User.objects.create_user(email="silent@org1.local", password="x", tenant=self.tenant)
+        LoyaltyCard.objects.create(user=self.silent, tenant=self.tenant, tier="Silver", current_points=600)
+        self.segment = Segment.objects.create(
+            tenant=self.tenant, name="Silver regulars", tier="Silver", active_days=30, location=self.location
+        )
+
+    def test_refresh_applies_predicates(self):
+        self.points("earn", "1000", location_id=self.location.id)
+        self.assertEqual(refresh_segment(self.segment), 0)
+        LoyaltyCard.objects.filter(id=self.card.id).update(tier="Silver")
+        self.assertEqual(refresh_segment(self.segment), 1)
+        segments = get_segment_index(self.tenant.id)
+        self.assertTrue(segments.contains(self.segment.id, self.client_user.id))
+        self.assertFalse(segments.contains(self.segment.id, self.silent.id))
+
+    def test_operations_update_membership_and_targeting(self):
+        LoyaltyRule.objects.create(
+            tenant=self.tenant, earn_percent=Decimal("20"), applies_to_all=False, segment=self.segment
+        )
+        Offer.objects.create(
+            tenant=self.tenant,
+            title="Regulars",
+            type=Offer.Type.BONUS,
+            bonus_points=7,
+            applies_to_all=False,
+            segment=self.segment,
+        )
+        refresh_segment(self.segment)
+        self.silence_audit()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.points("earn", "5000", location_id=self.location.id).json()["points"], 500)
+        self.segment.refresh_from_db()
+        self.assertEqual((self.segment.size, bytes(self.segment.members)), (0, b""))
+        self.assertEqual(get_segment_index(self.tenant.id).size(self.segment.id), 1)
+        self.assertTrue(SegmentDelta.objects.filter(segment=self.segment, user_id=self.client_user.id, present=True))
+        self.assertEqual(get_rule_table(self.tenant.id).resolve(None, self.client_user.id).earn_percent, 20)
+        self.assertEqual(self.points("earn", "100", location_id=self.location.id).json()["points"], 27)
+
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        offers = client.get(f"/api/v1/t/{self.tenant.slug}/client/offers").json()
+        self.assertEqual([offer["title"] for offer in offers], ["Regulars"])
+
+        LoyaltyCard.objects.filter(id=self.card.id).update(current_points=0, tier="Silver")
+        self.assertEqual(retier_tenant(self.tenant), 1)
+        self.assertEqual(LoyaltyCard.objects.get(id=self.card.id).tier, "Bronze")
+
+    def test_membership_change_reads_one_client_without_invalidating(self):
+        refresh_segment(self.segment)
+        self.silence_audit()
+        with mock.patch.object(segment_cache, "invalidate") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.points("earn", "5000", location_id=self.location.id)
+        invalidate.assert_not_called()
+        segments = get_segment_index(self.tenant.id)
+        with self.assertNumQueries(1):
+            self.assertTrue(segments.contains(self.segment.id, self.client_user.id))
+            self.assertTrue(segments.contains(self.segment.id, self.client_user.id))
+            segments.load_users([self.client_user.id])
+
+    def test_admin_creates_segment_and_targets_offer(self):
+        admin = User.objects.create_user(
+            email="admin@org1.local", password="x", tenant=self.tenant, role=User.Role.ADMIN
+        )
+        api = APIClient()
+        api.force_authenticate(admin)
+        with self.settings(JOBS_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+            res = api.post(f"/api/v1/t/{self.tenant.slug}/admin/segments", {"name": "Silver", "tier": "Silver"})
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(Job.objects.get(kind=Job.Kind.REFRESH_SEGMENTS).status, Job.Status.DONE)
+        self.assertEqual(api.get(f"/api/v1/t/{self.tenant.slug}/admin/segments").json()[0]["size"], 1)
+        res = api.post(
+            f"/api/v1/t/{self.tenant.slug}/admin/offers",
+            {"title": "Silver bonus", "type": "BONUS", "bonus_points": 5, "segment": res.json()["id"]},
+            format="json",
+        )
+        self.assertEqual((res.json()["applies_to_all"], res.json()["target_ids"]), (False, []))
+
+    def test_scheduled_refresh_merges_deltas(self):
+        self.points("earn", "1000", location_id=self.location.id)
+        LoyaltyCard.objects.filter(id=self.card.id).update(tier="Silver")
+        refresh_segment(self.segment)
+        SegmentDelta.objects.create(
+            tenant=self.tenant,
+            segment=self.segment,
+            user_id=self.client_user.id,
+            present=False,
+            updated_at=timezone.now() - timedelta(minutes=1),
+        )
+        self.assertFalse(get_segment_index(self.tenant.id).contains(self.segment.id, self.client_user.id))
+        with self.settings(JOBS_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(schedule_refresh(), 1)
+        self.assertFalse(SegmentDelta.objects.exists())
+        self.assertTrue(get_segment_index(self.tenant.id).contains(self.segment.id, self.client_user.id))
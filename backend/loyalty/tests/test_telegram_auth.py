@@ -4,6 +4,7 @@ from unittest.mock import patch
 from django.test import TestCase
 from django.utils import timezone
 
+from loyalty.caching import clear_local_caches
 from loyalty.models import OneTimeCode, Tenant, User
 from loyalty.telegram_auth import (
     build_telegram_start_payload,
@@ -17,6 +18,7 @@ from loyalty.telegram_auth import (
 
 class TelegramAuthTests(TestCase):
     def setUp(self):
+        clear_local_caches()
         self.tenant = Tenant.objects.create(slug="org1", name="Org 1")
 
     @patch("loyalty.views.send_telegram_message")
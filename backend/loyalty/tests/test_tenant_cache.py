@@ -0,0 +1,51 @@
+from django.test import TestCase
+
+from loyalty.caching import VersionedLocalCache, bump_version, clear_local_caches, get_tenant_by_slug, tenant_cache
+from loyalty.models import Tenant
+
+
+class TenantCacheTests(TestCase):
+    def setUp(self):
+        clear_local_caches()
+        self.tenant = Tenant.objects.create(slug="org1", name="Org 1")
+
+    def test_second_lookup_hits_cache(self):
+        get_tenant_by_slug("org1")
+        hits = tenant_cache.stats()["hits"]
+        with self.assertNumQueries(0):
+            tenant = get_tenant_by_slug("org1")
+        self.assertEqual(tenant.id, self.tenant.id)
+        self.assertEqual(tenant_cache.stats()["hits"], hits + 1)
+
+    def test_rename_invalidates(self):
+        self.assertIsNotNone(get_tenant_by_slug("org1"))
+        self.tenant.slug = "org1-renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.save()
+        self.assertIsNone(get_tenant_by_slug("org1"))
+        self.assertEqual(get_tenant_by_slug("org1-renamed").id, self.tenant.id)
+
+    def test_version_bump_from_other_worker(self):
+        get_tenant_by_slug("org1")
+        Tenant.objects.filter(id=self.tenant.id).update(name="Renamed")
+        self.assertEqual(get_tenant_by_slug("org1").name, "Org 1")
+        bump_version(tenant_cache.version_key())
+        self.assertEqual(get_tenant_by_slug("org1").name, "Org 1")
+        with self.settings(CACHE_VERSION_CHECK_SECONDS=0):
+            self.assertEqual(get_tenant_by_slug("org1").name, "Renamed")
+
+    def test_invalidation_reaches_other_workers(self):
+        workers = [VersionedLocalCache("workers", 300), VersionedLocalCache("workers", 300)]
+        for worker in workers:
+            self.addCleanup(VersionedLocalCache.instances.remove, worker)
+        self.assertEqual([worker.get(1, lambda: "old", scope=1) for worker in workers], ["old", "old"])
+        self.assertEqual(workers[1].get(1, lambda: "new", scope=1), "old")
+        with self.captureOnCommitCallbacks(execute=True):
+            workers[0].invalidate(scope=1, keys=[1])
+        self.assertEqual(workers[1].get(1, lambda: "new", scope=1), "old")
+        with self.settings(CACHE_VERSION_CHECK_SECONDS=0):
+            self.assertEqual(workers[1].get(1, lambda: "new", scope=1), "new")
+
+    def test_unknown_slug_returns_404(self):
+        res = self.client.get("/api/v1/t/missing/auth/telegram/config")
+        self.assertEqual(res.status_code, 404)
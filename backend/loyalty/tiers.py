@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import RowNumber
+
+from .jobs import report_progress
+from .ledger import tier_case
+from .models import Job, LoyaltyCard, LoyaltyOperation, LoyaltyRule, Tenant
+from .rules import build_rule_table
+from .segments import get_segment_index
+
+
+def home_location():
+    return Subquery(
+        LoyaltyOperation.objects.filter(card=OuterRef("pk")).order_by("-created_at", "-id").values("location_id")[:1]
+    )
+
+
+def home_locations(ops) -> dict[int, int | None]:
+    latest = Window(RowNumber(), partition_by=[F("card_id")], order_by=[F("created_at").desc(), F("id").desc()])
+    return dict(ops.annotate(rank=latest).filter(rank=1).values_list("card_id", "location_id"))
+
+
+def retier_scope(cards, rule: LoyaltyRule) -> int:
+    expected = tier_case(F("current_points"), rule.gold_threshold, rule.silver_threshold)
+    return cards.alias(expected_tier=expected).exclude(tier=F("expected_tier")).update(tier=expected)
+
+
+def retier_tenant(tenant: Tenant, chunk_size: int = 5000, progress=None) -> int:
+    table = build_rule_table(tenant.id)
+    users_by_rule = {}
+    for user_id, rule in table.by_user.items():
+        users_by_rule.setdefault(rule, []).append(user_id)
+    targeted = list(table.by_user)
+    cards = LoyaltyCard.objects.filter(tenant=tenant)
+    total = cards.count()
+    bounds = cards.order_by("id").values_list("id", flat=True)
+    changed = 0
+    processed = 0
+    last_id = 0
+    while True:
+        upper = bounds.filter(id__gt=last_id)[chunk_size - 1 : chunk_size].first()
+        chunk = cards.filter(id__gt=last_id) if upper is None else cards.filter(id__gt=last_id, id__lte=upper)
+        with transaction.atomic():
+            for rule, user_ids in users_by_rule.items():
+                changed += retier_scope(chunk.filter(user_id__in=user_ids), rule)
+            untargeted = chunk.exclude(user_id__in=targeted)
+            if table.by_segment:
+                segments = get_segment_index(tenant.id)
+                members = list(untargeted.values_list("id", "user_id"))
+                segments.load_users([user_id for _, user_id in members])
+                cards_by_rule = {}
+                for card_id, user_id in members:
+                    rule = table.segment_rule(user_id, segments)
+                    if rule is not None:
+                        cards_by_rule.setdefault(rule, []).append(card_id)
+                segmented = []
+                for rule, card_ids in cards_by_rule.items():
+                    changed += retier_scope(chunk.filter(id__in=card_ids), rule)
+                    segmented.extend(card_ids)
+                untargeted = untargeted.exclude(id__in=segmented)
+            untargeted = untargeted.alias(home=home_location())
+            for location_id, rule in table.by_location.items():
+                changed += retier_scope(untargeted.filter(home=location_id), rule)
+            default_scope = untargeted
+            if table.by_location:
+                default_scope = untargeted.filter(Q(home__isnull=True) | ~Q(home__in=list(table.by_location)))
+            changed += retier_scope(default_scope, table.default or table.fallback)
+        processed = min(processed + chunk_size, total) if upper is not None else total
+        if progress is not None:
+            progress(processed, total)
+        if upper is None:
+            break
+        last_id = upper
+    return changed
+
+
+def retier_job(job: Job) -> dict:
+    changed = retier_tenant(
+        job.tenant,
+        chunk_size=settings.RETIER_CHUNK_SIZE,
+        progress=lambda processed, total: report_progress(job, processed, total),
+    )
+    return {"changed": changed}
@@ -20,6 +20,7 @@ from .views import (
     ClientOfferUseView,
     ClientCouponsView,
     ClientQRIssueView,
+    ClientQRSecretView,
     ClientPasswordChangeView,
     ClientProfileUpdateView,
     LoyaltyQRValidateView,
@@ -27,12 +28,18 @@ from .views import (
     LoyaltyRedeemView,
     LoyaltyRefundView,
     POSLoyaltyEarnView,
+    POSLoyaltyEarnBatchView,
     CashierOperationsView,
     AdminDashboardView,
     AdminCustomersView,
+    AdminCustomersImportView,
+    AdminCouponIssueView,
+    AdminSegmentsView,
     AdminStaffView,
     AdminLocationsView,
     AdminRulesView,
+    AdminAnalyticsTimeseriesView,
+    AdminOperationsExportView,
     AdminOperationsView,
     AdminOffersView,
     AdminSettingsView,
@@ -61,6 +68,7 @@ urlpatterns = [
     path("t/<slug:tenant_slug>/client/offers/use", ClientOfferUseView.as_view()),
     path("t/<slug:tenant_slug>/client/coupons", ClientCouponsView.as_view()),
     path("t/<slug:tenant_slug>/client/qr/issue", ClientQRIssueView.as_view()),
+    path("t/<slug:tenant_slug>/client/qr/secret", ClientQRSecretView.as_view()),
     path("t/<slug:tenant_slug>/client/profile", ClientProfileUpdateView.as_view()),
     path("t/<slug:tenant_slug>/client/profile/password", ClientPasswordChangeView.as_view()),
     path("t/<slug:tenant_slug>/loyalty/qr/validate", LoyaltyQRValidateView.as_view()),
@@ -69,8 +77,11 @@ urlpatterns = [
     path("t/<slug:tenant_slug>/loyalty/points/refund", LoyaltyRefundView.as_view()),
     path("t/<slug:tenant_slug>/loyalty/ops", CashierOperationsView.as_view()),
     path("t/<slug:tenant_slug>/pos/loyalty/earn", POSLoyaltyEarnView.as_view()),
+    path("t/<slug:tenant_slug>/pos/loyalty/earn/batch", POSLoyaltyEarnBatchView.as_view()),
     path("t/<slug:tenant_slug>/admin/dashboard", AdminDashboardView.as_view()),
     path("t/<slug:tenant_slug>/admin/customers", AdminCustomersView.as_view()),
+    path("t/<slug:tenant_slug>/admin/customers/import", AdminCustomersImportView.as_view()),
+    path("t/<slug:tenant_slug>/admin/customers/import/<int:job_id>", AdminCustomersImportView.as_view()),
     path("t/<slug:tenant_slug>/admin/staff", AdminStaffView.as_view()),
     path("t/<slug:tenant_slug>/admin/staff/<int:user_id>", AdminStaffView.as_view()),
     path("t/<slug:tenant_slug>/admin/locations", AdminLocationsView.as_view()),
@@ -78,7 +89,13 @@ urlpatterns = [
     path("t/<slug:tenant_slug>/admin/rules", AdminRulesView.as_view()),
     path("t/<slug:tenant_slug>/admin/rules/<int:rule_id>", AdminRulesView.as_view()),
     path("t/<slug:tenant_slug>/admin/operations", AdminOperationsView.as_view()),
+    path("t/<slug:tenant_slug>/admin/operations/export", AdminOperationsExportView.as_view()),
+    path("t/<slug:tenant_slug>/admin/analytics/timeseries", AdminAnalyticsTimeseriesView.as_view()),
+    path("t/<slug:tenant_slug>/admin/segments", AdminSegmentsView.as_view()),
+    path("t/<slug:tenant_slug>/admin/segments/<int:segment_id>", AdminSegmentsView.as_view()),
     path("t/<slug:tenant_slug>/admin/offers", AdminOffersView.as_view()),
+    path("t/<slug:tenant_slug>/admin/coupons/<int:coupon_id>/issue", AdminCouponIssueView.as_view()),
+    path("t/<slug:tenant_slug>/admin/coupons/<int:coupon_id>/issue/<int:job_id>", AdminCouponIssueView.as_view()),
     path("t/<slug:tenant_slug>/admin/offers/<int:offer_id>", AdminOffersView.as_view()),
     path("t/<slug:tenant_slug>/admin/settings", AdminSettingsView.as_view()),
 ]
@@ -4,13 +4,12 @@ import logging
 import secrets
 from decimal import Decimal
 from uuid import uuid4
-from datetime import timedelta, datetime
+from datetime import date, timedelta, datetime
 from django.conf import settings
 from django.core.cache import cache
 from django.core.mail import send_mail
-from django.shortcuts import get_object_or_404
-from django.db import models, transaction
-from django.db.models import Sum
+from django.http import Http404, StreamingHttpResponse
+from django.db import DatabaseError, IntegrityError, models, transaction
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
@@ -31,11 +30,13 @@ from .models import (
     Offer,
     OfferTarget,
     OfferRedemption,
+    Coupon,
     CouponAssignment,
     LoyaltyOperation,
     EmailVerificationCode,
     OneTimeCode,
-    AuditLog,
+    Job,
+    Segment,
 )
 from .serializers import (
     RegisterSerializer,
@@ -51,6 +52,7 @@ from .serializers import (
     PointsSerializer,
     RefundSerializer,
     POSPointsSerializer,
+    POSBatchEarnSerializer,
     PasswordChangeSerializer,
     UserSerializer,
     OperationSerializer,
@@ -60,8 +62,51 @@ from .serializers import (
     LocationSerializer,
     LoyaltyRuleSerializer,
     OrganizationSettingsSerializer,
+    SegmentSerializer,
     StaffCreateSerializer,
 )
+from .audit import audit_log
+from .caching import get_tenant_by_slug
+from .counters import day_bucket, reserve_daily_earn, staff_ops_last_hour
+from .jobs import enqueue
+from .imports import save_upload
+from .bulk import id_set, insert_select
+from .coupons import coupon_cards
+from .segments import get_segment_index, invalidate_segments
+from .idempotency import (
+    get_response,
+    get_responses,
+    operation_key,
+    pos_receipt_key,
+    store_response,
+    store_responses,
+)
+from .ledger import apply_balance_delta, consume_qr, record_operation, record_operations, release_qr
+from .lots import add_lot, add_lots, consume_lots
+from .pagination import InvalidCursor, id_page, key_page, keyset_page, parse_limit
+from .offers import apply_offers, get_offer_index, invalidate_offers
+from .rolling_qr import (
+    PREFIX as ROLLING_QR_PREFIX,
+    RollingQR,
+    card_secret,
+    consume as consume_rolling_qr,
+    decode as decode_rolling_qr,
+    decode_many as decode_rolling_qrs,
+    is_rolling,
+    release as release_rolling_qr,
+)
+from .rules import get_rule, get_rule_table, invalidate_rules
+from .stats import STAT_FIELDS, get_stats
+from .rollups import INTERVALS, SPLITS, day_range, timeseries
+from .exports import FORMATS as EXPORT_FORMATS, stream_export
+from .search import (
+    CUSTOMER_FILTERS,
+    RECEIPT_MATCHES,
+    TRIGRAM_MIN_LENGTH,
+    customer_order,
+    filter_customers,
+    filter_receipts,
+)
 from .permissions import IsTenantMember, IsClient, IsCashier, IsAdmin
 from .telegram_auth import (
     cache_tenant_slug,
@@ -111,10 +156,6 @@ def rate_limited(key: str, limit: int, window_seconds: int = 3600) -> bool:
     return False
 
 
-def audit_log(tenant: Tenant, user: User | None, action: str, metadata: dict | None = None):
-    AuditLog.objects.create(tenant=tenant, user=user, action=action, metadata=metadata or {})
-
-
 def send_email_code(user: User, code: str):
     subject = "Код подтверждения"
     message = f"Ваш код: {code}. Он действует {settings.EMAIL_CODE_TTL_MINUTES} минут."
@@ -163,33 +204,6 @@ def mask_phone(phone: str) -> str:
     return f"***{phone[-4:]}"
 
 
-def get_rule(tenant: Tenant, location: Location | None, user: User | None) -> LoyaltyRule:
-    if user:
-        targeted = (
-            LoyaltyRule.objects.filter(tenant=tenant, targets__user=user)
-            .order_by("-id")
-            .first()
-        )
-        if targeted:
-            return targeted
-    if location:
-        rule = (
-            LoyaltyRule.objects.filter(tenant=tenant, location=location, applies_to_all=True)
-            .order_by("-id")
-            .first()
-        )
-        if rule:
-            return rule
-    rule = (
-        LoyaltyRule.objects.filter(tenant=tenant, location__isnull=True, applies_to_all=True)
-        .order_by("-id")
-        .first()
-    )
-    if not rule:
-        rule = LoyaltyRule.objects.create(tenant=tenant, earn_percent=Decimal("3.0"), applies_to_all=True)
-    return rule
-
-
 def apply_rounding(value: Decimal, mode: str) -> int:
     if mode == LoyaltyRule.Rounding.CEIL:
         return int(value.to_integral_value(rounding="ROUND_CEILING"))
@@ -208,8 +222,62 @@ def update_tier(card: LoyaltyCard, rule: LoyaltyRule):
         card.tier = "Bronze"
 
 
-def validate_qr(tenant: Tenant, token: str) -> tuple[OneTimeQR | None, str | None]:
-    qr = OneTimeQR.objects.select_related("card", "card__user").filter(tenant=tenant, token=token).first()
+def operations_page(request, ops, default_limit: int) -> Response:
+    receipt_id = request.query_params.get("receipt_id")
+    if receipt_id:
+        match = request.query_params.get("receipt_match", "prefix")
+        if match not in RECEIPT_MATCHES:
+            return Response({"detail": "INVALID_RECEIPT_MATCH"}, status=status.HTTP_400_BAD_REQUEST)
+        if match == "contains" and len(receipt_id.strip()) < TRIGRAM_MIN_LENGTH:
+            return Response({"detail": "RECEIPT_QUERY_TOO_SHORT"}, status=status.HTTP_400_BAD_REQUEST)
+        ops = filter_receipts(ops, receipt_id, match)
+    limit = parse_limit(request.query_params.get("limit"), default_limit, settings.OPERATIONS_PAGE_MAX)
+    try:
+        page, next_cursor = keyset_page(ops, request.query_params.get("cursor"), limit)
+    except InvalidCursor:
+        return Response({"detail": "INVALID_CURSOR"}, status=status.HTTP_400_BAD_REQUEST)
+    response = Response(OperationSerializer(page, many=True).data)
+    if next_cursor:
+        response["X-Next-Cursor"] = next_cursor
+    return response
+
+
+def offer_context(offers: list[Offer], user: User | None = None) -> dict:
+    offer_ids = [offer.id for offer in offers]
+    target_ids = {}
+    for offer_id, user_id in OfferTarget.objects.filter(offer_id__in=offer_ids).values_list("offer_id", "user_id"):
+        target_ids.setdefault(offer_id, []).append(user_id)
+    context = {"user": user, "target_ids": target_ids}
+    if user is not None:
+        context["used_offer_ids"] = set(
+            OfferRedemption.objects.filter(user=user, offer_id__in=offer_ids).values_list("offer_id", flat=True)
+        )
+    return context
+
+
+def rule_target_ids(rules: list[LoyaltyRule]) -> dict[int, list[int]]:
+    target_ids = {}
+    for rule_id, user_id in RuleTarget.objects.filter(rule_id__in=[rule.id for rule in rules]).values_list(
+        "rule_id", "user_id"
+    ):
+        target_ids.setdefault(rule_id, []).append(user_id)
+    return target_ids
+
+
+def job_data(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "processed": job.processed,
+        "total": job.total,
+        "result": job.result,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def validate_qr(tenant: Tenant, token: str) -> tuple[OneTimeQR | RollingQR | None, str | None]:
+    qr = find_qr(tenant, token)
     if not qr:
         return None, "QR_NOT_FOUND"
     if qr.expires_at < timezone.now():
@@ -221,28 +289,11 @@ def validate_qr(tenant: Tenant, token: str) -> tuple[OneTimeQR | None, str | Non
     return qr, None
 
 
-def ops_limit_reached(card: LoyaltyCard, staff: User | None) -> tuple[bool, str | None]:
-    max_earn = settings.MAX_EARN_PER_DAY_PER_CARD
-    if max_earn:
-        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        earned = (
-            LoyaltyOperation.objects.filter(
-                card=card,
-                type=LoyaltyOperation.Type.EARN,
-                status=LoyaltyOperation.Status.SUCCESS,
-                created_at__gte=today_start,
-            ).aggregate(total=Sum("points"))["total"]
-            or 0
-        )
-        if earned >= max_earn:
-            return True, "MAX_EARN_PER_DAY_REACHED"
+def ops_limit_reached(staff: User | None) -> tuple[bool, str | None]:
     if staff:
         max_ops = settings.MAX_OPS_PER_HOUR_PER_STAFF
-        if max_ops:
-            hour_ago = timezone.now() - timedelta(hours=1)
-            ops_count = LoyaltyOperation.objects.filter(staff=staff, created_at__gte=hour_ago).count()
-            if ops_count >= max_ops:
-                return True, "MAX_OPS_PER_HOUR_REACHED"
+        if max_ops and staff_ops_last_hour(staff.id) >= max_ops:
+            return True, "MAX_OPS_PER_HOUR_REACHED"
     return False, None
 
 
@@ -251,8 +302,10 @@ class TenantMixin:
         tenant = getattr(self.request, "tenant", None)
         if tenant:
             return tenant
-        slug = self.kwargs.get("tenant_slug")
-        return get_object_or_404(Tenant, slug=slug)
+        tenant = get_tenant_by_slug(self.kwargs.get("tenant_slug"))
+        if tenant is None:
+            raise Http404("Tenant not found")
+        return tenant
 
 
 def location_for_tenant(tenant: Tenant, location_id: int | None):
@@ -292,7 +345,9 @@ class RegisterView(TenantMixin, APIView):
 
 
 def handle_login(request, tenant_slug, allowed_roles: list[str]):
-    tenant = getattr(request, "tenant", None) or get_object_or_404(Tenant, slug=tenant_slug)
+    tenant = getattr(request, "tenant", None) or get_tenant_by_slug(tenant_slug)
+    if tenant is None:
+        raise Http404("Tenant not found")
     serializer = LoginSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     email = serializer.validated_data["email"].lower()
@@ -686,7 +741,7 @@ class TelegramWebhookView(APIView):
                 pass
             return Response({"detail": "OK"})
 
-        tenant = Tenant.objects.filter(slug=tenant_slug).first()
+        tenant = get_tenant_by_slug(tenant_slug)
         if not tenant:
             try:
                 send_telegram_message(chat_id, "Tenant not found. Please check the link.")
@@ -744,21 +799,17 @@ class ClientOperationsView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsClient]
 
     def get(self, request, tenant_slug):
-        ops = request.user.card.operations.order_by("-created_at")
+        ops = request.user.card.operations.all()
         op_type = request.query_params.get("type")
         if op_type:
             ops = ops.filter(type=op_type)
-        receipt_id = request.query_params.get("receipt_id")
-        if receipt_id:
-            ops = ops.filter(receipt_id__icontains=receipt_id)
         date_from = request.query_params.get("from")
         date_to = request.query_params.get("to")
         if date_from:
             ops = ops.filter(created_at__gte=date_from)
         if date_to:
             ops = ops.filter(created_at__lte=date_to)
-        ops = ops[:100]
-        return Response(OperationSerializer(ops, many=True).data)
+        return operations_page(request, ops, default_limit=100)
 
 
 class ClientOffersView(TenantMixin, APIView):
@@ -770,10 +821,17 @@ class ClientOffersView(TenantMixin, APIView):
             models.Q(active_from__isnull=True) | models.Q(active_from__lte=now),
             models.Q(active_to__isnull=True) | models.Q(active_to__gte=now),
         )
-        offers = offers.filter(
-            models.Q(applies_to_all=True) | models.Q(targets__user=request.user)
-        ).distinct()
-        return Response(OfferSerializer(offers, many=True, context={"user": request.user}).data)
+        targeted = models.Exists(OfferTarget.objects.filter(offer=models.OuterRef("pk"), user=request.user))
+        offers = offers.annotate(targeted=targeted).filter(
+            models.Q(applies_to_all=True) | models.Q(targeted=True) | models.Q(segment__isnull=False)
+        )
+        segments = get_segment_index(request.user.tenant_id)
+        offers = [
+            offer
+            for offer in offers
+            if offer.applies_to_all or offer.targeted or segments.contains(offer.segment_id, request.user.id)
+        ]
+        return Response(OfferSerializer(offers, many=True, context=offer_context(offers, request.user)).data)
 
 
 class ClientOfferUseView(TenantMixin, APIView):
@@ -794,7 +852,11 @@ class ClientOfferUseView(TenantMixin, APIView):
         ).first()
         if not offer:
             return Response({"detail": "OFFER_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
-        if not offer.applies_to_all and not OfferTarget.objects.filter(offer=offer, user=request.user).exists():
+        if not (
+            offer.applies_to_all
+            or (offer.segment_id and get_segment_index(offer.tenant_id).contains(offer.segment_id, request.user.id))
+            or OfferTarget.objects.filter(offer=offer, user=request.user).exists()
+        ):
             return Response({"detail": "OFFER_NOT_AVAILABLE"}, status=status.HTTP_403_FORBIDDEN)
         OfferRedemption.objects.get_or_create(offer=offer, user=request.user, tenant=request.user.tenant)
         return Response({"detail": "OK"})
@@ -820,6 +882,24 @@ class ClientQRIssueView(TenantMixin, APIView):
         return Response({"qr_payload": token, "expires_at": expires_at.isoformat()})
 
 
+class ClientQRSecretView(TenantMixin, APIView):
+    permission_classes = [IsTenantMember, IsClient]
+
+    def get(self, request, tenant_slug):
+        if not request.user.is_verified:
+            return Response({"detail": "EMAIL_NOT_VERIFIED"}, status=status.HTTP_400_BAD_REQUEST)
+        card = request.user.card
+        return Response(
+            {
+                "card_id": card.id,
+                "secret": card_secret(card.tenant_id, card.id, card.qr_key_version).hex(),
+                "version": card.qr_key_version,
+                "prefix": ROLLING_QR_PREFIX,
+                "period": settings.QR_ROLLING_PERIOD_SECONDS,
+            }
+        )
+
+
 class ClientPasswordChangeView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsClient]
 
@@ -903,49 +983,73 @@ class LoyaltyRefundView(TenantMixin, APIView):
         serializer.is_valid(raise_exception=True)
         receipt_id = serializer.validated_data["receipt_id"]
         idempotency_key = serializer.validated_data["idempotency_key"]
-        existing = LoyaltyOperation.objects.filter(tenant=tenant, idempotency_key=idempotency_key).first()
+        replay_key = operation_key(idempotency_key)
+        replay = replay_response(tenant, replay_key)
+        if replay is not None:
+            return replay
+        existing = LoyaltyOperation.objects.select_related("card").filter(
+            tenant=tenant, idempotency_key=idempotency_key
+        ).first()
         if existing:
-            return Response({"detail": "OK", "points": existing.points, "current_points": existing.card.current_points})
+            return legacy_replay(existing)
         original = LoyaltyOperation.objects.filter(
             tenant=tenant,
             receipt_id=receipt_id,
             type__in=[LoyaltyOperation.Type.EARN, LoyaltyOperation.Type.REDEEM],
             status=LoyaltyOperation.Status.SUCCESS,
+            created_at__gte=timezone.now() - timedelta(days=settings.REFUND_LOOKBACK_DAYS),
         ).order_by("-created_at").first()
         if not original:
             return Response({"detail": "RECEIPT_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
-        if LoyaltyOperation.objects.filter(original_operation=original, type=LoyaltyOperation.Type.REFUND).exists():
+        if LoyaltyOperation.objects.filter(
+            tenant=tenant,
+            original_operation=original,
+            type=LoyaltyOperation.Type.REFUND,
+            created_at__gte=original.created_at,
+        ).exists():
             return Response({"detail": "ALREADY_REFUNDED"}, status=status.HTTP_400_BAD_REQUEST)
 
-        with transaction.atomic():
-            card = LoyaltyCard.objects.select_for_update().get(id=original.card_id)
-            points = original.points
-            if original.type == LoyaltyOperation.Type.EARN:
-                if card.current_points < points:
-                    return Response({"detail": "INSUFFICIENT_POINTS"}, status=status.HTTP_400_BAD_REQUEST)
-                card.current_points -= points
-            else:
-                card.current_points += points
-            rule = get_rule(tenant, original.location, card.user)
-            update_tier(card, rule)
-            card.save()
-            LoyaltyOperation.objects.create(
-                tenant=tenant,
-                card=card,
-                type=LoyaltyOperation.Type.REFUND,
-                source=LoyaltyOperation.Source.CASHIER_APP,
-                amount=original.amount,
-                points=points,
-                receipt_id=receipt_id,
-                idempotency_key=idempotency_key,
-                original_operation=original,
-                staff=request.user,
-                location=original.location,
-                status=LoyaltyOperation.Status.SUCCESS,
-                metadata={"refunded_type": original.type},
-            )
-            audit_log(tenant, request.user, "refund", {"receipt_id": receipt_id})
-            return Response({"detail": "OK", "points": points, "current_points": card.current_points})
+        try:
+            with transaction.atomic():
+                card = LoyaltyCard.objects.select_for_update().get(id=original.card_id)
+                points = original.points
+                if original.type == LoyaltyOperation.Type.EARN:
+                    if card.current_points < points:
+                        return Response({"detail": "INSUFFICIENT_POINTS"}, status=status.HTTP_400_BAD_REQUEST)
+                    card.current_points -= points
+                else:
+                    card.current_points += points
+                rule = get_rule_table(tenant.id).resolve(original.location_id, card.user_id)
+                update_tier(card, rule)
+                card.save()
+                refund = record_operation(
+                    tenant=tenant,
+                    card=card,
+                    type=LoyaltyOperation.Type.REFUND,
+                    source=LoyaltyOperation.Source.CASHIER_APP,
+                    amount=original.amount,
+                    points=points,
+                    receipt_id=receipt_id,
+                    idempotency_key=idempotency_key,
+                    original_operation=original,
+                    staff=request.user,
+                    location=original.location,
+                    status=LoyaltyOperation.Status.SUCCESS,
+                    metadata={"refunded_type": original.type},
+                )
+                if original.type == LoyaltyOperation.Type.EARN:
+                    consume_lots(card.id, points, operation_id=original.id)
+                else:
+                    add_lot(refund)
+                payload = {"detail": "OK", "points": points, "current_points": card.current_points}
+                store_response(tenant, replay_key, payload, status.HTTP_200_OK)
+                audit_log(tenant, request.user, "refund", {"receipt_id": receipt_id})
+                return Response(payload)
+        except IntegrityError:
+            replay = replay_response(tenant, replay_key)
+            if replay is None:
+                raise
+            return replay
 
 
 class POSLoyaltyEarnView(TenantMixin, APIView):
@@ -964,13 +1068,16 @@ class POSLoyaltyEarnView(TenantMixin, APIView):
         if api_key not in (tenant.pos_api_key, location.pos_api_key):
             return Response({"detail": "INVALID_API_KEY"}, status=status.HTTP_401_UNAUTHORIZED)
         receipt_id = serializer.validated_data["receipt_id"]
-        existing = LoyaltyOperation.objects.filter(
+        replay = replay_response(tenant, pos_receipt_key(receipt_id))
+        if replay is not None:
+            return replay
+        existing = LoyaltyOperation.objects.select_related("card").filter(
             tenant=tenant,
             receipt_id=receipt_id,
             source=LoyaltyOperation.Source.POS,
         ).first()
         if existing:
-            return Response({"detail": "OK", "points": existing.points, "current_points": existing.card.current_points})
+            return legacy_replay(existing)
         return handle_points(
             request,
             tenant_slug,
@@ -982,46 +1089,111 @@ class POSLoyaltyEarnView(TenantMixin, APIView):
         )
 
 
+class POSLoyaltyEarnBatchView(TenantMixin, APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request, tenant_slug):
+        tenant = self.get_tenant()
+        api_key = request.headers.get("X-POS-API-KEY")
+        if not api_key:
+            return Response({"detail": "MISSING_API_KEY"}, status=status.HTTP_401_UNAUTHORIZED)
+        serializer = POSBatchEarnSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        location = location_for_tenant(tenant, serializer.validated_data["location_id"])
+        if not location:
+            return Response({"detail": "LOCATION_NOT_FOUND"}, status=status.HTTP_400_BAD_REQUEST)
+        if api_key not in (tenant.pos_api_key, location.pos_api_key):
+            return Response({"detail": "INVALID_API_KEY"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        receipts = serializer.validated_data["receipts"]
+        receipt_ids = list(dict.fromkeys(receipt["receipt_id"] for receipt in receipts))
+        stored = get_responses(tenant, [pos_receipt_key(receipt_id) for receipt_id in receipt_ids])
+        replies = {
+            receipt_id: stored[pos_receipt_key(receipt_id)]
+            for receipt_id in receipt_ids
+            if pos_receipt_key(receipt_id) in stored
+        }
+        missing = [receipt_id for receipt_id in receipt_ids if receipt_id not in replies]
+        if missing:
+            for op in LoyaltyOperation.objects.select_related("card").filter(
+                tenant=tenant,
+                receipt_id__in=missing,
+                source=LoyaltyOperation.Source.POS,
+            ):
+                replies.setdefault(
+                    op.receipt_id,
+                    ({"detail": "OK", "points": op.points, "current_points": op.card.current_points}, status.HTTP_200_OK),
+                )
+        results = []
+        chunk_size = settings.POS_BATCH_CHUNK_SIZE
+        for offset in range(0, len(receipts), chunk_size):
+            chunk = receipts[offset : offset + chunk_size]
+            tokens = [receipt["qr_payload"] for receipt in chunk]
+            qrs = decode_rolling_qrs(tenant, [token for token in tokens if is_rolling(token)])
+            qrs.update(
+                (qr.token, qr)
+                for qr in OneTimeQR.objects.select_related("card", "card__user").filter(
+                    tenant=tenant,
+                    token__in=[token for token in tokens if not is_rolling(token)],
+                )
+            )
+            fresh = {}
+            for receipt in chunk:
+                if receipt["receipt_id"] not in replies:
+                    fresh.setdefault(receipt["receipt_id"], receipt)
+            try:
+                with transaction.atomic():
+                    replies.update(process_pos_chunk(tenant, location, list(fresh.values()), qrs))
+            except DatabaseError:
+                logger.warning("pos.batch chunk retried per receipt tenant_id=%s", tenant.id, exc_info=True)
+                for receipt_id, receipt in fresh.items():
+                    replies[receipt_id] = process_pos_receipt(tenant, location, receipt, qrs.get(receipt["qr_payload"]))
+            for receipt in chunk:
+                payload, code = replies[receipt["receipt_id"]]
+                results.append({"receipt_id": receipt["receipt_id"], "status": code, **payload})
+        return Response({"results": results})
+
+
 class CashierOperationsView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsCashier]
 
     def get(self, request, tenant_slug):
-        ops = LoyaltyOperation.objects.filter(tenant=request.user.tenant).order_by("-created_at")
-        receipt_id = request.query_params.get("receipt_id")
-        if receipt_id:
-            ops = ops.filter(receipt_id__icontains=receipt_id)
-        ops = ops[:100]
-        return Response(OperationSerializer(ops, many=True).data)
+        ops = LoyaltyOperation.objects.filter(tenant=request.user.tenant)
+        return operations_page(request, ops, default_limit=100)
 
 
 class AdminDashboardView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsAdmin]
 
     def get(self, request, tenant_slug):
-        tenant = request.user.tenant
-        return Response(
-            {
-                "clients": User.objects.filter(tenant=tenant, role=User.Role.CLIENT).count(),
-                "staff": User.objects.filter(tenant=tenant, role__in=[User.Role.ADMIN, User.Role.CASHIER]).count(),
-                "locations": Location.objects.filter(tenant=tenant).count(),
-                "operations": LoyaltyOperation.objects.filter(tenant=tenant).count(),
-            }
-        )
+        stats = get_stats(request.user.tenant_id)
+        return Response({field: getattr(stats, field) for field in STAT_FIELDS})
 
 
 class AdminCustomersView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsAdmin]
 
     def get(self, request, tenant_slug):
-        users = User.objects.filter(tenant=request.user.tenant, role=User.Role.CLIENT).order_by("-id")[:200]
+        users = User.objects.select_related("card").filter(tenant=request.user.tenant, role=User.Role.CLIENT)
+        limit = parse_limit(request.query_params.get("limit"), 200, settings.OPERATIONS_PAGE_MAX)
+        try:
+            users = filter_customers(users, request.query_params)
+            cursor, order = request.query_params.get("cursor"), customer_order(request.query_params)
+            page, next_cursor = id_page(users, cursor, limit) if order is None else key_page(users, order, cursor, limit)
+        except InvalidCursor:
+            return Response({"detail": "INVALID_CURSOR"}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({"detail": "INVALID_FILTER"}, status=status.HTTP_400_BAD_REQUEST)
         data = []
-        for user in users:
+        for user in page:
             card = getattr(user, "card", None)
             data.append(
                 {
                     "id": user.id,
                     "email": user.email,
                     "phone": user.phone,
+                    "first_name": user.first_name,
+                    "last_name": user.last_name,
                     "tier": card.tier if card else "-",
                     "points": card.current_points if card else 0,
                     "email_verified": user.email_verified,
@@ -1029,7 +1201,34 @@ class AdminCustomersView(TenantMixin, APIView):
                     "is_verified": user.is_verified,
                 }
             )
-        return Response(data)
+        response = Response(data)
+        if next_cursor:
+            response["X-Next-Cursor"] = next_cursor
+        return response
+
+
+class AdminCustomersImportView(TenantMixin, APIView):
+    permission_classes = [IsTenantMember, IsAdmin]
+
+    def get(self, request, tenant_slug, job_id):
+        job = Job.objects.filter(tenant=request.user.tenant, kind=Job.Kind.IMPORT_CUSTOMERS, id=job_id).first()
+        if not job:
+            return Response({"detail": "JOB_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_data(job))
+
+    def post(self, request, tenant_slug):
+        if request.content_type.startswith("multipart/form-data"):
+            upload = request.FILES.get("file")
+            chunks = upload.chunks() if upload else None
+        else:
+            stream = request.stream
+            chunks = iter(lambda: stream.read(64 * 1024), b"") if stream else None
+        if chunks is None:
+            return Response({"detail": "FILE_REQUIRED"}, status=status.HTTP_400_BAD_REQUEST)
+        name = save_upload(chunks)
+        job = enqueue(request.user.tenant_id, Job.Kind.IMPORT_CUSTOMERS, {"file": name})
+        audit_log(request.user.tenant, request.user, "customers_import", {"job_id": job.id})
+        return Response({"id": job.id, "status": job.status}, status=status.HTTP_202_ACCEPTED)
 
 
 class AdminStaffView(TenantMixin, APIView):
@@ -1114,7 +1313,11 @@ class AdminLocationsView(TenantMixin, APIView):
         location = Location.objects.filter(tenant=request.user.tenant, id=location_id).first()
         if not location:
             return Response({"detail": "LOCATION_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
+        has_rules = LoyaltyRule.objects.filter(location=location).exists()
         location.delete()
+        invalidate_rules(request.user.tenant_id)
+        if has_rules:
+            enqueue(request.user.tenant_id, Job.Kind.RETIER)
         audit_log(request.user.tenant, request.user, "location_delete", {"location_id": location_id})
         return Response({"detail": "DELETED"})
 
@@ -1123,64 +1326,71 @@ class AdminRulesView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsAdmin]
 
     def get(self, request, tenant_slug):
-        rules = LoyaltyRule.objects.filter(tenant=request.user.tenant).order_by("-id")
-        return Response(LoyaltyRuleSerializer(rules, many=True).data)
+        rules = list(LoyaltyRule.objects.filter(tenant=request.user.tenant).order_by("-id"))
+        return Response(LoyaltyRuleSerializer(rules, many=True, context={"target_ids": rule_target_ids(rules)}).data)
 
     def post(self, request, tenant_slug):
         serializer = LoyaltyRuleSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
         client_ids = data.pop("client_ids", [])
+        segment = data.get("segment")
+        if segment and segment.tenant_id != request.user.tenant_id:
+            return Response({"detail": "SEGMENT_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
         applies_to_all = data.get("applies_to_all", True)
-        if client_ids:
+        if client_ids or segment:
             applies_to_all = False
         data["applies_to_all"] = applies_to_all
         location = data.get("location")
-        if applies_to_all:
-            rule = (
+        tenant = request.user.tenant
+        with transaction.atomic():
+            if applies_to_all:
+                rule = (
+                    LoyaltyRule.objects.filter(
+                        tenant=tenant,
+                        location=location,
+                        applies_to_all=True,
+                    )
+                    .order_by("-id")
+                    .first()
+                )
+                if rule:
+                    for field, value in data.items():
+                        setattr(rule, field, value)
+                    rule.save()
+                else:
+                    rule = LoyaltyRule.objects.create(tenant=tenant, **data)
                 LoyaltyRule.objects.filter(
-                    tenant=request.user.tenant,
+                    tenant=tenant,
                     location=location,
                     applies_to_all=True,
-                )
-                .order_by("-id")
-                .first()
-            )
-            if rule:
-                for field, value in data.items():
-                    setattr(rule, field, value)
-                rule.save()
+                ).exclude(id=rule.id).delete()
+                RuleTarget.objects.filter(rule=rule).delete()
             else:
-                rule = LoyaltyRule.objects.create(tenant=request.user.tenant, **data)
-            LoyaltyRule.objects.filter(
-                tenant=request.user.tenant,
-                location=location,
-                applies_to_all=True,
-            ).exclude(id=rule.id).delete()
-            RuleTarget.objects.filter(rule=rule).delete()
-        else:
-            if client_ids:
-                existing_rules = LoyaltyRule.objects.filter(
-                    tenant=request.user.tenant,
-                    location=location,
-                    applies_to_all=False,
-                    targets__user_id__in=client_ids,
-                ).distinct()
-                RuleTarget.objects.filter(rule__in=existing_rules, user_id__in=client_ids).delete()
-                for existing in existing_rules:
-                    if not RuleTarget.objects.filter(rule=existing).exists():
-                        existing.delete()
-            rule = LoyaltyRule.objects.create(tenant=request.user.tenant, **data)
-            clients = User.objects.filter(
-                tenant=request.user.tenant,
-                role=User.Role.CLIENT,
-                id__in=client_ids,
-            )
-            targets = [
-                RuleTarget(rule=rule, user=client, tenant=request.user.tenant)
-                for client in clients
-            ]
-            RuleTarget.objects.bulk_create(targets, ignore_conflicts=True)
+                clients = id_set(client_ids)
+                if client_ids:
+                    retargeted = RuleTarget.objects.filter(
+                        tenant=tenant, rule__location=location, rule__applies_to_all=False, user_id__in=clients
+                    )
+                    rule_ids = list(retargeted.values_list("rule_id", flat=True).distinct())
+                    retargeted.delete()
+                    LoyaltyRule.objects.filter(id__in=rule_ids, targets__isnull=True).delete()
+                elif segment:
+                    LoyaltyRule.objects.filter(
+                        tenant=tenant, location=location, applies_to_all=False, segment=segment, targets__isnull=True
+                    ).delete()
+                rule = LoyaltyRule.objects.create(tenant=tenant, **data)
+                if client_ids:
+                    insert_select(
+                        RuleTarget,
+                        "user",
+                        User.objects.filter(tenant=tenant, role=User.Role.CLIENT, id__in=clients),
+                        rule=rule.id,
+                        tenant=tenant.id,
+                        created_at=timezone.now(),
+                    )
+        invalidate_rules(request.user.tenant_id)
+        enqueue(request.user.tenant_id, Job.Kind.RETIER)
         return Response(LoyaltyRuleSerializer(rule).data)
 
     def delete(self, request, tenant_slug, rule_id=None):
@@ -1191,35 +1401,125 @@ class AdminRulesView(TenantMixin, APIView):
         if not rule:
             return Response({"detail": "RULE_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
         rule.delete()
+        invalidate_rules(request.user.tenant_id)
+        enqueue(request.user.tenant_id, Job.Kind.RETIER)
         audit_log(request.user.tenant, request.user, "rule_delete", {"rule_id": rule_id})
         return Response({"detail": "DELETED"})
 
 
+class AdminCouponIssueView(TenantMixin, APIView):
+    permission_classes = [IsTenantMember, IsAdmin]
+
+    def get(self, request, tenant_slug, coupon_id, job_id):
+        job = Job.objects.filter(
+            tenant=request.user.tenant, kind=Job.Kind.ISSUE_COUPON, id=job_id, payload__coupon_id=coupon_id
+        ).first()
+        if not job:
+            return Response({"detail": "JOB_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_data(job))
+
+    def post(self, request, tenant_slug, coupon_id):
+        coupon = Coupon.objects.filter(tenant=request.user.tenant, id=coupon_id).first()
+        if not coupon:
+            return Response({"detail": "COUPON_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
+        filters = {key: str(request.data[key]) for key in CUSTOMER_FILTERS if request.data.get(key) not in (None, "")}
+        try:
+            cards = coupon_cards(request.user.tenant_id, filters)
+        except ValueError:
+            return Response({"detail": "INVALID_FILTER"}, status=status.HTTP_400_BAD_REQUEST)
+        job = enqueue(request.user.tenant_id, Job.Kind.ISSUE_COUPON, {"coupon_id": coupon.id, "filters": filters})
+        audit_log(request.user.tenant, request.user, "coupon_issue", {"coupon_id": coupon.id, "filters": filters})
+        return Response({"id": job.id, "status": job.status, "cards": cards.count()}, status=status.HTTP_202_ACCEPTED)
+
+
+class AdminAnalyticsTimeseriesView(TenantMixin, APIView):
+    permission_classes = [IsTenantMember, IsAdmin]
+
+    def get(self, request, tenant_slug):
+        params = request.query_params
+        try:
+            date_to = date.fromisoformat(params["to"]) if params.get("to") else day_bucket()
+            date_from = date.fromisoformat(params["from"]) if params.get("from") else date_to - timedelta(days=29)
+        except ValueError:
+            return Response({"detail": "INVALID_DATE"}, status=status.HTTP_400_BAD_REQUEST)
+        if date_from > date_to:
+            return Response({"detail": "INVALID_DATE"}, status=status.HTTP_400_BAD_REQUEST)
+        interval = params.get("interval", "day")
+        if interval not in INTERVALS:
+            return Response({"detail": "INVALID_INTERVAL"}, status=status.HTTP_400_BAD_REQUEST)
+        split = params.get("split") or None
+        if split is not None and split not in SPLITS:
+            return Response({"detail": "INVALID_SPLIT"}, status=status.HTTP_400_BAD_REQUEST)
+        filters = {field: params[field] for field in ("type", "source") if params.get(field)}
+        if params.get("location_id"):
+            if not params["location_id"].isdigit():
+                return Response({"detail": "LOCATION_NOT_FOUND"}, status=status.HTTP_400_BAD_REQUEST)
+            filters["location_id"] = int(params["location_id"])
+        series = timeseries(request.user.tenant_id, date_from, date_to, interval, split, **filters)
+        return Response(
+            {"from": date_from.isoformat(), "to": date_to.isoformat(), "interval": interval, "series": series}
+        )
+
+
 class AdminOperationsView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsAdmin]
 
     def get(self, request, tenant_slug):
-        ops = LoyaltyOperation.objects.filter(tenant=request.user.tenant).order_by("-created_at")
-        receipt_id = request.query_params.get("receipt_id")
-        if receipt_id:
-            ops = ops.filter(receipt_id__icontains=receipt_id)
-        return Response(OperationSerializer(ops[:200], many=True).data)
+        ops = LoyaltyOperation.objects.filter(tenant=request.user.tenant)
+        return operations_page(request, ops, default_limit=200)
+
+
+class AdminOperationsExportView(TenantMixin, APIView):
+    permission_classes = [IsTenantMember, IsAdmin]
+
+    def get(self, request, tenant_slug):
+        params = request.query_params
+        export_format = params.get("output", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response({"detail": "INVALID_FORMAT"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            date_from = date.fromisoformat(params["from"]) if params.get("from") else None
+            date_to = date.fromisoformat(params["to"]) if params.get("to") else None
+        except ValueError:
+            return Response({"detail": "INVALID_DATE"}, status=status.HTTP_400_BAD_REQUEST)
+        ops = LoyaltyOperation.objects.filter(tenant=request.user.tenant)
+        if date_from:
+            ops = ops.filter(created_at__gte=day_range(date_from, date_from)[0])
+        if date_to:
+            ops = ops.filter(created_at__lt=day_range(date_to, date_to)[1])
+        if params.get("location_id"):
+            location_id = params["location_id"]
+            location = location_for_tenant(request.user.tenant, int(location_id)) if location_id.isdigit() else None
+            if not location:
+                return Response({"detail": "LOCATION_NOT_FOUND"}, status=status.HTTP_400_BAD_REQUEST)
+            ops = ops.filter(location=location)
+        for field in ("type", "source", "status"):
+            if params.get(field):
+                ops = ops.filter(**{field: params[field]})
+        content_type, chunks = stream_export(ops, export_format, settings.EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        filename = f"operations-{request.user.tenant.slug}-{day_bucket():%Y%m%d}.{export_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
 
 class AdminOffersView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsAdmin]
 
     def get(self, request, tenant_slug):
-        offers = Offer.objects.filter(tenant=request.user.tenant).order_by("-id")
-        return Response(OfferSerializer(offers, many=True).data)
+        offers = list(Offer.objects.filter(tenant=request.user.tenant).order_by("-id"))
+        return Response(OfferSerializer(offers, many=True, context=offer_context(offers)).data)
 
     def post(self, request, tenant_slug):
         serializer = OfferSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
         client_ids = data.pop("client_ids", [])
+        segment = data.get("segment")
+        if segment and segment.tenant_id != request.user.tenant_id:
+            return Response({"detail": "SEGMENT_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
         applies_to_all = data.get("applies_to_all", True)
-        if client_ids:
+        if client_ids or segment:
             applies_to_all = False
         data["applies_to_all"] = applies_to_all
         offer = Offer.objects.create(tenant=request.user.tenant, **data)
@@ -1234,6 +1534,7 @@ class AdminOffersView(TenantMixin, APIView):
                 for client in clients
             ]
             OfferTarget.objects.bulk_create(targets, ignore_conflicts=True)
+        invalidate_offers(request.user.tenant_id)
         return Response(OfferSerializer(offer).data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, tenant_slug, offer_id=None):
@@ -1244,10 +1545,44 @@ class AdminOffersView(TenantMixin, APIView):
         if not offer:
             return Response({"detail": "OFFER_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
         offer.delete()
+        invalidate_offers(request.user.tenant_id)
         audit_log(request.user.tenant, request.user, "offer_delete", {"offer_id": offer_id})
         return Response({"detail": "DELETED"})
 
 
+class AdminSegmentsView(TenantMixin, APIView):
+    permission_classes = [IsTenantMember, IsAdmin]
+
+    def get(self, request, tenant_slug):
+        segments = list(Segment.objects.filter(tenant=request.user.tenant).defer("members").order_by("-id"))
+        index = get_segment_index(request.user.tenant_id)
+        for segment in segments:
+            if segment.id in index.segments:
+                segment.size = index.size(segment.id)
+        return Response(SegmentSerializer(segments, many=True).data)
+
+    def post(self, request, tenant_slug):
+        serializer = SegmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        location = serializer.validated_data.get("location")
+        if location and location.tenant_id != request.user.tenant_id:
+            return Response({"detail": "LOCATION_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
+        segment = serializer.save(tenant=request.user.tenant)
+        enqueue(request.user.tenant_id, Job.Kind.REFRESH_SEGMENTS, {"segment_id": segment.id})
+        return Response(SegmentSerializer(segment).data, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, tenant_slug, segment_id=None):
+        segment = Segment.objects.filter(tenant=request.user.tenant, id=segment_id).first()
+        if not segment:
+            return Response({"detail": "SEGMENT_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
+        segment.delete()
+        invalidate_segments(request.user.tenant_id)
+        invalidate_rules(request.user.tenant_id)
+        invalidate_offers(request.user.tenant_id)
+        audit_log(request.user.tenant, request.user, "segment_delete", {"segment_id": segment_id})
+        return Response({"detail": "DELETED"})
+
+
 class AdminSettingsView(TenantMixin, APIView):
     permission_classes = [IsTenantMember, IsAdmin]
 
@@ -1272,7 +1607,9 @@ def handle_points(
     location=None,
     pos_payload=None,
 ):
-    tenant = getattr(request, "tenant", None) or Tenant.objects.get(slug=tenant_slug)
+    tenant = getattr(request, "tenant", None) or get_tenant_by_slug(tenant_slug)
+    if tenant is None:
+        raise Http404("Tenant not found")
     if source == LoyaltyOperation.Source.POS:
         serializer = POSPointsSerializer(data=pos_payload)
     else:
@@ -1288,37 +1625,114 @@ def handle_points(
     if source != LoyaltyOperation.Source.POS and not idempotency_key:
         return Response({"detail": "IDEMPOTENCY_REQUIRED"}, status=status.HTTP_400_BAD_REQUEST)
 
-    existing = None
+    replay_key = None
     if idempotency_key:
-        existing = LoyaltyOperation.objects.filter(tenant=tenant, idempotency_key=idempotency_key).first()
-    if existing:
-        return Response({"detail": "OK", "points": existing.points, "current_points": existing.card.current_points})
+        replay_key = operation_key(idempotency_key)
+    elif source == LoyaltyOperation.Source.POS and receipt_id:
+        replay_key = pos_receipt_key(receipt_id)
+    if replay_key:
+        replay = replay_response(tenant, replay_key)
+        if replay is not None:
+            return replay
+    if idempotency_key:
+        existing = LoyaltyOperation.objects.select_related("card").filter(
+            tenant=tenant, idempotency_key=idempotency_key
+        ).first()
+        if existing:
+            return legacy_replay(existing)
 
     location = location or location_for_tenant(tenant, data.get("location_id"))
     if data.get("location_id") and not location:
         return Response({"detail": "LOCATION_NOT_FOUND"}, status=status.HTTP_400_BAD_REQUEST)
 
-    with transaction.atomic():
-        qr = (
-            OneTimeQR.objects.select_for_update()
-            .select_related("card", "card__user")
-            .filter(token=token, tenant=tenant)
-            .first()
+    qr = find_qr(tenant, token)
+    staff = request.user if source != LoyaltyOperation.Source.POS else None
+    try:
+        payload, code = process_points(
+            tenant,
+            qr,
+            op_type,
+            source,
+            amount,
+            staff=staff,
+            idempotency_key=idempotency_key,
+            receipt_id=receipt_id,
+            location=location,
+            replay_key=replay_key,
         )
-        if not qr:
-            return Response({"detail": "QR_NOT_FOUND"}, status=status.HTTP_400_BAD_REQUEST)
-        if qr.expires_at < timezone.now():
-            return Response({"detail": "QR_EXPIRED"}, status=status.HTTP_400_BAD_REQUEST)
-        if qr.used_at:
-            return Response({"detail": "QR_USED"}, status=status.HTTP_400_BAD_REQUEST)
-        if qr.card.status != LoyaltyCard.Status.ACTIVE:
-            return Response({"detail": "CARD_BLOCKED"}, status=status.HTTP_400_BAD_REQUEST)
-
-        card = LoyaltyCard.objects.select_for_update().get(id=qr.card_id)
-
-        limit_hit, reason = ops_limit_reached(card, request.user if source != LoyaltyOperation.Source.POS else None)
+    except IntegrityError:
+        replay = replay_response(tenant, replay_key) if replay_key else None
+        if replay is None:
+            raise
+        return replay
+    return Response(payload, status=code)
+
+
+def replay_response(tenant: Tenant, key: str) -> Response | None:
+    stored = get_response(tenant, key)
+    if stored is None:
+        return None
+    payload, code = stored
+    return Response(payload, status=code)
+
+
+def legacy_replay(op: LoyaltyOperation) -> Response:
+    return Response({"detail": "OK", "points": op.points, "current_points": op.card.current_points})
+
+
+def find_qr(tenant: Tenant, token: str) -> OneTimeQR | RollingQR | None:
+    if is_rolling(token):
+        return decode_rolling_qr(tenant, token)
+    return OneTimeQR.objects.select_related("card", "card__user").filter(token=token, tenant=tenant).first()
+
+
+def claim_qr(qr: OneTimeQR | RollingQR, now: datetime) -> str | None:
+    if isinstance(qr, RollingQR):
+        return None if consume_rolling_qr(qr) else "QR_USED"
+    if consume_qr(qr.id, now):
+        return None
+    return "QR_USED" if OneTimeQR.objects.filter(id=qr.id, used_at__isnull=False).exists() else "QR_EXPIRED"
+
+
+def unclaim_qr(qr: OneTimeQR | RollingQR) -> None:
+    if isinstance(qr, RollingQR):
+        release_rolling_qr(qr)
+    else:
+        release_qr(qr.id)
+
+
+def process_points(
+    tenant: Tenant,
+    qr: OneTimeQR | RollingQR | None,
+    op_type: str,
+    source: str,
+    amount: Decimal,
+    staff: User | None = None,
+    idempotency_key: str | None = None,
+    receipt_id: str | None = None,
+    location: Location | None = None,
+    replay_key: str | None = None,
+) -> tuple[dict, int]:
+    def remember(payload: dict, code: int) -> tuple[dict, int]:
+        if replay_key:
+            store_response(tenant, replay_key, payload, code)
+        return payload, code
+
+    now = timezone.now()
+    if not qr:
+        return {"detail": "QR_NOT_FOUND"}, status.HTTP_400_BAD_REQUEST
+    if qr.expires_at < now:
+        return {"detail": "QR_EXPIRED"}, status.HTTP_400_BAD_REQUEST
+    if qr.used_at:
+        return {"detail": "QR_USED"}, status.HTTP_400_BAD_REQUEST
+    card = qr.card
+    if card.status != LoyaltyCard.Status.ACTIVE:
+        return {"detail": "CARD_BLOCKED"}, status.HTTP_400_BAD_REQUEST
+
+    with transaction.atomic():
+        limit_hit, reason = ops_limit_reached(staff)
         if limit_hit:
-            LoyaltyOperation.objects.create(
+            record_operation(
                 tenant=tenant,
                 card=card,
                 type=op_type,
@@ -1327,46 +1741,71 @@ def handle_points(
                 points=0,
                 receipt_id=receipt_id,
                 idempotency_key=idempotency_key,
-                staff=request.user if source != LoyaltyOperation.Source.POS else None,
+                staff=staff,
                 location=location,
                 status=LoyaltyOperation.Status.FAILED,
                 fail_reason=reason,
             )
-            return Response({"detail": reason}, status=status.HTTP_400_BAD_REQUEST)
+            return remember({"detail": reason}, status.HTTP_400_BAD_REQUEST)
 
         rule = get_rule(tenant, location, card.user)
         if op_type == LoyaltyOperation.Type.EARN:
             if Decimal(amount) < rule.min_amount:
-                return Response({"detail": "MIN_AMOUNT_NOT_MET"}, status=status.HTTP_400_BAD_REQUEST)
+                return {"detail": "MIN_AMOUNT_NOT_MET"}, status.HTTP_400_BAD_REQUEST
             raw_points = Decimal(amount) * rule.earn_percent / Decimal("100")
-            points = apply_rounding(raw_points, rule.rounding_mode)
-            card.current_points += points
+            offers = get_offer_index(tenant.id).eligible(card.user_id, now)
+            raw_points, bonus, fired = apply_offers(offers, raw_points)
+            points = apply_rounding(raw_points, rule.rounding_mode) + bonus
+            delta, min_balance = points, None
         else:
             points = int(Decimal(amount).to_integral_value(rounding="ROUND_FLOOR"))
-            if card.current_points < points:
-                LoyaltyOperation.objects.create(
-                    tenant=tenant,
-                    card=card,
-                    type=op_type,
-                    source=source,
-                    amount=amount,
-                    points=0,
-                    receipt_id=receipt_id,
-                    idempotency_key=idempotency_key,
-                    staff=request.user if source != LoyaltyOperation.Source.POS else None,
-                    location=location,
-                    status=LoyaltyOperation.Status.FAILED,
-                    fail_reason="INSUFFICIENT_POINTS",
-                )
-                return Response({"detail": "INSUFFICIENT_POINTS"}, status=status.HTTP_400_BAD_REQUEST)
-            card.current_points -= points
-
-        update_tier(card, rule)
-        card.save()
-        qr.used_at = timezone.now()
-        qr.save()
+            delta, min_balance = -points, points
+            fired = []
+
+        qr_error = claim_qr(qr, now)
+        if qr_error:
+            return {"detail": qr_error}, status.HTTP_400_BAD_REQUEST
+        if op_type == LoyaltyOperation.Type.EARN and not reserve_daily_earn(card.id, points, now):
+            unclaim_qr(qr)
+            record_operation(
+                tenant=tenant,
+                card=card,
+                type=op_type,
+                source=source,
+                amount=amount,
+                points=0,
+                receipt_id=receipt_id,
+                idempotency_key=idempotency_key,
+                staff=staff,
+                location=location,
+                status=LoyaltyOperation.Status.FAILED,
+                fail_reason="MAX_EARN_PER_DAY_REACHED",
+            )
+            return remember({"detail": "MAX_EARN_PER_DAY_REACHED"}, status.HTTP_400_BAD_REQUEST)
+        current_points = apply_balance_delta(card.id, delta, rule, min_balance=min_balance)
+        if current_points is None:
+            active = LoyaltyCard.objects.filter(id=card.id, status=LoyaltyCard.Status.ACTIVE).exists()
+            if op_type == LoyaltyOperation.Type.EARN or not active:
+                transaction.set_rollback(True)
+                return {"detail": "CARD_BLOCKED"}, status.HTTP_400_BAD_REQUEST
+            unclaim_qr(qr)
+            record_operation(
+                tenant=tenant,
+                card=card,
+                type=op_type,
+                source=source,
+                amount=amount,
+                points=0,
+                receipt_id=receipt_id,
+                idempotency_key=idempotency_key,
+                staff=staff,
+                location=location,
+                status=LoyaltyOperation.Status.FAILED,
+                fail_reason="INSUFFICIENT_POINTS",
+            )
+            return remember({"detail": "INSUFFICIENT_POINTS"}, status.HTTP_400_BAD_REQUEST)
 
-        LoyaltyOperation.objects.create(
+        op = record_operation(
             tenant=tenant,
             card=card,
             type=op_type,
@@ -1375,9 +1814,124 @@ def handle_points(
             points=points,
             receipt_id=receipt_id,
             idempotency_key=idempotency_key,
-            staff=request.user if source != LoyaltyOperation.Source.POS else None,
+            staff=staff,
             location=location,
             status=LoyaltyOperation.Status.SUCCESS,
+            metadata={"offers": fired} if fired else {},
+        )
+        if op_type == LoyaltyOperation.Type.EARN:
+            add_lot(op)
+        else:
+            consume_lots(card.id, points)
+        audit_log(tenant, staff, op_type.lower(), {})
+        return remember({"detail": "OK", "points": points, "current_points": current_points}, status.HTTP_200_OK)
+
+
+def earn_receipt(
+    tenant: Tenant,
+    location: Location,
+    receipt: dict,
+    qr: OneTimeQR | RollingQR | None,
+    rules: dict[int, LoyaltyRule],
+    offers,
+    now: datetime,
+) -> tuple[LoyaltyOperation | None, tuple[dict, int]]:
+    if not qr:
+        return None, ({"detail": "QR_NOT_FOUND"}, status.HTTP_400_BAD_REQUEST)
+    if qr.expires_at < now:
+        return None, ({"detail": "QR_EXPIRED"}, status.HTTP_400_BAD_REQUEST)
+    if qr.used_at:
+        return None, ({"detail": "QR_USED"}, status.HTTP_400_BAD_REQUEST)
+    card = qr.card
+    if card.status != LoyaltyCard.Status.ACTIVE:
+        return None, ({"detail": "CARD_BLOCKED"}, status.HTTP_400_BAD_REQUEST)
+    if card.user_id not in rules:
+        rules[card.user_id] = get_rule(tenant, location, card.user)
+    rule = rules[card.user_id]
+    amount = Decimal(receipt["amount"])
+    if amount < rule.min_amount:
+        return None, ({"detail": "MIN_AMOUNT_NOT_MET"}, status.HTTP_400_BAD_REQUEST)
+    raw_points, bonus, fired = apply_offers(
+        offers.eligible(card.user_id, now), amount * rule.earn_percent / Decimal("100")
+    )
+    points = apply_rounding(raw_points, rule.rounding_mode) + bonus
+    op = LoyaltyOperation(
+        tenant=tenant,
+        card=card,
+        type=LoyaltyOperation.Type.EARN,
+        source=LoyaltyOperation.Source.POS,
+        amount=amount,
+        points=points,
+        receipt_id=receipt["receipt_id"],
+        location=location,
+        status=LoyaltyOperation.Status.SUCCESS,
+        metadata={"offers": fired} if fired else {},
+    )
+
+    qr_error = claim_qr(qr, now)
+    if qr_error:
+        return None, ({"detail": qr_error}, status.HTTP_400_BAD_REQUEST)
+    if not reserve_daily_earn(card.id, points, now):
+        unclaim_qr(qr)
+        op.points, op.metadata = 0, {}
+        op.status, op.fail_reason = LoyaltyOperation.Status.FAILED, "MAX_EARN_PER_DAY_REACHED"
+        return op, ({"detail": "MAX_EARN_PER_DAY_REACHED"}, status.HTTP_400_BAD_REQUEST)
+    current_points = apply_balance_delta(card.id, points, rule)
+    if current_points is None:
+        transaction.set_rollback(True)
+        return None, ({"detail": "CARD_BLOCKED"}, status.HTTP_400_BAD_REQUEST)
+    return op, ({"detail": "OK", "points": points, "current_points": current_points}, status.HTTP_200_OK)
+
+
+def process_pos_chunk(
+    tenant: Tenant, location: Location, receipts: list[dict], qrs: dict[str, OneTimeQR | RollingQR]
+) -> dict[str, tuple[dict, int]]:
+    now = timezone.now()
+    offers = get_offer_index(tenant.id)
+    rules, replies, ops = {}, {}, []
+    for receipt in receipts:
+        receipt_id = receipt["receipt_id"]
+        try:
+            with transaction.atomic():
+                op, replies[receipt_id] = earn_receipt(
+                    tenant, location, receipt, qrs.get(receipt["qr_payload"]), rules, offers, now
+                )
+        except DatabaseError:
+            logger.exception("pos.batch receipt failed tenant_id=%s receipt_id=%s", tenant.id, receipt_id)
+            replies[receipt_id] = ({"detail": "ERROR"}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            continue
+        if op is not None:
+            ops.append(op)
+    ops = record_operations(ops)
+    earned = [op for op in ops if op.status == LoyaltyOperation.Status.SUCCESS]
+    add_lots(earned)
+    store_responses(tenant, {pos_receipt_key(op.receipt_id): replies[op.receipt_id] for op in ops})
+    for _ in earned:
+        audit_log(tenant, None, LoyaltyOperation.Type.EARN.lower(), {})
+    return replies
+
+
+def process_pos_receipt(
+    tenant: Tenant, location: Location, receipt: dict, qr: OneTimeQR | RollingQR | None
+) -> tuple[dict, int]:
+    receipt_id = receipt["receipt_id"]
+    try:
+        with transaction.atomic():
+            return process_points(
+                tenant,
+                qr,
+                LoyaltyOperation.Type.EARN,
+                LoyaltyOperation.Source.POS,
+                receipt["amount"],
+                receipt_id=receipt_id,
+                location=location,
+                replay_key=pos_receipt_key(receipt_id),
+            )
+    except IntegrityError:
+        return get_response(tenant, pos_receipt_key(receipt_id)) or (
+            {"detail": "ERROR"},
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
-        audit_log(tenant, request.user if source != LoyaltyOperation.Source.POS else None, op_type.lower(), {})
-        return Response({"detail": "OK", "points": points, "current_points": card.current_points})
+    except DatabaseError:
+        logger.exception("pos.batch receipt failed tenant_id=%s receipt_id=%s", tenant.id, receipt_id)
+        return {"detail": "ERROR"}, status.HTTP_500_INTERNAL_SERVER_ERROR
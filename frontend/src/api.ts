@@ -43,7 +43,11 @@ async function refreshTokens() {
   return true;
 }
 
-export async function apiFetch(path: string, options: RequestInit = {}, allowRetry = true) {
+async function apiRequest(
+  path: string,
+  options: RequestInit = {},
+  allowRetry = true
+): Promise<{ data: any; headers: Headers }> {
   const headers = new Headers(options.headers || {});
   if (!headers.has("Authorization")) {
     const access = getAccessToken();
@@ -57,7 +61,7 @@ export async function apiFetch(path: string, options: RequestInit = {}, allowRet
   if (res.status === 401 && allowRetry) {
     const refreshed = await refreshTokens();
     if (refreshed) {
-      return apiFetch(path, options, false);
+      return apiRequest(path, options, false);
     }
   }
 
@@ -72,5 +76,23 @@ export async function apiFetch(path: string, options: RequestInit = {}, allowRet
     throw err;
   }
 
-  return data;
+  return { data, headers: res.headers };
+}
+
+export async function apiFetch(path: string, options: RequestInit = {}) {
+  return (await apiRequest(path, options)).data;
+}
+
+export async function apiFetchPage(path: string, options: RequestInit = {}) {
+  const { data, headers } = await apiRequest(path, options);
+  return { items: data as any[], nextCursor: headers.get("X-Next-Cursor") || "" };
+}
+
+export function setReceiptSearch(params: URLSearchParams, receipt: string) {
+  const value = receipt.trim();
+  if (!value) {
+    return;
+  }
+  params.set("receipt_id", value);
+  params.set("receipt_match", value.length >= 3 ? "contains" : "prefix");
 }
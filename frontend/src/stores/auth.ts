@@ -1,5 +1,7 @@
 import { defineStore } from "pinia";
 
+export const QR_SECRET_PREFIX = "qr-secret:";
+
 type User = {
   id: number;
   email: string;
@@ -63,6 +65,9 @@ export const useAuthStore = defineStore("auth", {
       this.tokens = null;
       this.tenant = null;
       localStorage.removeItem("auth");
+      Object.keys(localStorage)
+        .filter((key) => key.startsWith(QR_SECRET_PREFIX))
+        .forEach((key) => localStorage.removeItem(key));
     },
   },
 });